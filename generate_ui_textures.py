@@ -20,10 +20,12 @@ muban 等大的透明画布上，分别生成两类叠加层，供 ini 以相同
 from PIL import Image, ImageDraw, ImageFont
 import os
 import json
-import shutil
 import sys
 from typing import List, Tuple
 
+from iooh_fileops import fast_copy
+from iooh_name_matcher import load_name_rules
+
 
 # 用户自定义资源目录名（位于 exe/脚本同级，不随包分发）
 ROLEPICTURE_DIRNAME = "rolepicture"
@@ -95,6 +97,8 @@ class UITextureGenerator:
         self.mapping_path = os.path.join(self.base_output_dir, MAPPING_FILENAME)
         # muban 运行时副本：复制到输出目录供游戏渲染加载
         self.muban_path = os.path.join(self.output_dir, self.MUBAN_FILENAME)
+        # 配置运行的预写日志（由流水线设置；None 时直接写）
+        self.journal = None
 
     @staticmethod
     def _get_output_dir() -> str:
@@ -129,22 +133,28 @@ class UITextureGenerator:
         self.ensure_user_assets()
         if not os.path.exists(self.muban_src):
             raise FileNotFoundError(f"缺少源模板文件: {self.muban_src}")
-        shutil.copy2(self.muban_src, self.muban_path)
+        # 内容一致则跳过；开发环境下源即目标，同样跳过
+        fast_copy(self.muban_src, self.muban_path, allow_hardlink=True)
+
+    # 候选字体（按优先级，取第一个可用的）
+    BOLD_FONT_PATHS = [
+        "C:/Windows/Fonts/msyhbd.ttc",  # 微软雅黑 Bold
+        "C:/Windows/Fonts/simhei.ttf",  # 黑体
+    ]
+    REGULAR_FONT_PATHS = [
+        "C:/Windows/Fonts/msyh.ttc",   # 微软雅黑
+        "C:/Windows/Fonts/simhei.ttf",  # 黑体
+        "C:/Windows/Fonts/simsun.ttc",  # 宋体
+        "C:/Windows/Fonts/arial.ttf",   # Arial
+    ]
+
+    def font_files(self) -> List[str]:
+        """纹理可能用到的全部候选字体（构建图据此判断字体变化）。"""
+        return self.BOLD_FONT_PATHS + self.REGULAR_FONT_PATHS
 
     def get_font(self, size: int, bold: bool = False):
         """获取中文字体"""
-        if bold:
-            font_paths = [
-                "C:/Windows/Fonts/msyhbd.ttc",  # 微软雅黑 Bold
-                "C:/Windows/Fonts/simhei.ttf",  # 黑体
-            ]
-        else:
-            font_paths = [
-                "C:/Windows/Fonts/msyh.ttc",   # 微软雅黑
-                "C:/Windows/Fonts/simhei.ttf",  # 黑体
-                "C:/Windows/Fonts/simsun.ttc",  # 宋体
-                "C:/Windows/Fonts/arial.ttf",   # Arial
-            ]
+        font_paths = self.BOLD_FONT_PATHS if bold else self.REGULAR_FONT_PATHS
         for font_path in font_paths:
             if os.path.exists(font_path):
                 try:
@@ -305,37 +315,67 @@ class UITextureGenerator:
         self.save_image(canvas, "hint_keys.png")
         print(f"  生成: hint_keys.png (按键提示 {len(hint_lines)} 行)")
 
-    def create_character_layers(self, characters: List[dict], hint_lines: List[str]):
+    def create_character_layers(self, characters: List[dict], hint_lines: List[str],
+                                shared: bool = True):
         """为每个角色生成头像层与文字层
-        characters 每项: {"display": 中文名, "display_en": 英文名, "keywords": 头像匹配关键词列表}
+        characters 每项: {"id": 角色ID, "display": 中文名, "display_en": 英文名, "keywords": 头像匹配关键词列表}
+        （缺 "id" 时按列表下标编号）
         hint_lines: 按键提示纹理的多行文案（与 ini 实际按键一致）。
+        shared=False 时只生成角色层；全局共用的状态/提示层仅在缺失时补齐。
         """
         print("正在生成角色叠加层（头像/文字）...")
         size = self._muban_size()
         for idx, char in enumerate(characters):
-            self.create_avatar_layer(idx, char["keywords"], size)
-            self.create_text_layer(idx, char["display"], char.get("display_en", ""), size)
+            self.create_character_layer(char, idx, size)
+        self.create_shared_layers(hint_lines, size, shared)
+
+    def create_character_layer(self, char: dict, idx: int, size: Tuple[int, int]):
+        """生成单个角色的头像层与文字层（缺 "id" 时按 idx 编号）。"""
+        char_id = char.get("id", idx)
+        self.create_avatar_layer(char_id, char["keywords"], size)
+        self.create_text_layer(char_id, char["display"], char.get("display_en", ""), size)
+
+    def create_shared_layers(self, hint_lines: List[str], size: Tuple[int, int], shared: bool = True):
+        """生成全局共用的状态层与按键提示层；shared=False 时仅补齐缺失的文件。"""
         # 状态图案：全局共用两张（启用/禁用），运行时按当前角色状态切换
-        self.create_status_layer(True, size)
-        self.create_status_layer(False, size)
+        if shared or not os.path.exists(os.path.join(self.output_dir, "status_enabled.png")):
+            self.create_status_layer(True, size)
+        if shared or not os.path.exists(os.path.join(self.output_dir, "status_disabled.png")):
+            self.create_status_layer(False, size)
         # 按键提示：全局静态一张
-        self.create_hint_layer(size, hint_lines)
+        if shared or not os.path.exists(os.path.join(self.output_dir, "hint_keys.png")):
+            self.create_hint_layer(size, hint_lines)
+
+    def generate_hint(self, hint_lines: List[str]):
+        """只重新生成按键提示层 hint_keys.png（菜单键变更快速路径用，其余纹理不动）。"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        if not os.path.exists(self.muban_path):
+            self.setup_directories()
+        self.create_hint_layer(self._muban_size(), hint_lines)
 
     def save_image(self, img: Image.Image, filename: str):
         """保存图像为PNG格式（3DMigoto可直接加载）"""
         filepath = os.path.join(self.output_dir, filename)
+        if self.journal is not None:
+            self.journal.before_write(filepath)
         img.save(filepath, 'PNG')
+        if self.journal is not None:
+            self.journal.after_write(filepath)
         print(f"    保存: {filepath}")
 
-    def generate_all(self, characters: List[dict] = None, hint_lines: List[str] = None):
+    def generate_all(self, characters: List[dict] = None, hint_lines: List[str] = None,
+                     only_ids=None):
         """生成所有UI纹理
         characters 每项: {"display": 显示名, "keywords": 头像匹配关键词列表}
         hint_lines: 按键提示文案；缺省时取 IOOHKeyConfig 的当前/默认按键文案。
+        only_ids: 只生成这些角色 id 的头像/文字层（选择性运行）；None 表示全部。
         """
         self.setup_directories()
 
         if characters is None:
             characters, _ = self.load_character_names()
+        if only_ids is not None:
+            characters = [c for idx, c in enumerate(characters) if c.get("id", idx) in only_ids]
 
         if hint_lines is None:
             from iooh_keys import IOOHKeyConfig
@@ -345,7 +385,7 @@ class UITextureGenerator:
         print("开始生成UI纹理...")
         print("=" * 60)
 
-        self.create_character_layers(characters, hint_lines)
+        self.create_character_layers(characters, hint_lines, shared=only_ids is None)
 
         print("=" * 60)
         print(f"UI纹理生成完成！输出目录: {self.output_dir}")
@@ -358,46 +398,50 @@ class UITextureGenerator:
         Returns:
             tuple: (characters, mods_data)
             characters 为列表，每项 dict:
-              {"display": 中文显示名, "display_en": 英文显示名, "keywords": 匹配关键词列表}
+              {"id": 角色ID, "display": 中文显示名, "display_en": 英文显示名, "keywords": 匹配关键词列表}
+            id 取自 key 配置中的 character_id（登记表分配，可能不连续），纹理文件按它命名。
             keywords 用于在 rolepicture 目录按文件名匹配头像（含英文名）。
         """
         key_config_path = os.path.join(self.base_output_dir, 'xxmi_key_config.json')
-        mapping_path = self.mapping_path
 
         # 1. 读取key配置，获取实际的mod列表
         with open(key_config_path, 'r', encoding='utf-8') as f:
             key_config = json.load(f)
             mods = key_config.get('mods', [])
 
-        # 2. 读取角色名称映射字典
-        with open(mapping_path, 'r', encoding='utf-8') as f:
-            mapping_data = json.load(f)
-            match_rules = mapping_data.get('match_rules', [])
+        return self.match_characters(mods), mods
 
-        # 3. 为每个mod找到显示名与匹配关键词
+    def match_characters(self, mods: List[dict]) -> List[dict]:
+        """按角色名称映射为每个 mod（{"name", "character_id"}）确定显示名与头像关键词。
+
+        不依赖 xxmi_key_config.json，流水线可直接用内存中的名册并发生成纹理。
+        """
+        # 2. 读取角色名称映射字典（编译为多关键词自动机，文件未变时复用）
+        self.ensure_user_assets()
+        name_rules = load_name_rules(self.mapping_path)
+
+        # 3. 为每个mod找到显示名与匹配关键词（先出现的规则优先）
         characters = []
         for mod in mods:
             mod_name = mod.get('name', '')
-            mod_name_l = mod_name.lower()
-            matched = False
-            for rule in match_rules:
-                keywords = rule.get('keywords', [])
-                if any(kw.lower() in mod_name_l for kw in keywords):
-                    characters.append({
-                        "display": rule['display_name'],
-                        "display_en": rule.get('display_en_name', ''),
-                        "keywords": keywords + [mod_name],
-                    })
-                    matched = True
-                    break
-            if not matched:
+            char_id = mod.get('character_id', len(characters))
+            rule = name_rules.match(mod_name)
+            if rule is not None:
+                characters.append({
+                    "id": char_id,
+                    "display": rule['display_name'],
+                    "display_en": rule.get('display_en_name', ''),
+                    "keywords": rule.get('keywords', []) + [mod_name],
+                })
+            else:
                 characters.append({
-                    "display": mod_name or f'角色{len(characters)}',
+                    "id": char_id,
+                    "display": mod_name or f'角色{char_id}',
                     "display_en": '',
                     "keywords": [mod_name],
                 })
 
-        return characters, mods
+        return characters
 
 
 def main():
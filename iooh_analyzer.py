@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""mod ini 静态开销分析：找出每帧开销大的 mod。
+
+装了很多 mod 后游戏卡顿时，无从知道是哪个 mod 的 [Present]、CommandList 或
+TextureOverride 逻辑开销大。本模块逐个 ini 做静态统计（不执行、不改写文件）：
+
+- present_commands：每帧执行的命令数——[Present] 中的语句，加上经 run = 递归调用的
+  CommandList / CustomShader 中的语句（同一列表被调用几次就计几次，环路只计一次）
+- present_draws：其中的 draw / drawindexed / dispatch 等绘制调用数
+- draw_calls：ini 中全部绘制调用数（含只在匹配 hash 时执行的 TextureOverride）
+- resources / resource_bytes：[Resource*] 段数与其引用的文件（filename =）总字节，
+  无文件的缓冲区按 array × stride 估算
+- texture_overrides / shader_overrides：TextureOverride 与 ShaderOverride/ShaderRegex 段数
+
+run = 的目标在同一 mod 的全部 ini 中查找（不区分大小写；带命名空间前缀的名称
+找不到时退回取最后一段）。工具自己生成的 IOOHmod.ini 也作为一项列出。
+"""
+
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+# 统计字段 → 报表列名（GUI 表头 / CLI 表格共用）
+COST_FIELDS = [
+    ("present_commands", "每帧命令"),
+    ("present_draws", "每帧绘制"),
+    ("draw_calls", "绘制调用"),
+    ("resources", "资源数"),
+    ("resource_bytes", "资源大小"),
+    ("texture_overrides", "TextureOverride"),
+    ("shader_overrides", "ShaderOverride"),
+]
+
+_DRAW_COMMANDS = frozenset([
+    "draw", "drawauto", "drawindexed", "drawinstanced", "drawindexedinstanced",
+    "drawinstancedindirect", "drawindexedinstancedindirect", "dispatch", "dispatchindirect",
+])
+# 只描述匹配条件/资源属性、不在运行时执行的字段
+_METADATA_KEYS = frozenset([
+    "hash", "match_first_index", "match_index_count", "match_first_vertex", "match_vertex_count",
+    "match_first_instance", "match_instance_count", "match_priority", "filter_index",
+    "allow_duplicate_hash", "depth_filter", "partner", "model", "override_byte_stride",
+    "override_vertex_count", "uav_byte_stride", "expand_region_copy", "deny_cpu_read",
+    "iteration", "format", "width", "height", "width_multiply", "height_multiply",
+])
+_SECTION_RE = re.compile(r'^\[([^\]\r\n]+)\]')
+_CALLABLE_PREFIXES = ("commandlist", "customshader")
+
+
+def format_bytes(size: int) -> str:
+    """字节数的可读形式。"""
+    value = float(size)
+    for unit in ("B", "KB", "MB"):
+        if value < 1024:
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} GB"
+
+
+class _Section:
+    """解析后的一个 section：可执行语句数、绘制数、run 目标与资源属性。"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.commands = 0
+        self.draws = 0
+        self.runs: List[str] = []
+        self.fields: Dict[str, str] = {}
+
+
+class IniCost:
+    """单个 ini 的静态开销统计。"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.present_commands = 0
+        self.present_draws = 0
+        self.draw_calls = 0
+        self.resources = 0
+        self.resource_bytes = 0
+        self.texture_overrides = 0
+        self.shader_overrides = 0
+        self.error = ""
+
+    def to_dict(self, base_dir: str = "") -> dict:
+        data = {"file": os.path.relpath(self.path, base_dir) if base_dir else self.path}
+        data.update({name: getattr(self, name) for name, _ in COST_FIELDS})
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+class ModCost:
+    """单个 mod 的静态开销：各 ini 统计与合计。"""
+
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = path
+        self.inis: List[IniCost] = []
+
+    def total(self, field: str) -> int:
+        return sum(getattr(ini, field) for ini in self.inis)
+
+    def to_dict(self) -> dict:
+        data = {"name": self.name, "path": self.path}
+        data.update({name: self.total(name) for name, _ in COST_FIELDS})
+        data["inis"] = [ini.to_dict(self.path) for ini in self.inis]
+        return data
+
+
+def _parse_sections(path: str) -> List[_Section]:
+    """把 ini 切分为 section 并统计每段的可执行语句（注释、空行与匹配条件字段不计）。"""
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        lines = f.read().splitlines()
+    sections: List[_Section] = []
+    current: Optional[_Section] = None
+    for raw in lines:
+        line = raw.strip()
+        if not line or line.startswith(';'):
+            continue
+        header = _SECTION_RE.match(line)
+        if header:
+            current = _Section(header.group(1).strip())
+            sections.append(current)
+            continue
+        if current is None:
+            continue
+        key, sep, value = line.partition('=')
+        key = key.strip().lower()
+        for prefix in ("pre ", "post "):
+            if key.startswith(prefix):
+                key = key[len(prefix):].strip()
+        if sep:
+            current.fields.setdefault(key, value.strip())
+            if key in _METADATA_KEYS:
+                continue
+        current.commands += 1
+        if key in _DRAW_COMMANDS:
+            current.draws += 1
+        elif key == "run" and sep:
+            current.runs.append(value.strip().lower())
+    return sections
+
+
+def _resource_bytes(section: _Section, ini_dir: str) -> int:
+    """资源占用字节：引用文件的大小，或缓冲区 array × stride 估算。"""
+    filename = section.fields.get("filename")
+    if filename:
+        try:
+            relative = filename.strip('"').replace('\\', os.sep)
+            return os.path.getsize(os.path.join(ini_dir, relative))
+        except OSError:
+            return 0
+    try:
+        return int(section.fields.get("array", 0)) * int(section.fields.get("stride", 0))
+    except ValueError:
+        return 0
+
+
+class _CallGraph:
+    """同一 mod 内可被 run = 调用的段（CommandList / CustomShader），按调用展开计数。"""
+
+    def __init__(self):
+        self.callables: Dict[str, _Section] = {}
+        self._memo: Dict[str, Tuple[int, int]] = {}
+
+    def add(self, section: _Section):
+        name = section.name.lower()
+        if name.startswith(_CALLABLE_PREFIXES) or "\\" in name:
+            self.callables.setdefault(name, section)
+            self.callables.setdefault(name.rsplit("\\", 1)[-1], section)
+
+    def cost(self, section: _Section, stack: Tuple[str, ...] = ()) -> Tuple[int, int]:
+        """执行一次该段的 (命令数, 绘制数)，含递归调用。"""
+        commands, draws = section.commands, section.draws
+        for target in section.runs:
+            callee = self.callables.get(target) or self.callables.get(target.rsplit("\\", 1)[-1])
+            if callee is None or callee.name.lower() in stack:
+                continue
+            key = callee.name.lower()
+            if key not in self._memo:
+                self._memo[key] = self.cost(callee, stack + (key,))
+            sub_commands, sub_draws = self._memo[key]
+            commands += sub_commands
+            draws += sub_draws
+        return commands, draws
+
+
+def analyze_mod(name: str, path: str, ini_files: List[str]) -> ModCost:
+    """分析一个 mod 的全部 ini。"""
+    mod_cost = ModCost(name, path)
+    graph = _CallGraph()
+    parsed: List[Tuple[IniCost, List[_Section]]] = []
+    for ini_file in ini_files:
+        ini_cost = IniCost(ini_file)
+        try:
+            sections = _parse_sections(ini_file)
+        except OSError as e:
+            ini_cost.error = f"{e}"
+            sections = []
+        for section in sections:
+            graph.add(section)
+        parsed.append((ini_cost, sections))
+
+    for ini_cost, sections in parsed:
+        ini_dir = os.path.dirname(ini_cost.path)
+        for section in sections:
+            lower = section.name.lower()
+            ini_cost.draw_calls += section.draws
+            if lower == "present":
+                commands, draws = graph.cost(section)
+                ini_cost.present_commands += commands
+                ini_cost.present_draws += draws
+            elif lower.startswith("textureoverride"):
+                ini_cost.texture_overrides += 1
+            elif lower.startswith(("shaderoverride", "shaderregex")):
+                ini_cost.shader_overrides += 1
+            elif lower.startswith("resource"):
+                ini_cost.resources += 1
+                ini_cost.resource_bytes += _resource_bytes(section, ini_dir)
+        mod_cost.inis.append(ini_cost)
+    return mod_cost
+
+
+def analyze_directory(configurator, directory: str) -> List[ModCost]:
+    """按扫描规则分析 Mods 目录下的全部 mod（含没有按键绑定的），外加工具生成的 IOOHmod.ini。
+
+    结果按每帧命令数从高到低排序。
+    """
+    output_dir = os.path.abspath(configurator._resolve_output_dir())
+    costs: List[ModCost] = []
+    for item in sorted(os.listdir(directory)):
+        item_path = os.path.join(directory, item)
+        if configurator.scan_rules.skip_mod_folder(item) or os.path.abspath(item_path) == output_dir:
+            continue
+        if not os.path.isdir(item_path):
+            continue
+        try:
+            ini_files = configurator.scan_rules.find_ini_files(item_path)
+        except OSError:
+            continue
+        if ini_files:
+            costs.append(analyze_mod(item, item_path, ini_files))
+
+    main_ini = os.path.join(output_dir, "IOOHmod.ini")
+    if os.path.isfile(main_ini):
+        costs.append(analyze_mod("IOOHmod.ini", output_dir, [main_ini]))
+    costs.sort(key=lambda c: (-c.total("present_commands"), -c.total("draw_calls"), c.name))
+    return costs
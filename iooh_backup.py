@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""IOOH 备份仓库：内容寻址、压缩存储的 ini 备份。
+
+原先每个 ini 旁各放一份 `.backup` 原样副本；大量 mod 的 ini 高度雷同，多代备份
+既占空间又费 I/O。本模块改为集中的内容寻址仓库（位于 exe/脚本同级 iooh_backups/）：
+
+- objects/<前两位>/<sha256>：每个唯一内容一个块，首字节为编码标记，
+  小文件用 zlib（快），大文件用 lzma（压缩率高）
+- manifest.json：ini 路径 → 备份代列表（sha256、原始大小、时间），第 0 代即原始 ini
+- 还原时解压并校验 sha256，块损坏则拒绝写回，不会用坏数据覆盖 ini
+
+旧版 `.backup` 副本仍可被识别：首次备份时导入仓库，还原时兼容处理。
+"""
+
+import hashlib
+import json
+import lzma
+import os
+import threading
+import zlib
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# 仓库目录名（位于 exe/脚本同级，不随包分发）
+BACKUP_STORE_DIRNAME = "iooh_backups"
+
+# 不小于该大小的内容改用 lzma 压缩；更小的用 zlib（lzma 对小文件头开销大、也更慢）
+LZMA_THRESHOLD = 64 * 1024
+
+# 块编码标记（块文件首字节）
+_CODEC_ZLIB = b"z"
+_CODEC_LZMA = b"x"
+
+
+class BackupIntegrityError(Exception):
+    """备份块缺失或内容与 sha256 不符。"""
+
+
+def _manifest_key(path: str) -> str:
+    """manifest 中的路径键：绝对路径 + 平台大小写规整（Windows 不区分大小写）。"""
+    return os.path.normcase(os.path.abspath(path))
+
+
+class BackupStore:
+    """内容寻址的压缩备份仓库。"""
+
+    def __init__(self, base_dir: str):
+        self.root = os.path.join(base_dir, BACKUP_STORE_DIRNAME)
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.manifest_path = os.path.join(self.root, "manifest.json")
+        # 路径键 -> {"path": 原路径, "generations": [{"sha256", "size", "time"}, ...]}
+        self.files: Dict[str, dict] = {}
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        """读取 manifest；缺失或损坏时视为空仓库（块文件仍保留，可再次引用）。"""
+        if not os.path.exists(self.manifest_path):
+            return
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"读取备份清单失败，按空仓库处理: {e}")
+            return
+        self.files = data.get("files", {})
+
+    def save(self) -> bool:
+        """把 manifest 原子写回磁盘（先写临时文件再替换）。"""
+        if not self._dirty:
+            return True
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"files": self.files}, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.manifest_path)
+            self._dirty = False
+            return True
+        except Exception as e:
+            print(f"保存备份清单失败: {e}")
+            return False
+
+    # ===== 块读写 =====
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def put_bytes(self, data: bytes, durable: bool = False) -> str:
+        """写入一段内容并返回其 sha256；相同内容只存一份。
+
+        durable=True 时写完 fsync（运行日志的写前内容必须先于改写落盘）。
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        blob_path = self._blob_path(digest)
+        if os.path.exists(blob_path):
+            return digest
+        if len(data) >= LZMA_THRESHOLD:
+            payload = _CODEC_LZMA + lzma.compress(data, preset=6)
+        else:
+            payload = _CODEC_ZLIB + zlib.compress(data, 9)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        # 临时名带线程标识：流水线各阶段可能同时写入同一内容的块
+        tmp_path = f"{blob_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, blob_path)
+        return digest
+
+    def get_bytes(self, digest: str) -> bytes:
+        """读出并解压一个块，校验 sha256；不符则抛 BackupIntegrityError。"""
+        blob_path = self._blob_path(digest)
+        try:
+            with open(blob_path, 'rb') as f:
+                payload = f.read()
+        except OSError as e:
+            raise BackupIntegrityError(f"备份块缺失: {digest} ({e})")
+        codec, body = payload[:1], payload[1:]
+        try:
+            if codec == _CODEC_LZMA:
+                data = lzma.decompress(body)
+            elif codec == _CODEC_ZLIB:
+                data = zlib.decompress(body)
+            else:
+                raise BackupIntegrityError(f"未知的备份块编码: {digest}")
+        except (lzma.LZMAError, zlib.error) as e:
+            raise BackupIntegrityError(f"备份块解压失败: {digest} ({e})")
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise BackupIntegrityError(f"备份块校验失败: {digest}")
+        return data
+
+    def discard_blobs(self, digests) -> int:
+        """删除给定的块中未被 manifest 引用的那些（运行日志的写前内容用完即删），返回删除数。"""
+        referenced = {gen["sha256"] for entry in self.files.values() for gen in entry.get("generations", [])}
+        removed = 0
+        for digest in set(digests) - referenced:
+            try:
+                os.remove(self._blob_path(digest))
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+    # ===== 文件级备份 =====
+
+    def has_backup(self, path: str) -> bool:
+        """该文件是否已有至少一代备份。"""
+        entry = self.files.get(_manifest_key(path))
+        return bool(entry and entry.get("generations"))
+
+    def generations(self, path: str) -> List[dict]:
+        """返回该文件的全部备份代（第 0 代为原始内容）。"""
+        entry = self.files.get(_manifest_key(path))
+        return list(entry["generations"]) if entry else []
+
+    def add_generation(self, path: str, data: bytes) -> bool:
+        """把内容记为该文件的新一代备份；与最新一代相同则不重复记录。"""
+        digest = self.put_bytes(data)
+        key = _manifest_key(path)
+        entry = self.files.setdefault(key, {"path": os.path.abspath(path), "generations": []})
+        gens = entry["generations"]
+        if gens and gens[-1]["sha256"] == digest:
+            return False
+        gens.append({
+            "sha256": digest,
+            "size": len(data),
+            "time": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        })
+        self._dirty = True
+        return True
+
+    def backup_file(self, path: str) -> bool:
+        """为文件建立原始备份（幂等：已有备份则不动）。
+
+        若旁边存在旧版 `.backup` 副本，以它作为原始内容导入，保证还原结果与旧版一致。
+        """
+        if self.has_backup(path):
+            return False
+        legacy_path = path + '.backup'
+        source = legacy_path if os.path.isfile(legacy_path) else path
+        with open(source, 'rb') as f:
+            data = f.read()
+        return self.add_generation(path, data)
+
+    def original_bytes(self, path: str) -> Optional[bytes]:
+        """返回文件的原始内容（第 0 代，已校验）；无备份时返回 None。"""
+        gens = self.generations(path)
+        if not gens:
+            return None
+        return self.get_bytes(gens[0]["sha256"])
+
+    def paths_under(self, directory: str) -> List[str]:
+        """返回位于某目录下的全部已备份文件路径。"""
+        prefix = _manifest_key(directory).rstrip(os.sep) + os.sep
+        return [entry["path"] for key, entry in self.files.items() if key.startswith(prefix)]
+
+    def stats(self) -> dict:
+        """统计仓库空间：逻辑大小（全部备份代原文之和）与实际块占用。"""
+        logical = 0
+        generations = 0
+        digests = set()
+        for entry in self.files.values():
+            for gen in entry.get("generations", []):
+                logical += gen.get("size", 0)
+                generations += 1
+                digests.add(gen["sha256"])
+        stored = 0
+        for digest in digests:
+            try:
+                stored += os.path.getsize(self._blob_path(digest))
+            except OSError:
+                pass
+        saved = logical - stored
+        return {
+            "files": len(self.files),
+            "generations": generations,
+            "blobs": len(digests),
+            "logical_bytes": logical,
+            "stored_bytes": stored,
+            "saved_bytes": saved,
+            "saved_ratio": (saved / logical) if logical else 0.0,
+        }
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""性能基准：用合成数据复现大规模 mod 库，度量关键路径的开销。
+
+- memory：合成 mod 库（mod × ini × 绑定）的 ModInfo / ModKeyBinding 内存占用，
+  与旧的 __dict__ 实例布局对比（tracemalloc 统计，含路径表与驻留字符串）
+- snapshot：同一合成库的二进制扫描快照与 xxmi_key_config.json 格式的体积与恢复耗时
+- main_ini：10 / 100 / 1000 个角色的 IOOHmod.ini 生成耗时（只生成文本，不写盘）
+
+合成数据按真实扫描的方式构造：每个 ini 的路径由 os.path.join 拼出、同一 ini 的绑定
+共用该路径对象；section 名、key、变量名与描述每个绑定各自格式化出新字符串（与逐 ini
+正则解析一致），但取值在 mod 之间大量重复——社区 mod 多沿用相同的模板写法。
+"""
+
+import gc
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from iooh_keys import ACTIONS, DEFAULT_KEYS
+from iooh_main_ini import render_main_ini
+from iooh_models import ModInfo, ModKeyBinding
+from iooh_snapshot import ScanSnapshot
+
+# 常见的按键 section 写法（合成绑定轮流取用）
+_SECTION_NAMES = ["KeySwap", "KeyToggle", "KeyCycle", "KeyHair", "KeyWeapon", "KeyOutfit", "KeyCape", "KeyGlasses"]
+_KEYS = ["VK_UP", "VK_DOWN", "ctrl 1", "ctrl 2", "alt 1", "alt 2", "shift /", "no_modifiers x"]
+
+
+class _DictModKeyBinding:
+    """旧的 ModKeyBinding 布局（普通实例 __dict__、完整路径字符串），仅作对照。"""
+    def __init__(self, section_name: str, key: str, variable: str, mod_path: str, ini_file: str = ""):
+        self.section_name = section_name
+        self.key = key
+        self.variable = variable
+        self.mod_path = mod_path
+        self.ini_file = ini_file
+        self.description = ""
+
+
+class _DictModInfo:
+    """旧的 ModInfo 布局，仅作对照。"""
+    def __init__(self, name: str, path: str, ini_files: List[str] = None):
+        self.name = name
+        self.path = path
+        self.ini_files = ini_files or []
+        self.character_id = 0
+        self.key_bindings = []
+        self.has_backup = False
+        self.ini_file_backups = {}
+
+
+def synthetic_library(mods: int, inis_per_mod: int, bindings_per_ini: int,
+                      mod_cls=ModInfo, binding_cls=ModKeyBinding, root: str = "Mods") -> list:
+    """构造合成 mod 库：mods 个 mod，每个 inis_per_mod 个 ini，每个 ini bindings_per_ini 个绑定。"""
+    library = []
+    for m in range(mods):
+        name = f"Character {m:05d}"
+        mod_path = os.path.join(root, name)
+        ini_files = [os.path.join(mod_path, f"part{i}", f"mod{i}.ini") for i in range(inis_per_mod)]
+        mod = mod_cls(name, mod_path, ini_files)
+        for ini_file in ini_files:
+            for b in range(bindings_per_ini):
+                section = "".join([_SECTION_NAMES[b % len(_SECTION_NAMES)], str(b // len(_SECTION_NAMES))])
+                variable = "".join(["$", section[3:].lower()])
+                binding = binding_cls(section, "".join(_KEYS[b % len(_KEYS)]), variable, mod.path, ini_file)
+                binding.description = " ".join([section[3:], "(cycle)", f"[{variable}]"])
+                mod.key_bindings.append(binding)
+        library.append(mod)
+    return library
+
+
+def _measure(build: Callable[[], list]) -> Dict[str, float]:
+    """构造一次并统计保留的字节数与峰值字节数（tracemalloc 下构造耗时不具参考性，不统计）。"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return {"bytes": current, "peak": peak}
+
+
+def bench_memory(mods: int = 2000, inis_per_mod: int = 4, bindings_per_ini: int = 8) -> Dict[str, dict]:
+    """对比新旧模型布局在合成 mod 库上的内存占用，打印并返回结果。"""
+    total = mods * inis_per_mod * bindings_per_ini
+    print(f"合成 mod 库: {mods} 个 mod × {inis_per_mod} 个 ini × {bindings_per_ini} 个绑定 = {total} 个绑定")
+    results = {
+        "dict": _measure(lambda: synthetic_library(mods, inis_per_mod, bindings_per_ini,
+                                                   _DictModInfo, _DictModKeyBinding, root="Mods_dict")),
+        "slots": _measure(lambda: synthetic_library(mods, inis_per_mod, bindings_per_ini)),
+    }
+    labels = {"dict": "旧布局 (__dict__)", "slots": "当前布局 (__slots__+路径表)"}
+    for name, stats in results.items():
+        print(f"  {labels[name]:<26} 占用 {stats['bytes'] / 1048576:7.1f} MB"
+              f"（每绑定 {stats['bytes'] / max(total, 1):6.1f} B），峰值 {stats['peak'] / 1048576:7.1f} MB")
+    if results["dict"]["bytes"]:
+        print(f"  内存节省 {1 - results['slots']['bytes'] / results['dict']['bytes']:.0%}")
+    return results
+
+
+def bench_snapshot(mods: int = 2000, inis_per_mod: int = 4, bindings_per_ini: int = 8) -> Dict[str, dict]:
+    """对比二进制快照与缩进 JSON（xxmi_key_config.json 格式）恢复同一扫描结果的体积与耗时。"""
+    library = synthetic_library(mods, inis_per_mod, bindings_per_ini)
+    fingerprints = {path: (4096, 1700000000000000000 + n)
+                    for n, path in enumerate(p for mod in library for p in mod.ini_files)}
+    config = {"mods": [{
+        "name": mod.name, "path": mod.path, "character_id": mod.character_id, "ini_files": mod.ini_files,
+        "key_bindings": [{"section": b.section_name, "key": b.key, "variable": b.variable,
+                          "description": b.description} for b in mod.key_bindings],
+    } for mod in library]}
+    total = mods * inis_per_mod * bindings_per_ini
+    print(f"合成 mod 库: {mods} 个 mod，{total} 个绑定，{len(fingerprints)} 个 ini 指纹")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot = ScanSnapshot(tmp)
+        start = time.perf_counter()
+        snapshot.save("Mods", "bench", library, fingerprints)
+        save_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        ScanSnapshot(tmp).load()
+        results["snapshot"] = {"bytes": os.path.getsize(snapshot.snapshot_path),
+                               "save": save_seconds, "load": time.perf_counter() - start}
+
+        json_path = os.path.join(tmp, "xxmi_key_config.json")
+        start = time.perf_counter()
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(config, f, ensure_ascii=False, indent=2)
+        save_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        for entry in data["mods"]:
+            mod = ModInfo(entry["name"], entry["path"], entry["ini_files"])
+            for kb in entry["key_bindings"]:
+                binding = ModKeyBinding(kb["section"], kb["key"], kb["variable"], mod.path)
+                binding.description = kb["description"]
+                mod.key_bindings.append(binding)
+        results["json"] = {"bytes": os.path.getsize(json_path),
+                           "save": save_seconds, "load": time.perf_counter() - start}
+
+    labels = {"snapshot": "二进制快照", "json": "缩进 JSON（不含指纹）"}
+    for name, stats in results.items():
+        print(f"  {labels[name]:<16} {stats['bytes'] / 1048576:7.2f} MB，写入 {stats['save'] * 1000:6.0f} ms，"
+              f"恢复 {stats['load'] * 1000:6.0f} ms")
+    return results
+
+
+def _best_time(run: Callable[[], object], repeat: int) -> float:
+    """连续运行 repeat 次为一轮，取 5 轮中最快一轮的单次耗时（秒）。"""
+    best = float("inf")
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            run()
+        best = min(best, (time.perf_counter() - start) / repeat)
+    return best
+
+
+def bench_main_ini(mods: int = 1000) -> Dict[int, dict]:
+    """IOOHmod.ini 在 10、100 …… 直到 mods 个角色时的生成耗时与体积（layered / composite 两种绘制方式）。"""
+    sizes = [n for n in (10, 100, 1000) if n < mods] + [mods]
+    key_lines = {action: f"no_ctrl no_alt {DEFAULT_KEYS[action]}" for action in ACTIONS}
+    panel = {"left_x": 0.01, "start_y": 0.56, "panel_w": 0.15, "panel_h": 0.4}
+    print(f"{'角色数':>6} {'绘制方式':<10} {'耗时':>10} {'每角色':>10} {'体积':>10}")
+    results = {}
+    for size in sizes:
+        library = synthetic_library(size, 1, 0)
+        for character_id, mod in enumerate(library):
+            mod.character_id = character_id
+        ring = list(range(size))
+        results[size] = {}
+        for mode in ("layered", "composite"):
+            def run():
+                return render_main_ini(library, ring, key_lines, panel, mode == "composite", "2000-01-01 00:00:00")
+            seconds = _best_time(run, max(1, 2000 // size))
+            size_bytes = len(run().encode("utf-8"))
+            results[size][mode] = {"seconds": seconds, "bytes": size_bytes}
+            print(f"{size:>6} {mode:<10} {seconds * 1000:>8.2f}ms {seconds / size * 1e6:>8.2f}µs "
+                  f"{size_bytes / 1024:>8.1f}KB")
+    return results
+
+
+# 基准名 -> (说明, 函数)；CLI bench 子命令按名称调用
+BENCHMARKS = {
+    "memory": ("合成 mod 库的模型内存占用（新旧布局对比）", bench_memory),
+    "snapshot": ("二进制扫描快照与 JSON 配置的体积与恢复耗时", bench_snapshot),
+    "main_ini": ("10 / 100 / 1000 个角色的 IOOHmod.ini 生成耗时（--mods 指定最大角色数）", bench_main_ini),
+}
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""构建图：记录每个产物的输入指纹，配置运行只重建过期的节点（类似 make）。
+
+产物与其输入：
+- mod:<文件夹>      mod ini 注入 ← 按键绑定、角色 id、选择器参数（循环序列 + 菜单键）、
+                    注入选项（不含只影响主 ini 的选项）、ini 文件指纹（注入后记录，外部改动/恢复备份即过期）
+- main_ini          IOOHmod.ini ← 名册、选择器参数、muban 比例、注入选项、输出文件
+- texture:<id>      角色头像/文字层 ← 名称映射结果、头像文件、字体、muban、输出文件
+- textures_shared   状态/按键提示层 ← 提示文案、字体、muban、输出文件
+- config            xxmi_key_config.json ← 扫描结果、输出文件
+每个节点还带上生成它的工具本身（源文件或 exe）的指纹，升级工具后自动全部重建。
+
+指纹持久化到 exe/脚本同级的 iooh_build_state.json，节点成功构建后才记录；
+删除该文件等同一次完整重建。explain 给出每个节点过期的原因。
+"""
+
+import hashlib
+import json
+import os
+import sys
+from typing import Dict, List
+
+from iooh_keys import ACTIONS
+from iooh_options import MAIN_INI_OPTIONS
+from iooh_scan_cache import file_fingerprint
+
+# 构建状态文件名（位于 exe/脚本同级，可随时删除）
+BUILD_STATE_FILENAME = "iooh_build_state.json"
+BUILD_STATE_VERSION = 1
+
+# 输入名 → explain 中的说明
+INPUT_LABELS = {
+    "tool": "工具版本",
+    "bindings": "按键绑定",
+    "character_id": "角色ID",
+    "selector": "选择器参数（循环范围/菜单键）",
+    "options": "注入选项",
+    "ini_files": "ini 文件已变化",
+    "roster": "名册",
+    "muban": "muban 模板",
+    "output": "输出文件缺失或被改动",
+    "character": "名称映射",
+    "avatar": "头像文件",
+    "fonts": "字体",
+    "hint": "按键提示文案",
+    "scan": "扫描结果",
+}
+
+
+def digest(value) -> str:
+    """任意可 JSON 序列化值的短摘要。"""
+    data = json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()[:16]
+
+
+def _fp(path: str):
+    fingerprint = file_fingerprint(path) if path else None
+    return list(fingerprint) if fingerprint is not None else None
+
+
+def _tool_fp(*module_files: str):
+    """工具自身指纹：打包版取 exe，源码运行取生成该产物的各模块文件。"""
+    if getattr(sys, 'frozen', False):
+        return _fp(sys.executable)
+    return [_fp(os.path.abspath(module_file)) for module_file in module_files]
+
+
+def explain_lines(reasons: Dict[str, List[str]], verbose: bool = True) -> List[str]:
+    """把各节点的重建原因整理为可读文本；verbose=False 时省略已是最新的节点。"""
+    lines = []
+    for node, why in reasons.items():
+        if why:
+            lines.append(f"  重建 {node}: {'、'.join(why)}")
+        elif verbose:
+            lines.append(f"  最新 {node}")
+    stale = sum(1 for why in reasons.values() if why)
+    lines.append(f"  共 {len(reasons)} 个节点，{stale} 个需要重建")
+    return lines
+
+
+def mod_node(identity: str) -> str:
+    return f"mod:{identity}"
+
+
+def texture_node(char_id: int) -> str:
+    return f"texture:{char_id}"
+
+
+class BuildState:
+    """各构建节点上次成功构建时的输入指纹（含持久化）。"""
+
+    def __init__(self, output_dir: str):
+        self.state_path = os.path.join(output_dir, BUILD_STATE_FILENAME)
+        # 节点名 -> {输入名: 指纹/摘要}
+        self.nodes: Dict[str, Dict[str, object]] = {}
+        self.load()
+
+    def load(self):
+        """读取构建状态；缺失、损坏或版本不符时从空开始（下次运行全部重建）。"""
+        self.nodes = {}
+        if not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"读取构建状态失败，将完整重建: {e}")
+            return
+        if data.get("version") != BUILD_STATE_VERSION:
+            return
+        self.nodes = data.get("nodes", {})
+
+    def save(self) -> bool:
+        """写回构建状态（先写临时文件再替换）。"""
+        tmp_path = self.state_path + ".tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"version": BUILD_STATE_VERSION, "nodes": self.nodes},
+                          f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, self.state_path)
+            return True
+        except Exception as e:
+            print(f"保存构建状态失败: {e}")
+            return False
+
+    def explain(self, node: str, inputs: Dict[str, object]) -> List[str]:
+        """节点过期原因（空列表表示最新）。"""
+        recorded = self.nodes.get(node)
+        if recorded is None:
+            return ["首次构建"]
+        return [INPUT_LABELS.get(name, name) for name, value in inputs.items()
+                if recorded.get(name) != value]
+
+    def record(self, node: str, inputs: Dict[str, object]):
+        self.nodes[node] = inputs
+
+    def forget(self, node: str):
+        self.nodes.pop(node, None)
+
+
+class BuildInputs:
+    """计算各节点当前输入指纹（同一次运行内共用名称映射与生成器）。"""
+
+    def __init__(self, configurator, hint_lines: List[str]):
+        from generate_ui_textures import UITextureGenerator, __file__ as textures_file
+        from iooh_configurator import __file__ as configurator_file
+        from iooh_keys import __file__ as keys_file
+        from iooh_main_ini import __file__ as main_ini_file
+        from iooh_options import __file__ as options_file
+
+        self.configurator = configurator
+        self.hint_lines = hint_lines
+        self.generator = UITextureGenerator(base_output_dir=configurator._resolve_output_dir())
+        # mod 选择器块与 IOOHmod.ini 的文本由这几个模块共同生成（模板在 iooh_main_ini）
+        self._configurator_tool = _tool_fp(configurator_file, main_ini_file, keys_file, options_file)
+        self._textures_tool = _tool_fp(textures_file)
+        self.selector = digest({
+            "ring": configurator._selector_ring(),
+            "keys": [configurator.iooh_keys.key_line(action) for action in ACTIONS],
+        })
+        self.options = digest(configurator.options.values)
+        # mod 选择器块不受只影响 IOOHmod.ini 的选项（面板绘制方式）左右，切换时不必重写全部 mod ini
+        self.inject_options = digest({name: value for name, value in configurator.options.values.items()
+                                      if name not in MAIN_INI_OPTIONS})
+        self.muban = _fp(self.generator.muban_src)
+        self.fonts = digest([[path, _fp(path)] for path in self.generator.font_files()])
+        roster = [{"name": mod.name, "character_id": mod.character_id} for mod in configurator.mods]
+        self.characters = self.generator.match_characters(roster)
+
+    def _texture_path(self, name: str) -> str:
+        return os.path.join(self.generator.output_dir, name)
+
+    def mod(self, mod) -> Dict[str, object]:
+        return {
+            "tool": self._configurator_tool,
+            "bindings": digest([[b.ini_file, b.section_name, b.key] for b in mod.key_bindings]),
+            "character_id": mod.character_id,
+            "selector": self.selector,
+            "options": self.inject_options,
+            "ini_files": digest([[path, _fp(path)] for path in mod.ini_files]),
+        }
+
+    def main_ini(self) -> Dict[str, object]:
+        return {
+            "tool": self._configurator_tool,
+            "roster": digest([[m.character_id, m.name] for m in self.configurator.mods]),
+            "selector": self.selector,
+            "muban": self.muban,
+            "options": self.options,
+            "output": _fp(os.path.join(self.configurator._resolve_output_dir(), "IOOHmod.ini")),
+        }
+
+    def texture(self, char: dict, idx: int) -> Dict[str, object]:
+        char_id = char.get("id", idx)
+        avatar = self.generator._find_avatar(char["keywords"])
+        return {
+            "tool": self._textures_tool,
+            "character": digest(char),
+            "avatar": [avatar, _fp(avatar)],
+            "fonts": self.fonts,
+            "muban": self.muban,
+            "output": [_fp(self._texture_path(f"character_{char_id}_avatar.png")),
+                       _fp(self._texture_path(f"character_{char_id}_text.png"))],
+        }
+
+    def textures_shared(self) -> Dict[str, object]:
+        return {
+            "tool": self._textures_tool,
+            "hint": digest(self.hint_lines),
+            "fonts": self.fonts,
+            "muban": self.muban,
+            "output": [_fp(self._texture_path(name))
+                       for name in ("status_enabled.png", "status_disabled.png", "hint_keys.png")],
+        }
+
+    def config(self) -> Dict[str, object]:
+        return {
+            "scan": digest(self.configurator.config_data()),
+            "output": _fp(self.configurator.config_file),
+        }
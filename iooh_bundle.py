@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""配置包：把一台机器上的配置结果原样部署到装有相同 mod 的其他机器。
+
+多台电脑使用同一套 mod 时，每台都要重复扫描、注入与纹理渲染。配置包（zip）收录
+一次配置运行的全部产物：
+
+- 注入后的 mod ini（Mods 目录下的相对路径），各带「原始内容指纹」：
+  剥离 IOOH 注入（含注入时新建的 [Constants] 段头）、统一换行后的文本的 sha256——
+  目标机上的 ini 无论是原版还是注入过旧版本，只要 mod 本身相同，指纹就一致
+- IOOHmod.ini 及其引用的纹理、着色器（输出目录下的相对路径）
+- IOOH 菜单按键配置、注入选项，以及该 Mods 目录的角色 ID 登记项与槽位容量
+
+导入时先逐个核对目标 ini 的指纹，全部吻合才写入（有任一缺失或不符即整体放弃，
+避免 IOOHmod.ini 与 mod 选择器不同步）；写入走预写日志，原始 ini 进备份仓库，
+可照常「恢复备份」或回滚。导入不扫描、不渲染，构建状态清空（下次自动配置完整重建）。
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+import zipfile
+from typing import List, Optional
+
+from iooh_build import mod_node
+from iooh_keys import IOOH_KEYS_FILENAME
+from iooh_options import OPTIONS_FILENAME
+
+BUNDLE_VERSION = 1
+_MANIFEST = "manifest.json"
+# 随包分发的配置文件（输出目录下）
+_CONFIG_FILES = [IOOH_KEYS_FILENAME, OPTIONS_FILENAME]
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _normalized_text(data: bytes) -> str:
+    return data.decode('utf-8', errors='replace').replace('\r\n', '\n')
+
+
+# 注入时原 ini 没有 [Constants] 会在文件头新建一个；剥离只删变量声明，段头留在文件头
+_LEADING_CONSTANTS_HEADER = re.compile(r'\A\[Constants\][ \t]*\n(?:[ \t]*\n)*')
+
+
+def _identity_text(configurator, text: str) -> str:
+    """指纹所用的规范文本：剥离 IOOH 注入，再去掉文件头的 [Constants] 段头行。
+
+    无法区分残留的段头是注入新建的还是原本就有的，因此两边一律去掉：原本以 [Constants]
+    开头的 ini，原版与注入后都去掉同一行；原本没有的，注入后残留的段头被去掉，与原版一致。
+    """
+    return _LEADING_CONSTANTS_HEADER.sub('', configurator._strip_local_selector(text), count=1)
+
+
+def ini_identity(configurator, data: bytes) -> str:
+    """mod ini 的原始内容指纹：统一换行、剥离 IOOH 注入后的规范文本的 sha256。"""
+    return _sha256(_identity_text(configurator, _normalized_text(data)).encode('utf-8'))
+
+
+def _portable(relative: str) -> str:
+    """包内一律用 / 分隔的相对路径（与源机器平台无关）。"""
+    return relative.replace(os.sep, "/")
+
+
+def _local(relative: str) -> str:
+    return relative.replace("/", os.sep)
+
+
+def _safe_target(base: str, relative: str) -> Optional[str]:
+    """包内相对路径 → base 下的目标路径；绝对路径、含 .. 或解析后（含符号链接）
+    落在 base 之外时返回 None。配置包来自其他机器，路径一律视为不可信。"""
+    if not relative or relative.startswith(("/", "\\")) or ":" in relative:
+        return None
+    if any(part in ("", ".", "..") for part in relative.replace("\\", "/").split("/")):
+        return None
+    target = os.path.join(base, _local(relative))
+    base_real = os.path.realpath(base)
+    if not os.path.realpath(target).startswith(base_real.rstrip(os.sep) + os.sep):
+        return None
+    return target
+
+
+def _referenced_outputs(main_ini: str, output_dir: str) -> List[str]:
+    """IOOHmod.ini 引用的、位于输出目录下的文件（纹理、着色器），返回相对路径。"""
+    found = []
+    with open(main_ini, 'r', encoding='utf-8') as f:
+        for line in f:
+            _, sep, value = line.partition('=')
+            if not sep:
+                continue
+            relative = value.strip().strip('"').replace('\\', os.sep)
+            if not relative or os.path.isabs(relative) or relative.startswith('$'):
+                continue
+            path = os.path.normpath(os.path.join(output_dir, relative))
+            if os.path.isfile(path) and path.startswith(os.path.abspath(output_dir) + os.sep):
+                found.append(_portable(os.path.relpath(path, output_dir)))
+    return sorted(set(found))
+
+
+def export_bundle(configurator, bundle_path: str) -> Optional[dict]:
+    """把当前（已扫描、已配置）的结果打包；配置不是最新时返回 None。
+
+    返回 {"inis", "outputs", "bytes"} 统计。
+    """
+    directory = configurator.mods_directory
+    output_dir = os.path.abspath(configurator._resolve_output_dir())
+    main_ini = os.path.join(output_dir, "IOOHmod.ini")
+    if configurator.pending_run() is not None:
+        print("存在未完成的配置运行，请先继续或回滚")
+        return None
+    if not os.path.isfile(main_ini):
+        print("尚未生成 IOOHmod.ini，请先执行自动配置")
+        return None
+    plan = configurator.plan_run()
+    stale = [node for node, why in plan.reasons.items()
+             if why and (node.startswith(mod_node("")) or node == "main_ini")]
+    if stale:
+        print(f"配置不是最新（{len(stale)} 个节点需重建，如 {stale[0]}），请先执行自动配置")
+        return None
+
+    manifest = {
+        "version": BUNDLE_VERSION,
+        "created": time.strftime('%Y-%m-%d %H:%M:%S'),
+        "source_directory": directory,
+        "inis": [],
+        "outputs": [],
+        "config": [],
+        "registry": {
+            "entries": configurator.id_registry.entries(directory),
+            "capacity": configurator.id_registry.capacity(directory),
+        },
+    }
+    tmp_path = bundle_path + ".tmp"
+    with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_DEFLATED) as bundle:
+        for mod in configurator.mods:
+            for ini_file in mod.ini_files:
+                with open(ini_file, 'rb') as f:
+                    data = f.read()
+                text = _normalized_text(data)
+                if configurator._strip_local_selector(text) == text:
+                    continue  # 未被注入（如无按键的 ini），目标机上原样即可
+                base = _sha256(_identity_text(configurator, text).encode('utf-8'))
+                relative = _portable(os.path.relpath(ini_file, directory))
+                bundle.writestr("mods/" + relative, data)
+                manifest["inis"].append({"path": relative, "base": base, "sha256": _sha256(data)})
+        for relative in ["IOOHmod.ini"] + _referenced_outputs(main_ini, output_dir):
+            bundle.write(os.path.join(output_dir, _local(relative)), "output/" + relative)
+            manifest["outputs"].append(relative)
+        for name in _CONFIG_FILES:
+            if os.path.isfile(os.path.join(output_dir, name)):
+                bundle.write(os.path.join(output_dir, name), "output/" + name)
+                manifest["config"].append(name)
+        bundle.writestr(_MANIFEST, json.dumps(manifest, ensure_ascii=False, indent=2))
+    os.replace(tmp_path, bundle_path)
+    return {"inis": len(manifest["inis"]), "outputs": len(manifest["outputs"]),
+            "bytes": os.path.getsize(bundle_path)}
+
+
+def _write_bytes(configurator, path: str, data: bytes):
+    """按字节写回（保留包内原样换行），受预写日志保护。"""
+    configurator.journal.before_write(path)
+    configurator._ensure_writable(path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".iooh_tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    configurator.journal.after_write(path)
+
+
+def _unlisted_injected(configurator, directory: str, listed: set) -> List[str]:
+    """目标目录中已带 IOOH 注入、但不在配置包内的 ini（相对路径）。
+
+    顶层文件夹的取舍与扫描一致（扫描规则跳过的、工具输出目录、含 IOOHmod.ini 的不算）。
+    这些 ini 保留旧的选择器 id 序列，而 IOOHmod.ini 会换成包内名册，二者会不同步。
+    """
+    script_dir = os.path.abspath(configurator._resolve_output_dir())
+    rules = configurator.scan_rules
+    found = []
+    for item in sorted(os.listdir(directory)):
+        item_path = os.path.join(directory, item)
+        if rules.skip_mod_folder(item) or os.path.abspath(item_path) == script_dir or not os.path.isdir(item_path):
+            continue
+        try:
+            ini_files = rules.find_ini_files(item_path)
+        except OSError:
+            continue
+        if any(os.path.basename(f).lower() == 'ioohmod.ini' for f in ini_files):
+            continue
+        for ini_file in ini_files:
+            relative = _portable(os.path.relpath(ini_file, directory))
+            if relative in listed:
+                continue
+            try:
+                with open(ini_file, 'rb') as f:
+                    text = _normalized_text(f.read())
+            except OSError:
+                continue
+            if configurator._strip_local_selector(text) != text:
+                found.append(relative)
+    return found
+
+
+def import_bundle(configurator, bundle_path: str, directory: str, dry_run: bool = False) -> dict:
+    """把配置包部署到 directory（目标机的 Mods 目录）。
+
+    返回报告 {"ok", "written", "unchanged", "missing", "mismatched", "unsafe", "unlisted", "outputs", "error"}；
+    missing / mismatched / unsafe / unlisted 非空或 error 非空时不写入任何文件。dry_run 只核对。
+    unlisted 为目标目录中包外的已注入 ini（其选择器会与导入的 IOOHmod.ini 不同步）。
+    """
+    report = {"ok": False, "written": 0, "unchanged": 0, "missing": [], "mismatched": [], "unsafe": [],
+              "unlisted": [], "outputs": 0, "error": ""}
+    output_dir = os.path.abspath(configurator._resolve_output_dir())
+    with zipfile.ZipFile(bundle_path) as bundle:
+        manifest = json.loads(bundle.read(_MANIFEST).decode('utf-8'))
+        if manifest.get("version") != BUNDLE_VERSION:
+            report["error"] = f"配置包版本不受支持: {manifest.get('version')}"
+            return report
+
+        # 先校验包内全部路径：只允许落在 Mods 目录 / 输出目录之下，配置文件只认已知文件名
+        outputs = []
+        for relative in manifest["outputs"] + manifest["config"]:
+            target = _safe_target(output_dir, relative)
+            if target is None or (relative in manifest["config"] and relative not in _CONFIG_FILES):
+                report["unsafe"].append(relative)
+            else:
+                outputs.append((target, relative))
+        inis = []
+        for item in manifest["inis"]:
+            target = _safe_target(directory, item["path"])
+            if target is None:
+                report["unsafe"].append(item["path"])
+            else:
+                inis.append((target, item))
+        if report["unsafe"]:
+            report["error"] = "配置包含有非法路径（目标目录之外或不是已知的配置文件），已拒绝，未写入任何文件"
+            return report
+        if configurator.pending_run() is not None:
+            report["error"] = "存在未完成的配置运行，请先继续或回滚"
+            return report
+
+        pending: List[tuple] = []
+        for target, item in inis:
+            if not os.path.isfile(target):
+                report["missing"].append(item["path"])
+                continue
+            with open(target, 'rb') as f:
+                data = f.read()
+            if _sha256(data) == item["sha256"]:
+                report["unchanged"] += 1
+            elif ini_identity(configurator, data) == item["base"]:
+                pending.append((target, item))
+            else:
+                report["mismatched"].append(item["path"])
+        report["unlisted"] = _unlisted_injected(configurator, directory, {item["path"] for _, item in inis})
+        if report["unlisted"]:
+            report["error"] = "目标目录中有配置包之外的已注入 ini（其选择器会与导入的 IOOHmod.ini 不同步），未写入任何文件"
+        if report["missing"] or report["mismatched"] or report["unlisted"] or dry_run:
+            report["ok"] = not report["missing"] and not report["mismatched"] and not report["unlisted"]
+            return report
+
+        if not configurator.journal.begin(directory, None, False):
+            report["error"] = "存在未完成的配置运行，请先继续或回滚"
+            return report
+        completed = False
+        try:
+            for target, item in pending:
+                configurator.backup_store.backup_file(target)
+                _write_bytes(configurator, target, bundle.read("mods/" + item["path"]))
+                report["written"] += 1
+            configurator.backup_store.save()
+            for target, relative in outputs:
+                _write_bytes(configurator, target, bundle.read("output/" + relative))
+                report["outputs"] += 1
+            completed = True
+        finally:
+            configurator.finish_run(completed)
+
+    # 目标目录沿用包内的角色 ID 与槽位容量；按键与选项重新读取
+    registry = configurator.id_registry
+    entries = registry.entries(directory)
+    entries.clear()
+    entries.update(manifest["registry"]["entries"])
+    registry.set_capacity(directory, manifest["registry"]["capacity"])
+    registry.save()
+    configurator.iooh_keys.load()
+    configurator.options.load()
+    # 产物来自别处：旧的构建状态不再对应磁盘内容
+    configurator.build_state.nodes.clear()
+    configurator.build_state.save()
+    report["ok"] = True
+    return report
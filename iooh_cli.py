@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""EFMI Key Context Configurator - 命令行界面。
+
+不带参数运行入口脚本时打开图形界面；带子命令时走命令行，便于批处理与远程维护：
+
+    key_context_configurator.py scan <Mods目录>
+    key_context_configurator.py config <Mods目录> [--mods 名称通配符 ...] [--force] [--explain] [--dry-run]
+    key_context_configurator.py resume | rollback
+    key_context_configurator.py compact-ids <Mods目录>
+    key_context_configurator.py analyze <Mods目录> [--sort 字段] [--json]
+    key_context_configurator.py conflicts <Mods目录> [--json]
+    key_context_configurator.py simulate <Mods目录> [--keys 动作或按键 ...] [--random N] [--seed S]
+    key_context_configurator.py set-key <Mods目录> <动作> <按键>
+    key_context_configurator.py export <Mods目录> <配置包.zip>
+    key_context_configurator.py import <Mods目录> <配置包.zip> [--dry-run]
+    key_context_configurator.py bench memory|snapshot|main_ini [--mods N] [--inis N] [--bindings N]
+"""
+
+import argparse
+import inspect
+import json
+import os
+import random
+import sys
+from typing import List
+
+from iooh_configurator import EFMIKeyConfigurator
+from iooh_keys import ACTIONS, ACTION_LABELS, menu_token
+from iooh_build import explain_lines
+from iooh_pipeline import build_config_pipeline
+from iooh_analyzer import COST_FIELDS, analyze_directory, format_bytes
+from iooh_sim import Simulator
+from iooh_bench import BENCHMARKS
+from iooh_bundle import export_bundle, import_bundle
+
+
+def _scan_streaming(configurator: EFMIKeyConfigurator, directory: str, limit: int = 0) -> bool:
+    """流式扫描并逐个打印发现的 mod；limit > 0 时发现这么多个后提前停止。"""
+    if not os.path.isdir(directory):
+        print(f"目录不存在: {directory}")
+        return False
+    scan = configurator.iter_scan_mods(directory)
+    try:
+        for mod, stats in scan:
+            char_id = mod.character_id if mod.character_id >= 0 else "新"
+            print(f"  [{stats.folders_done}/{stats.folders_total}] [{char_id}] {mod.name}: "
+                  f"{len(mod.ini_files)} 个ini, {len(mod.key_bindings)} 个按键绑定", flush=True)
+            if limit and stats.mods_found >= limit:
+                break
+    finally:
+        scan.close()
+    return True
+
+
+def _scan(configurator: EFMIKeyConfigurator, directory: str) -> bool:
+    """扫描目录；目录不存在时报错返回 False。"""
+    if not os.path.isdir(directory):
+        print(f"目录不存在: {directory}")
+        return False
+    configurator.scan_mods(directory)
+    return True
+
+
+def _cmd_scan(args) -> int:
+    configurator = EFMIKeyConfigurator()
+    if not _scan_streaming(configurator, args.directory, args.limit):
+        return 1
+    stats = configurator.last_scan_stats
+    print(f"共 {len(configurator.mods)} 个包含热键绑定的mod，{stats.bindings} 个按键绑定"
+          + ("" if stats.complete else "（已提前停止）"))
+    return 0
+
+
+def _cmd_config(args) -> int:
+    configurator = EFMIKeyConfigurator()
+    if not _scan(configurator, args.directory):
+        return 1
+    if not configurator.mods:
+        print("未检测到包含热键绑定的mod")
+        return 1
+
+    selected = None
+    if args.mods:
+        selected = configurator.select_mods(args.mods)
+        if not selected:
+            print(f"没有与 {' '.join(args.mods)} 匹配的mod")
+            return 1
+    plan = configurator.plan_run(selected, force=args.force)
+    if selected is not None:
+        if plan.full_inject_reason:
+            print(f"选择性配置扩大到其余 mod：{plan.full_inject_reason}")
+        else:
+            print(f"仅配置: {', '.join(m.name for m in plan.inject)}")
+    if args.explain or args.dry_run:
+        for line in explain_lines(plan.reasons, verbose=args.explain):
+            print(line)
+    if args.dry_run:
+        return 0
+
+    if not configurator.begin_run(plan, selected, args.force):
+        if configurator.pending_run() is not None:
+            print("上次配置运行未完成：请先执行 resume 继续，或 rollback 回滚")
+        return 1
+    return _execute(configurator, plan)
+
+
+def _execute(configurator: EFMIKeyConfigurator, plan) -> int:
+    """执行运行计划（预写日志已开启）；Ctrl+C 取消时等进行中的写入完成后保留日志。"""
+    if not plan.main_ini:
+        print("IOOHmod.ini 已是最新，保持不变")
+    executor = build_config_pipeline(configurator, plan, plan.hint_lines)
+    on_event = lambda event: configurator.record_event(plan, event)
+    try:
+        stages = executor.run(on_event=on_event)
+    except KeyboardInterrupt:
+        print("收到中断，等待进行中的写入完成...")
+        executor.cancel()
+        stages = executor.run(on_event=on_event)
+
+    results = stages["inject"].result or []
+    failed = [r.mod.name for r in results if not r.success]
+    print(f"注入完成: {len(results) - len(failed)}/{len(plan.inject)}"
+          f"（改写 {sum(len(r.written) for r in results)} 个ini）")
+    configurator.reconcile_injection(results)
+    configurator.finish_run(completed=not executor.cancelled)
+    for name, stage in stages.items():
+        status = "失败: " + stage.error if stage.error else "完成"
+        print(f"  {name}: {status} ({stage.elapsed:.2f}s)")
+    if executor.cancelled:
+        print("运行已取消：执行 resume 继续，或 rollback 回滚到运行前")
+        return 1
+    ok = not failed and not any(stage.error for stage in stages.values())
+    return 0 if ok else 1
+
+
+def _cmd_resume(args) -> int:
+    configurator = EFMIKeyConfigurator()
+    summary = configurator.pending_run()
+    if summary is None:
+        print("没有未完成的配置运行")
+        return 0
+    plan = configurator.resume_run()
+    if plan is None:
+        return 1
+    if args.explain:
+        for line in explain_lines(plan.reasons):
+            print(line)
+    return _execute(configurator, plan)
+
+
+def _cmd_rollback(args) -> int:
+    configurator = EFMIKeyConfigurator()
+    summary = configurator.pending_run()
+    if summary is None:
+        print("没有未完成的配置运行")
+        return 0
+    report = configurator.rollback_run()
+    print(f"已恢复 {report['restored']} 次文件改写（涉及 {summary['files']} 个文件）")
+    for path in report["failed"]:
+        print(f"  恢复失败: {path}")
+    return 0 if not report["failed"] else 1
+
+
+def _cmd_compact_ids(args) -> int:
+    configurator = EFMIKeyConfigurator()
+    if not _scan(configurator, args.directory):
+        return 1
+    remap = configurator.compact_ids()
+    if not remap:
+        print("角色ID已连续，无需整理")
+        return 0
+    for old_id, new_id in sorted(remap.items()):
+        print(f"  {old_id} → {new_id}")
+    print(f"已重新编号 {len(remap)} 个角色，请重新执行自动配置使 ini 与纹理生效")
+    return 0
+
+
+def _cmd_analyze(args) -> int:
+    configurator = EFMIKeyConfigurator()
+    if not os.path.isdir(args.directory):
+        print(f"目录不存在: {args.directory}")
+        return 1
+    costs = analyze_directory(configurator, args.directory)
+    if args.sort:
+        costs.sort(key=lambda c: -c.total(args.sort))
+    if args.json:
+        print(json.dumps({"directory": os.path.abspath(args.directory),
+                          "mods": [c.to_dict() for c in costs]}, ensure_ascii=False, indent=2))
+        return 0
+    header = "  ".join(f"{label:>15}" for _, label in COST_FIELDS)
+    print(f"{header}  Mod")
+    for cost in costs:
+        cells = []
+        for name, _ in COST_FIELDS:
+            value = cost.total(name)
+            cells.append(f"{format_bytes(value) if name == 'resource_bytes' else value:>15}")
+        print("  ".join(cells) + f"  {cost.name}")
+    print(f"共 {len(costs)} 个 mod，每帧命令合计 {sum(c.total('present_commands') for c in costs)}")
+    return 0
+
+
+def _cmd_conflicts(args) -> int:
+    configurator = EFMIKeyConfigurator()
+    if not _scan(configurator, args.directory):
+        return 1
+    conflicts = configurator.key_conflicts()
+    if args.json:
+        print(json.dumps([c.to_dict() for c in conflicts], ensure_ascii=False, indent=2))
+        return 1 if any(c.menu_actions for c in conflicts) else 0
+    for conflict in conflicts:
+        if conflict.menu_actions:
+            labels = "、".join(ACTION_LABELS[a]["zh"] for a in conflict.menu_actions)
+            print(f"✗ {conflict.press}: 与 IOOH 菜单键「{labels}」冲突")
+        else:
+            print(f"  {conflict.press}: {len(conflict.mod_paths)} 个 mod 同时触发")
+        for binding in conflict.bindings:
+            print(f"      {os.path.relpath(binding.ini_file, args.directory)} "
+                  f"[{binding.section_name}] key = {binding.key}")
+    menu = sum(1 for c in conflicts if c.menu_actions)
+    print(f"共 {len(conflicts)} 处冲突（其中 {menu} 处涉及菜单键），"
+          f"索引 {sum(len(b) for b in configurator.key_index.combos.values())} 个绑定")
+    return 1 if menu else 0
+
+
+def _cmd_simulate(args) -> int:
+    configurator = EFMIKeyConfigurator()
+    if not _scan(configurator, args.directory):
+        return 1
+    sim = Simulator.from_configurator(configurator)
+    if sim.main is None:
+        print("输出目录没有 IOOHmod.ini，请先执行 config")
+        return 1
+    # 按键序列：菜单动作名取当前绑定键，其余按 key 行格式原样按下；未指定时随机回放菜单键
+    if args.keys:
+        sequence = list(args.keys)
+    else:
+        rng = random.Random(args.seed)
+        sequence = ["toggle_menu"] + [rng.choice(ACTIONS) for _ in range(args.random)]
+    print(f"加载 {len(sim.programs)} 个 ini（其中 {len(sim.selector_ids)} 个注入了选择器），"
+          f"回放 {len(sequence)} 次按键")
+
+    # 回放在第一次不同步处停止（之后的状态已无参考意义）
+    problems = sim.check_sync()
+    press_ops: List[int] = []
+    frame_max: dict = {}
+    if problems:
+        print("✗ 回放前（初始状态）即不同步:")
+        for line in problems[:20]:
+            print(f"    {line}")
+    else:
+        for step, name in enumerate(sequence, 1):
+            combo = configurator.iooh_keys.token(name) if name in ACTIONS else name
+            press_ops.append(sim.press(combo))
+            for label, (ops, draws) in sim.frame().items():
+                frame_max[label] = max(frame_max.get(label, (0, 0)), (ops, draws))
+            problems = sim.check_sync()
+            if problems:
+                print(f"✗ 第 {step} 次按键（{name}）后不同步，停止回放:")
+                for line in problems[:20]:
+                    print(f"    {line}")
+                break
+
+    handler_keys, handler_lists = sim.handler_counts()
+    print(f"选择器处理器: {handler_keys} 个 Key 段，{handler_lists} 个 CommandList")
+    print(f"每次按键执行操作: 平均 {sum(press_ops) / max(1, len(press_ops)):.1f}，最多 {max(press_ops, default=0)}")
+    print(f"每帧执行操作（各文件峰值合计）: {sum(ops for ops, _ in frame_max.values())}，"
+          f"绘制 {sum(draws for _, draws in frame_max.values())}")
+    for label, (ops, draws) in sorted(frame_max.items(), key=lambda item: -item[1][0])[:args.top]:
+        if ops:
+            print(f"  {ops:>6} 操作 {draws:>4} 绘制  {label}")
+    for error in sim.errors[:20]:
+        print(f"  无法解释: {error}")
+    if problems:
+        return 1
+    print(f"✓ 同步检查通过：{len(sim.selector_ids)} 个注入 ini 与 IOOHmod.ini 始终一致")
+    return 0
+
+
+def _cmd_set_key(args) -> int:
+    token = menu_token(args.token)
+    if token is None:
+        print(f"无法识别的菜单键: {args.token}（只接受单个主键，如 VK_F5、VK_HOME、a、1）")
+        return 1
+    configurator = EFMIKeyConfigurator()
+    # 就地改写的文件会被未完成运行的回滚覆盖，先让用户继续或回滚
+    if configurator.pending_run() is not None:
+        print("上次配置运行未完成：请先执行 resume 继续，或 rollback 回滚")
+        return 1
+    if not _scan(configurator, args.directory):
+        return 1
+    configurator.iooh_keys.set_key(args.action, token)
+    configurator.iooh_keys.save()
+    report = configurator.apply_menu_key_change()
+    print(f"已就地改写 {report['patched']} 个ini（{report['unchanged']} 个无需改动），"
+          f"IOOHmod.ini: {report['main_ini']}，提示纹理: {'已更新' if report['hint'] else '失败'}")
+    if report["missing"] or report["failed"] or report["main_ini"] not in ("patched", "unchanged"):
+        for path in report["missing"]:
+            print(f"  未注入: {path}")
+        for path in report["failed"]:
+            print(f"  核对失败: {path}")
+        print("部分文件未能就地更新，请执行完整的自动配置")
+        return 1
+    return 0
+
+
+def _cmd_export(args) -> int:
+    configurator = EFMIKeyConfigurator()
+    if not _scan(configurator, args.directory):
+        return 1
+    stats = export_bundle(configurator, args.bundle)
+    if stats is None:
+        return 1
+    print(f"配置包已导出: {args.bundle}（{stats['inis']} 个注入的ini，{stats['outputs']} 个 IOOH 产物，"
+          f"{format_bytes(stats['bytes'])}）")
+    return 0
+
+
+def _cmd_import(args) -> int:
+    configurator = EFMIKeyConfigurator()
+    if not os.path.isdir(args.directory):
+        print(f"目录不存在: {args.directory}")
+        return 1
+    report = import_bundle(configurator, args.bundle, args.directory, dry_run=args.dry_run)
+    for path in report["missing"]:
+        print(f"  ✗ 缺少: {path}")
+    for path in report["mismatched"]:
+        print(f"  ✗ 内容不同: {path}")
+    for path in report["unsafe"]:
+        print(f"  ✗ 非法路径: {path}")
+    for path in report["unlisted"]:
+        print(f"  ✗ 包外已注入: {path}")
+    if not report["ok"]:
+        print(report["error"] or "mod 文件与配置包不一致，未写入任何文件；请在本机执行自动配置")
+        return 1
+    if args.dry_run:
+        print(f"核对通过：{report['unchanged']} 个ini已是包内内容，其余均可导入")
+        return 0
+    print(f"导入完成：写入 {report['written']} 个ini（{report['unchanged']} 个已一致），"
+          f"{report['outputs']} 个 IOOH 产物与配置")
+    return 0
+
+
+def _cmd_bench(args) -> int:
+    _, bench = BENCHMARKS[args.name]
+    # 只传该基准接受且命令行给出的参数，其余沿用基准自身的默认规模
+    given = {"mods": args.mods, "inis_per_mod": args.inis, "bindings_per_ini": args.bindings}
+    accepted = inspect.signature(bench).parameters
+    bench(**{name: value for name, value in given.items() if value is not None and name in accepted})
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="IOOH", description="EFMI IOOH 命令行工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("scan", help="扫描 Mods 目录并列出按键绑定（不改动 mod 文件；会更新角色 ID 登记表与扫描缓存）")
+    p.add_argument("directory", help="Mods 目录")
+    p.add_argument("--limit", type=int, default=0, metavar="N",
+                   help="发现 N 个含按键绑定的 mod 后提前停止（0 表示扫描全部）")
+    p.set_defaults(func=_cmd_scan)
+
+    p = sub.add_parser("config", help="注入选择器并生成 IOOHmod.ini 与纹理（可只处理选中的 mod）")
+    p.add_argument("directory", help="Mods 目录")
+    p.add_argument("--mods", nargs="+", metavar="NAME",
+                   help="只处理名称匹配这些通配符的 mod（不区分大小写）；名册未变时不重写 IOOHmod.ini")
+    p.add_argument("--force", action="store_true", help="忽略构建状态，重建全部节点")
+    p.add_argument("--explain", action="store_true", help="列出每个构建节点重建或保持最新的原因")
+    p.add_argument("--dry-run", action="store_true", help="只规划并列出需要重建的节点，不执行")
+    p.set_defaults(func=_cmd_config)
+
+    p = sub.add_parser("resume", help="继续上次被中断的配置运行（已完成的节点不重做）")
+    p.add_argument("--explain", action="store_true", help="列出剩余节点及原因")
+    p.set_defaults(func=_cmd_resume)
+
+    p = sub.add_parser("rollback", help="回滚上次被中断的配置运行，恢复运行前的全部文件")
+    p.set_defaults(func=_cmd_rollback)
+
+    p = sub.add_parser("compact-ids", help="整理角色ID：移除已删除 mod 的保留 id 并按名称重新编号")
+    p.add_argument("directory", help="Mods 目录")
+    p.set_defaults(func=_cmd_compact_ids)
+
+    p = sub.add_parser("analyze", help="静态分析各 mod ini 的每帧开销（Present 命令、绘制调用、资源等，只读）")
+    p.add_argument("directory", help="Mods 目录")
+    p.add_argument("--sort", choices=[name for name, _ in COST_FIELDS],
+                   help="按该字段从高到低排序（默认按每帧命令数）")
+    p.add_argument("--json", action="store_true", help="以 JSON 输出（含每个 ini 的明细）")
+    p.set_defaults(func=_cmd_analyze)
+
+    p = sub.add_parser("conflicts", help="列出跨 mod 的按键冲突，以及与 IOOH 菜单键的冲突（不改动 mod 文件）")
+    p.add_argument("directory", help="Mods 目录")
+    p.add_argument("--json", action="store_true", help="以 JSON 输出")
+    p.set_defaults(func=_cmd_conflicts)
+
+    p = sub.add_parser("simulate", help="本地模拟回放按键，核对各 ini 的 IOOH 变量同步并统计执行开销（不改动 mod 文件）")
+    p.add_argument("directory", help="Mods 目录")
+    p.add_argument("--keys", nargs="+", metavar="KEY",
+                   help="按键序列：菜单动作名（" + "/".join(ACTIONS) + "）或 key 行格式（如 \"alt /\"）")
+    p.add_argument("--random", type=int, default=200, metavar="N", help="未指定 --keys 时随机按下 N 次菜单键")
+    p.add_argument("--seed", type=int, default=0, help="随机序列的种子")
+    p.add_argument("--top", type=int, default=10, metavar="N", help="列出每帧开销最高的 N 个文件")
+    p.set_defaults(func=_cmd_simulate)
+
+    p = sub.add_parser("set-key", help="修改一个 IOOH 菜单键，并就地更新已注入的 ini、IOOHmod.ini 与提示纹理")
+    p.add_argument("directory", help="Mods 目录")
+    p.add_argument("action", choices=ACTIONS, help="菜单动作")
+    p.add_argument("token", help="3DMigoto 按键名（单个主键，不含修饰键），如 VK_F5、VK_HOME")
+    p.set_defaults(func=_cmd_set_key)
+
+    p = sub.add_parser("export", help="把当前配置结果（注入的ini、IOOHmod.ini、纹理、按键与角色ID）导出为配置包")
+    p.add_argument("directory", help="Mods 目录")
+    p.add_argument("bundle", help="配置包路径（.zip）")
+    p.set_defaults(func=_cmd_export)
+
+    p = sub.add_parser("import", help="在 mod 文件一致的机器上直接部署配置包（不扫描、不渲染）")
+    p.add_argument("directory", help="本机的 Mods 目录")
+    p.add_argument("bundle", help="配置包路径（.zip）")
+    p.add_argument("--dry-run", action="store_true", help="只核对 mod 文件是否与包一致，不写入")
+    p.set_defaults(func=_cmd_import)
+
+    p = sub.add_parser("bench", help="用合成数据运行性能基准（不读写 Mods 目录）",
+                       description="\n".join(f"{name}: {desc}" for name, (desc, _) in BENCHMARKS.items()),
+                       formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("name", choices=list(BENCHMARKS), help="基准名称")
+    p.add_argument("--mods", type=int, metavar="N", help="合成 mod 数（默认 memory/snapshot 2000，main_ini 1000）")
+    p.add_argument("--inis", type=int, metavar="N", help="每个 mod 的 ini 数（默认 4）")
+    p.add_argument("--bindings", type=int, metavar="N", help="每个 ini 的按键绑定数（默认 8）")
+    p.set_defaults(func=_cmd_bench)
+
+    return parser
+
+
+def is_cli_invocation(argv: List[str]) -> bool:
+    """argv（不含程序名）是否应走命令行：首个参数是已知子命令或以 - 开头。
+
+    其他参数（如拖放到 exe 上的文件夹路径）不进入命令行，仍打开图形界面——
+    窗口模式的 exe 没有控制台，argparse 报错退出时用户什么也看不到。
+    """
+    if not argv:
+        return False
+    sub = next(a for a in build_parser()._actions if isinstance(a, argparse._SubParsersAction))
+    return argv[0].startswith("-") or argv[0] in sub.choices
+
+
+def main(argv: List[str] = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
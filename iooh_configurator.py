@@ -15,15 +15,30 @@
 
 import os
 import re
-import shutil
 import json
 import stat
 import sys
-from typing import Dict, List
+from typing import Dict, Iterator, List, Tuple
 from datetime import datetime
 
-from iooh_models import ModKeyBinding, ModInfo
-from iooh_keys import IOOHKeyConfig
+from iooh_models import ModKeyBinding, ModInfo, InjectResult, RunPlan
+from iooh_keys import IOOHKeyConfig, ACTIONS
+from iooh_backup import BackupStore, BackupIntegrityError
+from iooh_fileops import fast_copy, file_digest, COPY_SKIPPED
+from iooh_scan_rules import ScanRules, ScanStats
+from iooh_scan_cache import ScanCache, prefilter_ini, prefilter_bytes
+from iooh_id_registry import IDRegistry, mod_identity
+from iooh_options import InjectionOptions
+from iooh_build import BuildState, BuildInputs, INPUT_LABELS, mod_node, texture_node
+from iooh_journal import RunJournal
+from iooh_key_conflicts import KeyConflictIndex, KeyConflict
+from iooh_snapshot import ScanSnapshot, rules_digest
+from iooh_main_ini import render_main_ini, selector_step_lines
+from iooh_pipeline import EVENT_ITEM, EVENT_STAGE_DONE
+
+# [Present] 门控块的起止标记（注入与剥离共用，确保可逆）
+PRESENT_GATE_BEGIN = "; ===== IOOH Present 门控 ====="
+PRESENT_GATE_END = "; ===== IOOH Present 门控结束 ====="
 
 
 class EFMIKeyConfigurator:
@@ -35,6 +50,27 @@ class EFMIKeyConfigurator:
         self.config_file = os.path.join(self._get_output_dir(), "xxmi_key_config.json")
         # IOOH 菜单四个控制键的单一数据源（持久化在 exe/脚本同级）
         self.iooh_keys = IOOHKeyConfig(self._get_output_dir())
+        # ini 备份仓库（内容寻址 + 压缩，位于 exe/脚本同级 iooh_backups/）
+        self.backup_store = BackupStore(self._get_output_dir())
+        # 扫描包含/排除与剪枝规则（持久化在 exe/脚本同级 iooh_scan_rules.json）
+        self.scan_rules = ScanRules(self._get_output_dir())
+        self.last_scan_stats = ScanStats()
+        # ini 预筛结论与按键绑定缓存（按文件指纹失效，持久化在 exe/脚本同级）
+        self.scan_cache = ScanCache(self._get_output_dir())
+        # 角色 ID 登记表：按 mod 文件夹身份保持 id 稳定（持久化在 exe/脚本同级）
+        self.id_registry = IDRegistry(self._get_output_dir())
+        # 注入选项（选择器槽位容量模式等，持久化在 exe/脚本同级 iooh_options.json）
+        self.options = InjectionOptions(self._get_output_dir())
+        # 构建图状态：各产物上次构建的输入指纹（只重建过期节点，持久化在 exe/脚本同级）
+        self.build_state = BuildState(self._get_output_dir())
+        # 配置运行的预写日志（中断后继续/回滚；写前内容存入备份仓库）
+        self.journal = RunJournal(self._get_output_dir(), self.backup_store)
+        # 按键冲突倒排索引（规范化按键组合 -> 绑定，扫描时增量建立）
+        self.key_index = KeyConflictIndex()
+        # 上次完整扫描结果的二进制快照（启动时立即恢复列表，后台校验后只重扫变化的 mod）
+        self.snapshot = ScanSnapshot(self._get_output_dir())
+        # self.mods 是否为某目录的完整结果（提前停止的扫描不写快照）
+        self._mods_complete = False
 
     @staticmethod
     def _get_bundle_dir() -> str:
@@ -63,7 +99,11 @@ class EFMIKeyConfigurator:
         return h / w
 
     def _ensure_runtime_shader_assets(self):
-        """Copy bundled runtime assets (shaders + muban 模板) next to the executable."""
+        """Copy bundled runtime assets (shaders + muban 模板) next to the executable.
+
+        内容未变的文件直接跳过；需要复制时走 reflink → 硬链接 → 复制的快速路径
+        （这些资源部署后只读，允许硬链接）。
+        """
         self._copy_bundled_tree("shaders")
         # muban 模板源在 assets/，复制到运行时渲染目录 resources/textures/
         # （用户头像在 exe 同级 rolepicture/，由纹理生成器按需读取，不在此复制）
@@ -71,10 +111,10 @@ class EFMIKeyConfigurator:
         dst = os.path.join(self._resolve_output_dir(), "resources", "textures", "muban.png")
         if os.path.isfile(src) and os.path.normcase(os.path.abspath(src)) != os.path.normcase(os.path.abspath(dst)):
             os.makedirs(os.path.dirname(dst), exist_ok=True)
-            shutil.copy2(src, dst)
+            fast_copy(src, dst, allow_hardlink=True)
 
     def _copy_bundled_tree(self, rel_dir: str):
-        """Copy a bundled directory tree to the output dir (skip when identical)."""
+        """Copy a bundled directory tree to the output dir (skip files whose content already matches)."""
         source_dir = os.path.join(self._get_bundle_dir(), rel_dir)
         target_dir = os.path.join(self._resolve_output_dir(), rel_dir)
         if not os.path.isdir(source_dir):
@@ -92,7 +132,7 @@ class EFMIKeyConfigurator:
             for file in files:
                 source_file = os.path.join(root, file)
                 target_file = os.path.join(current_target_dir, file)
-                shutil.copy2(source_file, target_file)
+                fast_copy(source_file, target_file, allow_hardlink=True)
 
     @staticmethod
     def _ensure_writable(filepath: str):
@@ -100,15 +140,69 @@ class EFMIKeyConfigurator:
         if os.path.exists(filepath) and not os.access(filepath, os.W_OK):
             os.chmod(filepath, stat.S_IWRITE | stat.S_IREAD)
 
+    def _journaled_write(self, path: str, content: str):
+        """写回文本文件；配置运行中先由预写日志记录写前内容，写完再记一笔。
+
+        先写同目录临时文件再 os.replace，写入失败（权限、文件被占用）时原文件保持不变。
+        """
+        self.journal.before_write(path)
+        self._ensure_writable(path)
+        tmp_path = path + ".iooh_tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        self.journal.after_write(path)
+
     @staticmethod
     def _is_disabled_folder(folder_name: str) -> bool:
         """Return True when a folder name marks it as disabled."""
         return "disabled" in os.path.basename(os.path.normpath(folder_name)).lower()
 
     def restore_backups(self, directory: str):
-        """恢复所有备份文件，确保从干净状态开始"""
+        """恢复所有备份文件，确保从干净状态开始
+
+        优先从备份仓库还原（解压后校验 sha256，损坏的块拒绝写回）；
+        仓库中没有记录的文件再按旧版 `.backup` 副本还原。
+        """
         print("恢复备份文件...")
         restored_count = 0
+        unchanged_count = 0
+        failed_count = 0
+        restored_keys = set()
+
+        for path in self.backup_store.paths_under(directory):
+            if self._is_disabled_path(path, directory):
+                continue
+            restored_keys.add(os.path.normcase(os.path.abspath(path)))
+            # 目标已是原始内容（大小与 sha256 均一致）：无需解压、无需写回
+            original = self.backup_store.generations(path)[0]
+            try:
+                if os.path.getsize(path) == original["size"] and file_digest(path) == original["sha256"]:
+                    unchanged_count += 1
+                    continue
+            except OSError:
+                pass
+            try:
+                data = self.backup_store.original_bytes(path)
+            except BackupIntegrityError as e:
+                print(f"恢复 {os.path.basename(path)} 失败（备份校验不通过，未改动原文件）: {e}")
+                failed_count += 1
+                continue
+            try:
+                self._ensure_writable(path)
+                with open(path, 'wb') as f:
+                    f.write(data)
+                restored_count += 1
+            except Exception as e:
+                print(f"恢复 {os.path.basename(path)} 失败: {e}")
+                failed_count += 1
 
         for root, dirs, files in os.walk(directory):
             dirs[:] = [d for d in dirs if not self._is_disabled_folder(d)]
@@ -117,35 +211,54 @@ class EFMIKeyConfigurator:
                 if file.endswith('.backup'):
                     backup_path = os.path.join(root, file)
                     original_path = backup_path[:-7]  # 去掉 .backup
+                    if os.path.normcase(os.path.abspath(original_path)) in restored_keys:
+                        continue
 
                     try:
                         self._ensure_writable(original_path)
-                        shutil.copy2(backup_path, original_path)
-                        restored_count += 1
+                        # 还原后的 ini 会被注入原地改写，不能与 .backup 共享数据：只走 reflink/复制
+                        if fast_copy(backup_path, original_path) == COPY_SKIPPED:
+                            unchanged_count += 1
+                        else:
+                            restored_count += 1
                     except Exception as e:
                         print(f"恢复 {file} 失败: {e}")
+                        failed_count += 1
 
         if restored_count > 0:
             print(f"✓ 已恢复 {restored_count} 个备份文件")
-        else:
+        elif not unchanged_count:
             print("未找到备份文件（首次配置）")
+        if unchanged_count:
+            print(f"  {unchanged_count} 个文件已是原始内容，跳过")
+        if failed_count:
+            print(f"✗ {failed_count} 个文件恢复失败")
+
+    def _is_disabled_path(self, path: str, directory: str) -> bool:
+        """路径在 directory 之下的任一级目录被标记为 disabled 时返回 True。"""
+        rel_dir = os.path.dirname(os.path.relpath(path, directory))
+        if not rel_dir or rel_dir == os.curdir:
+            return False
+        return any(self._is_disabled_folder(part) for part in rel_dir.split(os.sep))
 
     def backup_mod(self, mod: ModInfo):
-        """为指定 mod 的所有 ini 创建 .backup 副本（幂等）"""
+        """把指定 mod 的所有 ini 原始内容存入备份仓库（幂等，相同内容只存一份）"""
         for ini_file in mod.ini_files:
-            backup_path = ini_file + '.backup'
             try:
-                if not os.path.exists(backup_path):
-                    shutil.copy2(ini_file, backup_path)
+                self.backup_store.backup_file(ini_file)
+                mod.ini_file_backups[ini_file] = True
             except Exception as e:
                 print(f"备份 {ini_file} 失败: {e}")
+        mod.has_backup = bool(mod.ini_files) and all(mod.ini_file_backups.get(f) for f in mod.ini_files)
+        self.backup_store.save()
 
-    def save_config(self, output_path: str = None) -> bool:
-        """保存扫描结果与按键信息，便于调试/复用"""
-        if output_path is None:
-            output_path = self.config_file
+    def backup_report(self) -> dict:
+        """返回备份仓库空间统计（文件数、唯一块数、原始/压缩字节与节省比例）。"""
+        return self.backup_store.stats()
 
-        data = {
+    def config_data(self) -> dict:
+        """xxmi_key_config.json 的内容：扫描结果与按键信息。"""
+        return {
             "mods": [
                 {
                     "name": mod.name,
@@ -166,83 +279,436 @@ class EFMIKeyConfigurator:
             ]
         }
 
+    def save_config(self, output_path: str = None) -> bool:
+        """保存扫描结果与按键信息，便于调试/复用"""
+        if output_path is None:
+            output_path = self.config_file
+
+        data = self.config_data()
+
         try:
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            self._journaled_write(output_path, json.dumps(data, ensure_ascii=False, indent=2))
             print(f"配置已保存到: {output_path}")
             return True
         except Exception as e:
             print(f"保存配置失败: {e}")
             return False
 
+    def select_mods(self, patterns: List[str]) -> List[ModInfo]:
+        """按名称通配符（不区分大小写）从当前扫描结果中挑选 mod。"""
+        import fnmatch
+        lowered = [p.lower() for p in patterns]
+        return [mod for mod in self.mods
+                if any(fnmatch.fnmatchcase(mod.name.lower(), p) for p in lowered)]
+
+    def plan_run(self, selected: List[ModInfo] = None, force: bool = False,
+                 hint_lines: List[str] = None) -> RunPlan:
+        """按构建图规划一次配置运行：只重建输入指纹与上次构建不同的节点。
+
+        force=True 时全部重建。selected 给定时为选择性运行：选中的 mod 及其纹理总是重建，
+        其余 mod 只有选择器参数（循环序列、菜单键）变化时才随之重写——所有选择器块必须同步；
+        名册节点（IOOHmod.ini、纹理、配置）照常按过期与否决定。
+        plan.reasons 记录每个节点的重建原因（--explain）。
+        """
+        hint_lines = hint_lines if hint_lines is not None else self.iooh_keys.hint_lines("zh")
+        inputs = BuildInputs(self, hint_lines)
+        state = self.build_state
+        chosen = {id(mod) for mod in selected} if selected is not None else set()
+
+        def stale(node: str, node_inputs: dict, pinned: bool = False) -> bool:
+            if force:
+                plan.reasons[node] = ["强制重建"]
+            elif pinned:
+                plan.reasons[node] = ["选中"]
+            else:
+                plan.reasons[node] = state.explain(node, node_inputs)
+            return bool(plan.reasons[node])
+
+        plan = RunPlan([])
+        plan.hint_lines = hint_lines
+        plan.inputs = inputs
+        selector_label = INPUT_LABELS["selector"]
+        for mod in self.mods:
+            node = mod_node(mod_identity(mod))
+            if not stale(node, inputs.mod(mod), id(mod) in chosen):
+                continue
+            if selected is None or id(mod) in chosen or force:
+                plan.inject.append(mod)
+            elif selector_label in plan.reasons[node] or plan.reasons[node] == ["首次构建"]:
+                plan.inject.append(mod)
+                plan.full_inject_reason = "选择器循环范围或菜单键已变化，所有选择器块需同步"
+            else:
+                plan.reasons[node] = []   # 选择性运行：未选中且无需同步，本次不处理
+
+        plan.main_ini = stale("main_ini", inputs.main_ini())
+        chosen_ids = {mod.character_id for mod in selected} if selected is not None else set()
+        plan.texture_ids = set()
+        for idx, char in enumerate(inputs.characters):
+            char_id = char.get("id", idx)
+            if stale(texture_node(char_id), inputs.texture(char, idx), char_id in chosen_ids):
+                plan.texture_ids.add(char_id)
+        plan.shared_textures = stale("textures_shared", inputs.textures_shared())
+        plan.save_config = stale("config", inputs.config())
+        return plan
+
+    @property
+    def mods_complete(self) -> bool:
+        """self.mods 是否为 mods_directory 的完整扫描结果（提前停止的扫描为 False）。"""
+        return self._mods_complete
+
+    def begin_run(self, plan: RunPlan, selected: List[ModInfo] = None, force: bool = False) -> bool:
+        """开始一次有预写日志保护的配置运行；存在未完成的运行或名册不完整时返回 False。
+
+        提前停止的扫描只得到部分名册，据此重写 IOOHmod.ini 与选择器循环会让未扫描到的
+        mod 与菜单失去同步，因此拒绝运行。
+        """
+        if not self._mods_complete:
+            print("mod 列表只包含部分 mod（扫描被提前停止），请先完整扫描再配置")
+            return False
+        identities = [mod_identity(m) for m in selected] if selected is not None else None
+        return self.journal.begin(self.mods_directory, identities, force)
+
+    def record_event(self, plan: RunPlan, event: tuple):
+        """流水线事件 → 构建节点完成：写入运行日志并更新（内存中的）构建状态。"""
+        kind, stage, payload = event
+        done = []
+        if kind == EVENT_ITEM and stage == "inject":
+            node = mod_node(mod_identity(payload.mod))
+            if payload.success:
+                done.append((node, plan.inputs.mod(payload.mod)))
+            else:
+                self.build_state.forget(node)
+        elif kind == EVENT_ITEM and stage == "textures":
+            done.append((texture_node(payload["id"]), plan.inputs.texture(payload, payload["id"])))
+        elif kind == EVENT_STAGE_DONE and stage == "main_ini":
+            done.append(("main_ini", plan.inputs.main_ini()))
+        elif kind == EVENT_STAGE_DONE and stage == "textures_shared" and plan.shared_textures:
+            done.append(("textures_shared", plan.inputs.textures_shared()))
+        elif kind == EVENT_STAGE_DONE and stage == "save_config":
+            done.append(("config", plan.inputs.config()))
+        for node, inputs in done:
+            self.journal.node_done(node, inputs)
+            self.build_state.record(node, inputs)
+
+    def finish_run(self, completed: bool):
+        """运行结束：正常完成则保存构建状态并删除日志；被取消/失败中断则保留日志待继续或回滚。"""
+        if completed:
+            self.build_state.save()
+            self.journal.finish()
+        else:
+            # 内存中的构建状态含本次未提交的节点，回到磁盘版本（已完成节点在日志里，继续时回放）
+            self.build_state.load()
+            self.journal.close()
+
+    def pending_run(self) -> dict:
+        """未完成运行的概况；没有则返回 None。"""
+        if not self.journal.pending():
+            return None
+        return self.journal.summary()
+
+    def resume_run(self, hint_lines: List[str] = None) -> RunPlan:
+        """继续上次未完成的运行：还原写了一半的文件，重新扫描原目录，回放已完成节点，
+        按原选择范围重新规划（已完成节点不重做）。目录已不存在时返回 None。
+        """
+        summary = self.journal.summary()
+        begin = summary["begin"]
+        directory = begin.get("mods_directory", "")
+        if not directory or not os.path.isdir(directory):
+            print(f"未完成运行的 Mods 目录不存在: {directory}")
+            return None
+        repaired = self.journal.repair_torn()
+        if repaired:
+            print(f"已还原 {repaired} 个写入中断的文件")
+
+        self.scan_mods(directory)
+        records = self.journal.read()
+        completed = set()
+        for record in records:
+            if record.get("op") == "node":
+                self.build_state.record(record["node"], record["inputs"])
+                completed.add(record["node"])
+
+        selected = None
+        if begin.get("selected") is not None:
+            wanted = set(begin["selected"])
+            selected = [mod for mod in self.mods if mod_identity(mod) in wanted]
+        plan = self.plan_run(selected, force=bool(begin.get("force")), hint_lines=hint_lines)
+
+        # 强制重建时 plan_run 会把全部节点列入，这里去掉上次已完成的
+        plan.inject = [m for m in plan.inject if mod_node(mod_identity(m)) not in completed]
+        plan.texture_ids = {i for i in plan.texture_ids if texture_node(i) not in completed}
+        plan.main_ini = plan.main_ini and "main_ini" not in completed
+        plan.shared_textures = plan.shared_textures and "textures_shared" not in completed
+        plan.save_config = plan.save_config and "config" not in completed
+        for node in completed:
+            plan.reasons[node] = []
+        self.journal.reopen()
+        print(f"继续未完成的运行：已完成 {len(completed)} 个节点，剩余 "
+              f"{sum(1 for why in plan.reasons.values() if why)} 个")
+        return plan
+
+    def rollback_run(self) -> dict:
+        """回滚上次未完成的运行：所有改写过的文件恢复为运行前内容。"""
+        report = self.journal.rollback()
+        self.build_state.load()
+        return report
+
     def scan_mods(self, directory: str) -> List[ModInfo]:
         """扫描目录下的所有mod，检测所有.ini文件和角色hash"""
+        for _ in self.iter_scan_mods(directory):
+            pass
+        return self.mods
+
+    def iter_scan_mods(self, directory: str) -> Iterator[Tuple[ModInfo, ScanStats]]:
+        """流式扫描：每解析完一个含按键绑定的 mod 就产出 (mod, 累计统计)。
+
+        产出时 mod 的 character_id 为已登记的 id（新 mod 暂为 -1），排序与 id 分配
+        在扫描结束（或调用方提前停止、关闭生成器）时统一进行一次，之后 self.mods 即最终结果。
+        提前停止时扫描缓存只增不删（未遍历到的文件不能视为已删除）。
+        """
         self.mods_directory = directory
         self.config_file = os.path.join(self._resolve_output_dir(), "xxmi_key_config.json")
         self.mods.clear()
+        self.key_index.clear()
+        self._mods_complete = False
 
         # 扫描是只读操作，不还原真实 ini（还原职责归「保存/自动配置」）。
         # 解析时在内存里剥离上次注入的内容，原始 section 不受影响。
 
         # 获取工具输出目录，用于跳过工具自身目录
         script_dir = os.path.abspath(self._resolve_output_dir())
+        stats = ScanStats()
+        self.last_scan_stats = stats
+        seen_ini_files: List[str] = []
 
-        for item in os.listdir(directory):
-            item_path = os.path.join(directory, item)
-
-            # 跳过隐藏文件夹、EFMI文件夹和脚本自身所在的文件夹
-            if item.startswith('.') or item.startswith('EFMI'):
-                continue
-
-            if self._is_disabled_folder(item):
-                continue
-
-            # 忽略 rabbitFX 相关
-            if 'rabbitfx' in item.lower():
-                continue
+        items = os.listdir(directory)
+        stats.folders_total = len(items)
+        try:
+            for item in items:
+                stats.folders_done += 1
+                mod = self._scan_mod_folder(directory, item, script_dir, stats, seen_ini_files)
+                # 只添加有按键绑定的mod
+                if mod is None or not mod.key_bindings:
+                    continue
+                self.mods.append(mod)
+                self.key_index.add(mod.key_bindings)
+                stats.mods_found += 1
+                stats.bindings += len(mod.key_bindings)
+                registered = self.id_registry.lookup(directory, mod)
+                mod.character_id = registered if registered is not None else -1
+                yield mod, stats
+            stats.complete = True
+        finally:
+            self._finish_scan(directory, stats, seen_ini_files)
+
+    def _scan_mod_folder(self, directory: str, item: str, script_dir: str,
+                         stats: ScanStats, seen_ini_files: List[str]):
+        """扫描单个顶层 mod 文件夹；被规则跳过、无 ini 或无法读取时返回 None。"""
+        item_path = os.path.join(directory, item)
+
+        # 跳过隐藏文件夹、EFMI、disabled、rabbitFX、UI/大世界/功能 等（规则见 iooh_scan_rules）
+        if self.scan_rules.skip_mod_folder(item):
+            stats.mods_skipped += 1
+            return None
+
+        # 跳过脚本自身所在的文件夹（IOOH文件夹）
+        if os.path.abspath(item_path) == script_dir:
+            return None
+
+        if not os.path.isdir(item_path):
+            return None
+
+        # 递归查找该文件夹下所有.ini文件（包括子文件夹），按规则剪掉资源目录
+        try:
+            ini_files = self.scan_rules.find_ini_files(item_path, stats)
+        except OSError:
+            return None
+
+        if not ini_files:
+            return None
+        # Skip tool-generated IOOH main UI config to avoid self-scan
+        if any(os.path.basename(f).lower() == 'ioohmod.ini' for f in ini_files):
+            return None
+        seen_ini_files.extend(ini_files)
+        mod = ModInfo(item, item_path, ini_files)
+        # 解析所有ini文件（预筛无 key 的跳过，指纹未变的直接取缓存）
+        for ini_file in ini_files:
+            self._load_ini_bindings(mod, ini_file)
+        return mod
+
+    def _finish_scan(self, directory: str, stats: ScanStats, seen_ini_files: List[str]):
+        """扫描收尾（完整扫描或提前停止均执行一次）：保存缓存、排序、分配 id。"""
+        print(f"扫描遍历 {stats.dirs_visited} 个目录，剪枝 {stats.dirs_pruned} 个，"
+              f"跳过 {stats.mods_skipped} 个 mod 文件夹"
+              + ("" if stats.complete else f"（提前停止，已处理 {stats.folders_done}/{stats.folders_total}）"))
+
+        if stats.complete:
+            self.scan_cache.retain(seen_ini_files)
+        self.scan_cache.save()
+        self._mods_complete = stats.complete
+
+        # 按名称排序（仅影响列表显示顺序）
+        self.mods.sort(key=lambda m: m.name)
 
-            # 根据用户要求增加跳过的文件夹关键字：UI, 大世界, 功能
-            if any(keyword in item.lower() for keyword in ['ui', '大世界', '功能']):
-                continue
+        # 分配 character ID：已登记的 mod 沿用原 id，新 mod 取最小空闲 id，
+        # 新增 mod 不再让其后所有 id 整体后移
+        added = self.id_registry.assign(directory, self.mods)
+        if added:
+            print(f"新登记 {len(added)} 个角色ID: " + ", ".join(f"{m.name}={m.character_id}" for m in added))
+        self.id_registry.save()
+        if stats.complete:
+            self._save_snapshot(seen_ini_files)
+
+    def _save_snapshot(self, ini_files: List[str]) -> bool:
+        """把当前完整的扫描结果写入快照（ini 指纹取自扫描缓存，与缓存口径一致）。"""
+        fingerprints = {}
+        for path in ini_files:
+            fingerprint = self.scan_cache.fingerprint(path)
+            if fingerprint is not None:
+                fingerprints[path] = fingerprint
+        return self.snapshot.save(self.mods_directory, rules_digest(self.scan_rules.rules),
+                                  self.mods, fingerprints)
+
+    def load_snapshot(self) -> bool:
+        """从快照恢复上次的扫描结果（不访问 mod 文件）。
+
+        快照缺失/损坏、扫描规则已变化或 Mods 目录已不存在时返回 False，需完整扫描。
+        恢复后的结果可能已过期：调用 snapshot_changes 校验，再用 apply_snapshot_changes 修补。
+        """
+        if not self.snapshot.load():
+            return False
+        directory = self.snapshot.directory
+        if self.snapshot.rules != rules_digest(self.scan_rules.rules) or not os.path.isdir(directory):
+            return False
+        self.mods_directory = directory
+        self.config_file = os.path.join(self._resolve_output_dir(), "xxmi_key_config.json")
+        self.mods[:] = self.snapshot.mods
+        self.key_index.clear()
+        for mod in self.mods:
+            self.key_index.add(mod.key_bindings)
+        # 快照之后可能整理过角色 ID：以登记表为准
+        if self.id_registry.assign(directory, self.mods):
+            self.id_registry.save()
+        self._mods_complete = True
+        return True
+
+    def snapshot_changes(self) -> Tuple[set, set]:
+        """校验快照：返回 (需重新解析的 mod 文件夹, 已消失的 mod 文件夹)。只读，可在后台线程调用。"""
+        return self.snapshot.changed_folders(self.scan_rules, os.path.abspath(self._resolve_output_dir()))
+
+    def apply_snapshot_changes(self, changed: set, removed: set) -> Tuple[List[ModInfo], List[ModInfo]]:
+        """只重扫变化的 mod 文件夹并修补 self.mods；返回 (被替换/移除的旧 mod, 新解析的 mod)。"""
+        directory = self.mods_directory
+        stale = set(changed) | set(removed)
+        dropped = [mod for mod in self.mods if mod.name in stale]
+        self.mods[:] = [mod for mod in self.mods if mod.name not in stale]
+
+        stats = ScanStats()
+        seen_ini_files: List[str] = []
+        script_dir = os.path.abspath(self._resolve_output_dir())
+        added: List[ModInfo] = []
+        for item in sorted(changed):
+            mod = self._scan_mod_folder(directory, item, script_dir, stats, seen_ini_files)
+            if mod is not None and mod.key_bindings:
+                added.append(mod)
+        self.scan_cache.save()
+
+        self.mods.extend(added)
+        self.mods.sort(key=lambda m: m.name)
+        self.key_index.clear()
+        for mod in self.mods:
+            self.key_index.add(mod.key_bindings)
+        new_ids = self.id_registry.assign(directory, self.mods)
+        if new_ids:
+            print(f"新登记 {len(new_ids)} 个角色ID: " + ", ".join(f"{m.name}={m.character_id}" for m in new_ids))
+            self.id_registry.save()
 
-            # 跳过脚本自身所在的文件夹（IOOH文件夹）
-            if os.path.abspath(item_path) == script_dir:
-                continue
+        kept = [path for path in self.snapshot.fingerprints
+                if os.path.relpath(path, directory).split(os.sep, 1)[0] not in stale]
+        self._save_snapshot(kept + seen_ini_files)
+        return dropped, added
 
-            if os.path.isdir(item_path):
-                # 递归查找该文件夹下所有.ini文件（包括子文件夹）
-                ini_files = []
-                try:
-                    for root, dirs, files in os.walk(item_path):
-                        dirs[:] = [d for d in dirs if not self._is_disabled_folder(d)]
+    def key_conflicts(self) -> List[KeyConflict]:
+        """当前扫描结果中的按键冲突（含与 IOOH 菜单键的冲突）。"""
+        return self.key_index.conflicts({action: self.iooh_keys.key_line(action) for action in ACTIONS})
 
-                        for file in files:
-                            if file.lower().endswith('.ini'):
-                                ini_files.append(os.path.join(root, file))
-                except PermissionError:
-                    continue
+    def compact_ids(self) -> Dict[int, int]:
+        """整理角色 ID：丢弃已移除 mod 的保留 id，按名称重新编号为 0..n-1。
 
-                if ini_files:
-                    # Skip tool-generated IOOH main UI config to avoid self-scan
-                    if any(os.path.basename(f).lower() == 'ioohmod.ini' for f in ini_files):
-                        continue
-                    mod = ModInfo(item, item_path, ini_files)
-                    # 解析所有ini文件
-                    for ini_file in ini_files:
-                        self._parse_ini_file(mod, ini_file)
+        返回 {旧 id: 新 id}；编号变化后需重新执行自动配置使 ini 与纹理生效。
+        """
+        remap = self.id_registry.compact(self.mods_directory, self.mods)
+        self.id_registry.save()
+        return remap
 
-                    # 只添加有按键绑定的mod
-                    if mod.key_bindings:
-                        self.mods.append(mod)
+    def _selector_ids(self) -> List[int]:
+        """当前全部角色 id（升序）；id 可能因移除 mod 而不连续。"""
+        return sorted(mod.character_id for mod in self.mods)
 
-        # 按名称排序
-        self.mods.sort(key=lambda m: m.name)
+    def _slot_capacity(self) -> int:
+        """预留槽位模式下的选择器容量；exact 模式返回 0。
 
-        # 自动分配character ID
-        for idx, mod in enumerate(self.mods):
-            mod.character_id = idx
+        容量按 mods 目录记在 ID 登记表中，只在 id 上限超出时增长（pow2 取下一个 2 的幂，
+        headroom 取上限 + 余量），名册在容量内增减不改变容量。
+        """
+        mode = self.options.slot_capacity_mode
+        if mode == "exact" or not self.mods:
+            return 0
+        needed = max(mod.character_id for mod in self.mods) + 1
+        capacity = self.id_registry.capacity(self.mods_directory)
+        if capacity >= needed:
+            return capacity
+        if mode == "pow2":
+            capacity = 1
+            while capacity < needed:
+                capacity *= 2
+        else:
+            capacity = needed + self.options.slot_headroom
+        self.id_registry.set_capacity(self.mods_directory, capacity)
+        self.id_registry.save()
+        print(f"选择器槽位容量调整为 {capacity}（id 上限 {needed - 1}）")
+        return capacity
+
+    def _selector_ring(self) -> List[int]:
+        """选择器循环经过的 id 序列（升序），主 ini 与各 mod 选择器块共用。
+
+        exact 模式为全部有效 id（空位被跳过）；预留槽位模式为 0..容量-1，空槽位
+        不跳过而是由所有处理器一致地停留——菜单显示空页、启用键不作用于任何角色。
+        跳过空槽位需要每个文件都知道占用情况，名册一变就得全部重写，与预留的初衷相悖。
+        """
+        capacity = self._slot_capacity()
+        if capacity:
+            return list(range(capacity))
+        return self._selector_ids()
+
+    # 选择器自增/自减命令行（主 ini 与各 mod 选择器块共用，见 iooh_main_ini）
+    _selector_step_lines = staticmethod(selector_step_lines)
+
+    def _load_ini_bindings(self, mod: ModInfo, ini_file_path: str):
+        """取得单个 ini 的按键绑定：预筛无 key 赋值的直接跳过，缓存有效时复用，否则完整解析。"""
+        entry = self.scan_cache.classify(ini_file_path)
+        if not entry["has_key"]:
+            return
+        if entry["bindings"] is not None:
+            for cached in entry["bindings"]:
+                binding = ModKeyBinding(cached["section"], cached["key"], cached["variable"],
+                                        mod.path, ini_file_path)
+                binding.description = cached["description"]
+                mod.key_bindings.append(binding)
+            return
+        first_new = len(mod.key_bindings)
+        if self._parse_ini_file(mod, ini_file_path):
+            entry["bindings"] = [self._binding_cache_entry(b) for b in mod.key_bindings[first_new:]]
 
-        return self.mods
+    @staticmethod
+    def _binding_cache_entry(binding: ModKeyBinding) -> dict:
+        """按键绑定的缓存/配置形式（与 save_config 的字段一致）。"""
+        return {
+            "section": binding.section_name,
+            "key": binding.key,
+            "variable": binding.variable,
+            "description": binding.description,
+        }
 
     def _iter_sections(self, content: str):
         """迭代所有 section（更稳健，支持没有换行的 section 间隔）。"""
@@ -270,8 +736,8 @@ class EFMIKeyConfigurator:
             text = re.sub(rf'(?i)(?<=[^\n])[ \t]+({pattern})', r'\n\1', text)
         return text
 
-    def _parse_ini_file(self, mod: ModInfo, ini_file_path: str):
-        """解析ini文件，提取按键绑定 - 通用检测所有按键section"""
+    def _parse_ini_file(self, mod: ModInfo, ini_file_path: str) -> bool:
+        """解析ini文件，提取按键绑定 - 通用检测所有按键section；解析失败返回 False"""
         try:
             with open(ini_file_path, 'r', encoding='utf-8') as f:
                 content = f.read()
@@ -311,10 +777,12 @@ class EFMIKeyConfigurator:
                 binding = ModKeyBinding(section_name, key, variable or f"${section_name}", mod.path, ini_file_path)
                 binding.description = self._generate_description(section_name, variable, binding_type)
                 mod.key_bindings.append(binding)
+            return True
 
         except Exception as e:
             ini_filename = os.path.basename(ini_file_path)
             print(f"解析 {mod.name}/{ini_filename} 失败: {e}")
+            return False
 
     def _extract_key_from_section(self, section_content: str):
         """Extract the raw ini key value (e.g. 'alt 1'、'vk_up'、'ctrl /')。
@@ -393,18 +861,11 @@ class EFMIKeyConfigurator:
             output_path = os.path.join(self._resolve_output_dir(), "IOOHmod.ini")
 
         total_chars = len(self.mods)
-        max_id = total_chars - 1 if total_chars > 0 else 0
-
-        # IOOH 菜单四个控制键（用户可自定义，主 ini 与各 mod 选择器块共用同一份）
-        key_toggle = self.iooh_keys.key_line("toggle_menu")
-        key_prev = self.iooh_keys.key_line("prev_char")
-        key_next = self.iooh_keys.key_line("next_char")
-        key_enable = self.iooh_keys.key_line("enable_toggle")
-
-        # 生成角色映射注释
-        char_mapping = "; 角色ID映射:\n"
-        for mod in self.mods:
-            char_mapping += f"; {mod.character_id} = {mod.name}\n"
+        ids = self._selector_ids()
+        ring = self._selector_ring()
+        max_id = ids[-1] if ids else 0
+        # 预留槽位模式下选择可能停在空槽位：各层显式解绑，只显示 muban 空页
+        has_empty_slots = len(ring) > len(ids)
 
         # === 布局参数 ===
         # 一页一个角色：muban 作为背景模板（已内置按键提示与箭头），
@@ -424,221 +885,24 @@ class EFMIKeyConfigurator:
         bottom_margin = 0.04
         default_start_y = 1.0 - bottom_margin - panel_h_val
 
-        # 每个角色一个启用标志（与各 mod ini 的 $iooh_en<id> 平行），
-        # 让菜单侧也能存储并反映每个角色的启用状态
-        enable_decls = "".join(
-            f"global $iooh_en{mod.character_id} = 0\n" for mod in self.mods
+        # 全文由 iooh_main_ini 按预编译模板分段生成；IOOH 菜单四个控制键
+        # 与各 mod 选择器块共用同一份（用户可自定义）
+        content = render_main_ini(
+            self.mods, ring,
+            {action: self.iooh_keys.key_line(action) for action in ACTIONS},
+            {"left_x": left_x, "start_y": default_start_y, "panel_w": panel_w, "panel_h": panel_h_val},
+            # 五层 UI 的绘制方式：layered 每层各 Draw 一次；composite 由合成像素着色器一次 Draw
+            composite=self.options.ui_draw_mode == "composite",
+            generated_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
         )
 
-        # 主体内容
-        content = f"""; EFMI 主UI管理器 - 自动生成
-; 生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-; 总角色数: {total_chars}
-
-{char_mapping}
-
-[Constants]
-global $show_character_ui = 0
-global $total_characters = {total_chars}
-global $iooh_sel = 0
-{enable_decls}
-; 拖拽控制变量
-global persist $ui_x = {left_x:.4f}
-global persist $ui_y = {default_start_y:.4f}
-global $mouse_clicked = 0
-global $is_dragging = 0
-global $drag_start_x = 0
-global $drag_start_y = 0
-
-; 鼠标拖拽检测 (仅当UI显示时)
-[KeyMouseDrag]
-condition = $show_character_ui == 1
-key = VK_LBUTTON
-type = hold
-$mouse_clicked = 1
-
-[CommandList_UpdateDrag]
-if $mouse_clicked
-    if cursor_x > $ui_x && cursor_x < $ui_x + {panel_w:.4f} && cursor_y > $ui_y && cursor_y < $ui_y + {panel_h_val:.4f}
-        if $is_dragging == 0
-            $drag_start_x = cursor_x - $ui_x
-            $drag_start_y = cursor_y - $ui_y
-            $is_dragging = 1
-        endif
-    endif
-else
-    $is_dragging = 0
-endif
-
-if $is_dragging
-    $ui_x = cursor_x - $drag_start_x
-    $ui_y = cursor_y - $drag_start_y
-endif
-
-; UI复位快捷键
-[KeyEFMI_ResetUIPosition]
-condition = $show_character_ui == 1
-key = ctrl no_alt /
-type = cycle
-$ui_x = {left_x:.4f}
-$ui_y = {default_start_y:.4f}
-
-; 显示/隐藏菜单
-[KeyEFMI_ToggleMenu]
-key = {key_toggle}
-run = CommandList_ToggleMenu
-
-[CommandList_ToggleMenu]
-if $show_character_ui == 1
-    $show_character_ui = 0
-else
-    $show_character_ui = 1
-endif
-
-; 上一个角色（仅菜单显示时响应，隐藏时保留当前选择）
-[KeyEFMI_PrevChar]
-condition = $show_character_ui == 1
-key = {key_prev}
-run = CommandList_PrevChar
-
-[CommandList_PrevChar]
-"""
-        # 上一个角色：自减并回绕（O(1)，不随角色数膨胀）
-        if total_chars > 0:
-            content += f"$iooh_sel = $iooh_sel - 1\nif $iooh_sel < 0\n    $iooh_sel = {max_id}\nendif\n"
-
-        content += f"""
-; 下一个角色（仅菜单显示时响应，隐藏时保留当前选择）
-[KeyEFMI_NextChar]
-condition = $show_character_ui == 1
-key = {key_next}
-run = CommandList_NextChar
-
-[CommandList_NextChar]
-"""
-        # 下一个角色：自增并回绕（O(1)，不随角色数膨胀）
-        if total_chars > 0:
-            content += f"$iooh_sel = $iooh_sel + 1\nif $iooh_sel > {max_id}\n    $iooh_sel = 0\nendif\n"
-
-        content += f"""
-; 启用/禁用当前聚焦的角色（翻转该 id 对应的 $iooh_en<id>，仅菜单显示时响应）
-[KeyEFMI_EnableToggle]
-condition = $show_character_ui == 1
-key = {key_enable}
-run = CommandList_EnableToggle
-
-[CommandList_EnableToggle]
-"""
-        for i in range(total_chars):
-            keyword = "if" if i == 0 else "elif"
-            content += f"{keyword} $iooh_sel == {i}\n"
-            content += f"    if $iooh_en{i} == 1\n        $iooh_en{i} = 0\n    else\n        $iooh_en{i} = 1\n    endif\n"
-        if total_chars > 0:
-            content += "endif\n"
-
-        content += """
-[Present]
-if $show_character_ui == 1
-    run = CommandList_UpdateDrag
-    run = CustomShaderDrawUI
-endif
-
-[CustomShaderDrawUI]
-vs = shaders\\draw_2d_ui.hlsl
-ps = shaders\\draw_2d_ui.hlsl
-run = BuiltInCommandListUnbindAllRenderTargets
-blend = ADD SRC_ALPHA INV_SRC_ALPHA
-cull = none
-topology = triangle_strip
-o0 = set_viewport bb
-"""
-        # 三层叠加：muban 背景 → 头像层 → 文字层，共用同一面板四边形
-        content += f"""
-; ===== 面板四边形（三层共用） =====
-x87 = {panel_w:.4f}
-y87 = {panel_h_val:.4f}
-z87 = $ui_x
-w87 = $ui_y
-
-; ===== 第1层：muban 背景模板（已内置按键提示与箭头） =====
-ps-t100 = ResourceMuban
-Draw = 4,0
-
-; ===== 第2层：当前角色头像（白框位置；无头像则为问号） =====
-"""
-        for i, mod in enumerate(self.mods):
-            keyword = "if" if i == 0 else "elif"
-            content += f"{keyword} $iooh_sel == {mod.character_id}\n"
-            content += f"    ps-t100 = ResourceAvatar{mod.character_id}\n"
-        if total_chars > 0:
-            content += "endif\n"
-        content += "Draw = 4,0\n"
-
-        content += """
-; ===== 第3层：当前角色文字（白框右侧） =====
-"""
-        for i, mod in enumerate(self.mods):
-            keyword = "if" if i == 0 else "elif"
-            content += f"{keyword} $iooh_sel == {mod.character_id}\n"
-            content += f"    ps-t100 = ResourceText{mod.character_id}\n"
-        if total_chars > 0:
-            content += "endif\n"
-        content += "Draw = 4,0\n"
-
-        content += """
-; ===== 第4层：当前角色启用/禁用状态图案（头像与名称下方空白区） =====
-"""
-        for i, mod in enumerate(self.mods):
-            keyword = "if" if i == 0 else "elif"
-            content += f"{keyword} $iooh_sel == {mod.character_id}\n"
-            content += f"    if $iooh_en{mod.character_id} == 1\n"
-            content += f"        ps-t100 = ResourceStatusEnabled\n"
-            content += f"    else\n"
-            content += f"        ps-t100 = ResourceStatusDisabled\n"
-            content += f"    endif\n"
-        if total_chars > 0:
-            content += "endif\n"
-        content += "Draw = 4,0\n"
-
-        content += """
-; ===== 第5层：按键提示（全局静态，状态图案下方） =====
-ps-t100 = ResourceHintKeys
-Draw = 4,0
-"""
-
-        # ===== 资源定义 =====
-        content += """
-; ===== 资源定义 =====
-[ResourceMuban]
-filename = resources\\textures\\muban.png
-
-[ResourceHintKeys]
-filename = resources\\textures\\hint_keys.png
-
-[ResourceStatusEnabled]
-filename = resources\\textures\\status_enabled.png
-
-[ResourceStatusDisabled]
-filename = resources\\textures\\status_disabled.png
-
-"""
-        # 角色头像层与文字层（一页一个）
-        for mod in self.mods:
-            content += f"""[ResourceAvatar{mod.character_id}]
-filename = resources\\textures\\character_{mod.character_id}_avatar.png
-
-[ResourceText{mod.character_id}]
-filename = resources\\textures\\character_{mod.character_id}_text.png
-
-
-"""
-
         try:
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            self._journaled_write(output_path, content)
             print(f"主配置已生成: {output_path}")
             print(f"  - 角色数量: {total_chars}")
-            print(f"  - 角色ID范围: 0-{max_id}")
+            print(f"  - 角色ID范围: {ids[0] if ids else 0}-{max_id}")
+            if has_empty_slots:
+                print(f"  - 槽位容量: {len(ring)}（空槽位 {len(ring) - len(ids)}）")
             return True
         except Exception as e:
             print(f"生成主配置失败: {e}")
@@ -646,88 +910,26 @@ filename = resources\\textures\\character_{mod.character_id}_text.png
 
     def modify_mod_ini(self, mod: ModInfo, create_backup: bool = True) -> bool:
         """修改所有ini文件，注入本地选择器变量和上下键处理器，添加选择器条件"""
+        return self.inject_mod(mod, create_backup).success
+
+    def inject_mod(self, mod: ModInfo, create_backup: bool = True) -> InjectResult:
+        """注入单个mod并返回注入结果（写入的文件 + 注入后各 ini 的文件状态）。
+
+        文件状态与重新扫描该文件得到的结论一致，调用方据此更新扫描缓存与界面
+        （reconcile_injection），无需在流水线结束后再整体重扫一遍。
+        """
+        result = InjectResult(mod)
         try:
             if create_backup:
                 self.backup_mod(mod)
 
-            total_chars = len(self.mods)
-            max_id = total_chars - 1 if total_chars > 0 else 0
+            ring = self._selector_ring()
+            first_id = ring[0] if ring else 0
             local_var = f'iooh_s{mod.character_id}'
             enable_var = f'iooh_en{mod.character_id}'
             ui_var = f'iooh_ui{mod.character_id}'
 
-            # IOOH 菜单四个控制键（与主 ini 共用同一份，确保巧合同步成立）
-            key_toggle = self.iooh_keys.key_line("toggle_menu")
-            key_prev = self.iooh_keys.key_line("prev_char")
-            key_next = self.iooh_keys.key_line("next_char")
-            key_enable = self.iooh_keys.key_line("enable_toggle")
-
-            # 上下键循环：自减/自增 + 回绕（O(1)，不随角色数膨胀）。
-            # 仅菜单可见（$iooh_ui<id> == 1）时才执行切换。
-            if total_chars > 0:
-                cmd_up_block = (
-                    f'if ${ui_var} == 1\n'
-                    f'    ${local_var} = ${local_var} - 1\n'
-                    f'    if ${local_var} < 0\n'
-                    f'        ${local_var} = {max_id}\n'
-                    f'    endif\n'
-                    f'endif'
-                )
-                cmd_down_block = (
-                    f'if ${ui_var} == 1\n'
-                    f'    ${local_var} = ${local_var} + 1\n'
-                    f'    if ${local_var} > {max_id}\n'
-                    f'        ${local_var} = 0\n'
-                    f'    endif\n'
-                    f'endif'
-                )
-            else:
-                cmd_up_block = ''
-                cmd_down_block = ''
-
-            selector_block = f"""; ===== IOOH 本地选择器 =====
-; 显隐镜像（仅同步本地门控变量，不负责实际显示；
-;          与菜单侧 $show_character_ui 监听同一物理键、各自相同计数实现巧合同步）
-[Key_{local_var}_ToggleVisible]
-key = {key_toggle}
-run = CommandList_{local_var}_ToggleVisible
-
-[CommandList_{local_var}_ToggleVisible]
-if ${ui_var} == 1
-    ${ui_var} = 0
-else
-    ${ui_var} = 1
-endif
-
-[Key_{local_var}_SelectUp]
-key = {key_prev}
-run = CommandList_{local_var}_SelectUp
-
-[CommandList_{local_var}_SelectUp]
-{cmd_up_block}
-
-[Key_{local_var}_SelectDown]
-key = {key_next}
-run = CommandList_{local_var}_SelectDown
-
-[CommandList_{local_var}_SelectDown]
-{cmd_down_block}
-
-[Key_{local_var}_ToggleUI]
-key = {key_enable}
-run = CommandList_{local_var}_ToggleUI
-
-[CommandList_{local_var}_ToggleUI]
-if ${ui_var} == 1
-    if ${local_var} == {mod.character_id}
-        if ${enable_var} == 1
-            ${enable_var} = 0
-        else
-            ${enable_var} = 1
-        endif
-    endif
-endif
-; ===== IOOH 本地选择器结束 ====="""
+            selector_block = self._selector_block(mod.character_id, ring)
 
             # 按来源 ini 分组（解析时已记录 binding.ini_file），
             # 直接归组而非靠 section 名反查文件——后者在跨 ini 同名 section 时会把
@@ -746,27 +948,37 @@ endif
             # 各自文件的 $iooh_en（互不共享，不会相互抵消）。
             # 无按键绑定的 ini 不引用任何 iooh 变量，无需注入（仅清理旧注入）。
             for ini_file in mod.ini_files:
+                bindings = bindings_by_file.get(ini_file, [])
+
+                # 无按键绑定且预筛无注入痕迹：无需清理，不读不写（文件状态不变）
+                if not bindings and not self._has_injection_marker(ini_file):
+                    continue
+
                 with open(ini_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
+                    original = f.read()
 
                 # 清理旧的IOOH注入内容
-                content = self._strip_local_selector(content)
-
-                bindings = bindings_by_file.get(ini_file, [])
+                content = self._strip_local_selector(original)
 
-                # 无按键绑定：写回清理后的内容即可，不注入变量与选择器块。
+                # 无按键绑定：写回清理后的内容即可（内容未变则不写），不注入变量与选择器块。
                 if not bindings:
-                    self._ensure_writable(ini_file)
-                    with open(ini_file, 'w', encoding='utf-8') as f:
-                        f.write(content)
+                    has_key, has_marker = prefilter_bytes(content.encode('utf-8'))
+                    result.file_states[ini_file] = {
+                        "has_key": has_key, "has_marker": has_marker, "bindings": [],
+                    }
+                    if content != original:
+                        self._journaled_write(ini_file, content)
+                        result.written.append(ini_file)
+                    else:
+                        result.unchanged.append(ini_file)
                     continue
 
                 # 在本 ini 的 [Constants] 声明这些变量（无则新建 [Constants]）：
-                # $iooh_s<id>：聚焦角色（初始 0，让上一个/下一个立即可循环切换）
+                # $iooh_s<id>：聚焦角色（初始为最小有效 id，与主 ini 的 $iooh_sel 一致，让上一个/下一个立即可循环切换）
                 # $iooh_en<id>：启用标志（初始 0，启用键对当前聚焦角色翻转）
                 # $iooh_ui<id>：菜单显隐镜像（初始 0，显隐键与菜单侧 $show_character_ui 巧合同步；
                 #               仅作门控，菜单隐藏时切换/启用键不生效）
-                decls = f'global ${local_var} = 0\nglobal ${enable_var} = 0\nglobal ${ui_var} = 0\n'
+                decls = f'global ${local_var} = {first_id}\nglobal ${enable_var} = 0\nglobal ${ui_var} = 0\n'
                 constants_match = re.search(r'(\[Constants\]\s*\n)', content)
                 if constants_match:
                     insert_pos = constants_match.end()
@@ -774,8 +986,11 @@ endif
                 else:
                     content = f'[Constants]\n{decls}\n' + content
 
-                # 给本 ini 内的按键 section 补 condition 门控
+                # 给本 ini 内的按键 section 补 condition 门控；开启 gate_present 时
+                # 同一 ini 的 [Present] 也包进 $iooh_en 判断（该变量只在本 ini 内可靠，
+                # 故只门控含按键绑定、已声明变量的 ini）
                 binding_map = {b.section_name: b for b in bindings}
+                gate_present = self.options.gates_present(mod.name)
                 sections = list(self._iter_sections(content))
                 if sections:
                     new_parts = []
@@ -791,6 +1006,8 @@ endif
                                 binding_map[section_name].key,
                             )
                             new_parts.append(new_section)
+                        elif gate_present and section_name.strip().lower() == 'present':
+                            new_parts.append(self._gate_present_section(section_text, enable_var))
                         else:
                             new_parts.append(section_text)
                         last_idx = end
@@ -806,17 +1023,424 @@ endif
                     # 没有Key section，追加到文件末尾
                     content = content.rstrip('\n') + '\n\n' + selector_block + '\n'
 
-                self._ensure_writable(ini_file)
-                with open(ini_file, 'w', encoding='utf-8') as f:
-                    f.write(content)
+                # 注入后重新解析该文件得到的绑定即为当前内存中的绑定（按键行已按 binding.key 改写）
+                result.file_states[ini_file] = {
+                    "has_key": True,
+                    "has_marker": True,
+                    "bindings": [self._binding_cache_entry(b) for b in bindings],
+                }
 
-            return True
+                # 内容与磁盘一致（如预留槽位模式下名册变化未触及本 mod）：不重写
+                if content == original:
+                    result.unchanged.append(ini_file)
+                    continue
+                self._journaled_write(ini_file, content)
+                result.written.append(ini_file)
+
+            result.success = True
+            return result
 
         except Exception as e:
             print(f"修改 {mod.name} 失败: {e}")
             import traceback
             traceback.print_exc()
+            return result
+
+    def _selector_block(self, character_id: int, ring: List[int]) -> str:
+        """生成单个 ini 的本地选择器块（起止标记包围，剥离时整块删除）。
+
+        经典写法：四个 Key 段各 run 一个 CommandList，菜单可见性在 CommandList 内判断。
+        紧凑写法（selector_emission = "compact"）见 _compact_selector_block。
+        """
+        if self.options.selector_emission == "compact":
+            return self._compact_selector_block(character_id, ring)
+        local_var = f'iooh_s{character_id}'
+        enable_var = f'iooh_en{character_id}'
+        ui_var = f'iooh_ui{character_id}'
+
+        # IOOH 菜单四个控制键（与主 ini 共用同一份，确保巧合同步成立）
+        key_toggle = self.iooh_keys.key_line("toggle_menu")
+        key_prev = self.iooh_keys.key_line("prev_char")
+        key_next = self.iooh_keys.key_line("next_char")
+        key_enable = self.iooh_keys.key_line("enable_toggle")
+
+        # 上下键循环：自减/自增 + 回绕（O(1)，不随角色数膨胀）。
+        # 仅菜单可见（$iooh_ui<id> == 1）时才执行切换。
+        if ring:
+            cmd_up_block = '\n'.join(
+                [f'if ${ui_var} == 1']
+                + ['    ' + line for line in self._selector_step_lines(local_var, ring, -1)]
+                + ['endif']
+            )
+            cmd_down_block = '\n'.join(
+                [f'if ${ui_var} == 1']
+                + ['    ' + line for line in self._selector_step_lines(local_var, ring, 1)]
+                + ['endif']
+            )
+        else:
+            cmd_up_block = ''
+            cmd_down_block = ''
+
+        return f"""; ===== IOOH 本地选择器 =====
+; 显隐镜像（仅同步本地门控变量，不负责实际显示；
+;          与菜单侧 $show_character_ui 监听同一物理键、各自相同计数实现巧合同步）
+[Key_{local_var}_ToggleVisible]
+key = {key_toggle}
+run = CommandList_{local_var}_ToggleVisible
+
+[CommandList_{local_var}_ToggleVisible]
+if ${ui_var} == 1
+    ${ui_var} = 0
+else
+    ${ui_var} = 1
+endif
+
+[Key_{local_var}_SelectUp]
+key = {key_prev}
+run = CommandList_{local_var}_SelectUp
+
+[CommandList_{local_var}_SelectUp]
+{cmd_up_block}
+
+[Key_{local_var}_SelectDown]
+key = {key_next}
+run = CommandList_{local_var}_SelectDown
+
+[CommandList_{local_var}_SelectDown]
+{cmd_down_block}
+
+[Key_{local_var}_ToggleUI]
+key = {key_enable}
+run = CommandList_{local_var}_ToggleUI
+
+[CommandList_{local_var}_ToggleUI]
+if ${ui_var} == 1
+    if ${local_var} == {character_id}
+        if ${enable_var} == 1
+            ${enable_var} = 0
+        else
+            ${enable_var} = 1
+        endif
+    endif
+endif
+; ===== IOOH 本地选择器结束 ====="""
+
+    def _compact_selector_block(self, character_id: int, ring: List[int]) -> str:
+        """紧凑写法：门控挪到 Key 段的 condition 上，两个翻转改为 cycle，只剩两个 CommandList。
+
+        - 显隐镜像 / 启用翻转：`type = cycle` + `$var = 1,0`。变量初值为 0，不论 3DMigoto
+          按当前值定位还是按自身下标推进，第一次按下都得到 1，之后 0/1 交替，与主 ini 的
+          if/else 翻转一致
+        - 上一个/下一个：condition = $iooh_ui<id> == 1，菜单隐藏时不再 run CommandList；
+          CommandList 内只剩自减/自增与回绕
+        - 启用键的「菜单可见且聚焦本角色」判断并入 condition
+        每次按键不满足条件的文件只求值一次 condition，不再进入 CommandList。
+        """
+        local_var = f'iooh_s{character_id}'
+        enable_var = f'iooh_en{character_id}'
+        ui_var = f'iooh_ui{character_id}'
+        key_toggle = self.iooh_keys.key_line("toggle_menu")
+        key_prev = self.iooh_keys.key_line("prev_char")
+        key_next = self.iooh_keys.key_line("next_char")
+        key_enable = self.iooh_keys.key_line("enable_toggle")
+        cmd_up_block = '\n'.join(self._selector_step_lines(local_var, ring, -1)) if ring else ''
+        cmd_down_block = '\n'.join(self._selector_step_lines(local_var, ring, 1)) if ring else ''
+
+        return f"""; ===== IOOH 本地选择器 =====
+; 紧凑写法：显隐镜像与启用翻转为 cycle，门控在 condition 上
+[Key_{local_var}_ToggleVisible]
+key = {key_toggle}
+type = cycle
+${ui_var} = 1,0
+
+[Key_{local_var}_SelectUp]
+key = {key_prev}
+condition = ${ui_var} == 1
+run = CommandList_{local_var}_SelectUp
+
+[CommandList_{local_var}_SelectUp]
+{cmd_up_block}
+
+[Key_{local_var}_SelectDown]
+key = {key_next}
+condition = ${ui_var} == 1
+run = CommandList_{local_var}_SelectDown
+
+[CommandList_{local_var}_SelectDown]
+{cmd_down_block}
+
+[Key_{local_var}_ToggleUI]
+key = {key_enable}
+condition = ${ui_var} == 1 && ${local_var} == {character_id}
+type = cycle
+${enable_var} = 1,0
+; ===== IOOH 本地选择器结束 ====="""
+
+    def reconcile_injection(self, results: List[InjectResult]) -> int:
+        """用注入结果更新扫描缓存与 mod 状态，代替流水线结束后的整体重扫。
+
+        已写入的文件按新指纹登记注入后的文件状态；未改写的文件指纹不变，状态照常登记。
+        mod 的绑定与备份标记在注入（backup_mod）时已更新，无需重新解析。返回更新的缓存条目数。
+        """
+        updated = 0
+        for result in results:
+            for ini_file, state in result.file_states.items():
+                self.scan_cache.store(ini_file, state["has_key"], state["has_marker"], state["bindings"])
+                updated += 1
+        self.scan_cache.save()
+        # 注入改写了 ini：刷新快照中的指纹，下次启动校验时不必把这些 mod 当作已变化
+        if self._mods_complete and self.snapshot.directory == self.mods_directory:
+            self._save_snapshot(list(self.snapshot.fingerprints))
+        return updated
+
+    # 选择器块 / 主 ini 中各菜单动作对应的 Key section 名后缀
+    _SELECTOR_KEY_ACTIONS = {
+        "ToggleVisible": "toggle_menu",
+        "SelectUp": "prev_char",
+        "SelectDown": "next_char",
+        "ToggleUI": "enable_toggle",
+    }
+    _MAIN_KEY_ACTIONS = {
+        "KeyEFMI_ToggleMenu": "toggle_menu",
+        "KeyEFMI_PrevChar": "prev_char",
+        "KeyEFMI_NextChar": "next_char",
+        "KeyEFMI_EnableToggle": "enable_toggle",
+    }
+
+    def _patch_key_lines(self, content: str, section_actions: Dict[str, str]):
+        """把指定 section 的 key 行改写为当前菜单键，返回 (新内容, 被改写的行号集合)。
+
+        section_actions：section 名 -> 菜单动作。只动 key 行本身，其余行原样保留。
+        """
+        lines = content.split('\n')
+        patched = set()
+        action = None
+        for idx, line in enumerate(lines):
+            header = re.match(r'^[ \t]*\[([^\]\r\n]+)\][ \t]*$', line)
+            if header:
+                action = section_actions.get(header.group(1))
+                continue
+            if action and re.match(r'(?i)^[ \t]*key[ \t]*=', line):
+                indent = line[:len(line) - len(line.lstrip())]
+                new_line = f'{indent}key = {self.iooh_keys.key_line(action)}'
+                if new_line != line:
+                    lines[idx] = new_line
+                    patched.add(idx)
+                action = None
+        return '\n'.join(lines), patched
+
+    @staticmethod
+    def _only_lines_changed(old: str, new: str, allowed: set) -> bool:
+        """确认 new 相对 old 只改动了 allowed 中的行（行数不变、其余行逐字相同）。"""
+        old_lines = old.split('\n')
+        new_lines = new.split('\n')
+        if len(old_lines) != len(new_lines):
             return False
+        return all(a == b or idx in allowed for idx, (a, b) in enumerate(zip(old_lines, new_lines)))
+
+    def apply_menu_key_change(self, hint_lang: str = "zh") -> dict:
+        """菜单键变更快速路径：原地改写已注入 ini 与 IOOHmod.ini 中菜单键的 key 行，
+        并只重新生成 hint_keys.png。
+
+        仅在选择器起止标记之间、按已知 section 名定位 key 行；改写后逐文件核对
+        「除 key 行外逐字未变」，不满足则不写回并计入 failed。没有选择器块的 ini
+        （尚未注入）计入 missing，需走完整的自动配置。读写失败同样计入 failed
+        （IOOHmod.ini 记为 "failed"），写入先写临时文件再替换，原文件不会被写坏。
+
+        改写前已是最新（仅菜单键/提示文案不同）的构建节点，改写成功后按新输入记录，
+        下次自动配置不会因菜单键变化而重建它们。
+        返回 {"patched", "unchanged", "missing", "failed", "main_ini", "hint"}。
+        """
+        report = {"patched": 0, "unchanged": 0, "missing": [], "failed": [],
+                  "main_ini": "missing", "hint": False}
+        block_re = re.compile(
+            r';\s*=====\s*IOOH 本地选择器\s*=====[\s\S]*?;\s*=====\s*IOOH 本地选择器结束\s*=====',
+        )
+        hint_lines = self.iooh_keys.hint_lines(hint_lang)
+        inputs = BuildInputs(self, hint_lines)
+        state = self.build_state
+        selector_label = INPUT_LABELS["selector"]
+
+        def up_to_date(node: str, node_inputs: dict, changed_label: str) -> bool:
+            return all(why == changed_label for why in state.explain(node, node_inputs))
+
+        fresh_mods = []
+        for mod in self.mods:
+            fresh = up_to_date(mod_node(mod_identity(mod)), inputs.mod(mod), selector_label)
+            local_var = f'iooh_s{mod.character_id}'
+            section_actions = {f'Key_{local_var}_{suffix}': action
+                               for suffix, action in self._SELECTOR_KEY_ACTIONS.items()}
+            for ini_file in sorted({b.ini_file for b in mod.key_bindings}):
+                try:
+                    with open(ini_file, 'r', encoding='utf-8') as f:
+                        original = f.read()
+                except OSError as e:
+                    print(f"读取 {ini_file} 失败: {e}")
+                    report["failed"].append(ini_file)
+                    fresh = False
+                    continue
+                block = block_re.search(original)
+                if not block:
+                    report["missing"].append(ini_file)
+                    fresh = False
+                    continue
+                new_block, patched = self._patch_key_lines(block.group(0), section_actions)
+                content = original[:block.start()] + new_block + original[block.end():]
+                if content == original:
+                    report["unchanged"] += 1
+                    continue
+                first_line = original.count('\n', 0, block.start())
+                allowed = {first_line + idx for idx in patched}
+                if not self._only_lines_changed(original, content, allowed):
+                    report["failed"].append(ini_file)
+                    fresh = False
+                    continue
+                cache_valid = self.scan_cache.lookup(ini_file) is not None
+                try:
+                    self._journaled_write(ini_file, content)
+                except OSError as e:
+                    print(f"写入 {ini_file} 失败: {e}")
+                    report["failed"].append(ini_file)
+                    fresh = False
+                    continue
+                self.scan_cache.refresh(ini_file, cache_valid)
+                report["patched"] += 1
+            if fresh:
+                fresh_mods.append(mod)
+
+        main_ini = os.path.join(self._resolve_output_dir(), "IOOHmod.ini")
+        main_fresh = up_to_date("main_ini", inputs.main_ini(), selector_label)
+        if os.path.isfile(main_ini):
+            try:
+                with open(main_ini, 'r', encoding='utf-8') as f:
+                    original = f.read()
+                content, patched = self._patch_key_lines(original, self._MAIN_KEY_ACTIONS)
+                if content == original:
+                    report["main_ini"] = "unchanged"
+                elif self._only_lines_changed(original, content, patched):
+                    self._journaled_write(main_ini, content)
+                    report["main_ini"] = "patched"
+                else:
+                    report["main_ini"] = "failed"
+            except OSError as e:
+                print(f"改写 {main_ini} 失败: {e}")
+                report["main_ini"] = "failed"
+
+        self.scan_cache.save()
+
+        shared_fresh = up_to_date("textures_shared", inputs.textures_shared(), INPUT_LABELS["hint"])
+        try:
+            inputs.generator.generate_hint(hint_lines)
+            report["hint"] = True
+        except Exception as e:
+            print(f"按键提示纹理生成失败: {e}")
+
+        # 指纹在改写之后重新计算（ini 与输出文件的指纹已变）
+        for mod in fresh_mods:
+            state.record(mod_node(mod_identity(mod)), inputs.mod(mod))
+        if main_fresh and report["main_ini"] in ("patched", "unchanged"):
+            state.record("main_ini", inputs.main_ini())
+        if shared_fresh and report["hint"]:
+            state.record("textures_shared", inputs.textures_shared())
+        state.save()
+        return report
+
+    def rebind_key(self, binding: ModKeyBinding, key_value: str) -> bool:
+        """单个绑定改键立即落盘：只改写其所属 ini（binding.ini_file）中该 section 的 key 行。
+
+        保留缩进与行内注释，文件其余内容（含已注入的门控与选择器块）原样不动。
+        返回是否已写入 ini。无论写入与否，内存中的 binding.key 与按键冲突索引都会更新
+        （写入失败时由下次自动配置注入写进 ini）；写入成功时再同步扫描缓存，无需重新扫描或注入。
+        """
+        written, cache_valid = self._write_key_line(binding, key_value)
+        old_key, binding.key = binding.key, key_value
+        self.key_index.move(binding, old_key)
+        if written:
+            self._update_cached_binding(binding, cache_valid)
+        return written
+
+    def _write_key_line(self, binding: ModKeyBinding, key_value: str) -> Tuple[bool, bool]:
+        """改写绑定所属 ini 中该 section 的 key 行。
+
+        返回 (是否写入成功, 写入前该文件的扫描缓存条目是否仍有效)。
+        """
+        ini_file = binding.ini_file
+        try:
+            with open(ini_file, 'r', encoding='utf-8') as f:
+                original = f.read()
+        except OSError as e:
+            print(f"读取 {ini_file} 失败: {e}")
+            return False, False
+
+        for section_name, start, end, section_text in self._iter_sections(original):
+            if section_name != binding.section_name:
+                continue
+            new_section = self._rewrite_key_line(section_text, key_value)
+            if new_section is None:
+                break
+            content = original[:start] + new_section + original[end:]
+            cache_valid = self.scan_cache.lookup(ini_file) is not None
+            if content != original:
+                try:
+                    self._journaled_write(ini_file, content)
+                except OSError as e:
+                    print(f"写入 {ini_file} 失败: {e}")
+                    return False, False
+            return True, cache_valid
+
+        print(f"未在 {os.path.basename(ini_file)} 中找到 [{binding.section_name}] 的 key 行")
+        return False, False
+
+    def _rewrite_key_line(self, section_text: str, key_value: str):
+        """把 section 的 key 行改为 key_value；找不到 key 行返回 None。
+
+        key 与其它字段同行的写法先规整到各自行再改（只影响该 section 的排版）；
+        key = 为空、键值续写在下一行的写法一并删去续行，判别口径与 _extract_key_from_section 一致。
+        """
+        lines = section_text.split('\n')
+        if not any(re.match(r'(?i)^[ \t]*key[ \t]*=', line) for line in lines):
+            lines = self._normalize_section_text(section_text).split('\n')
+        for idx, line in enumerate(lines):
+            match = re.match(r'(?i)^([ \t]*)key[ \t]*=(.*)$', line)
+            if not match:
+                continue
+            indent, value_part = match.group(1), match.group(2)
+            comment = ''
+            if ';' in value_part:
+                comment = ' ;' + value_part.split(';', 1)[1]
+            lines[idx] = f'{indent}key = {key_value}{comment}'
+            if not value_part.split(';', 1)[0].strip() and idx + 1 < len(lines):
+                next_line = lines[idx + 1]
+                next_stripped = next_line.split(';', 1)[0].strip()
+                is_field_line = re.match(
+                    r'(?i)^\s*(?:[A-Za-z_]\w*|\$[A-Za-z_]\w*)\s*=(?!=)',
+                    next_line,
+                )
+                if next_stripped and not next_stripped.startswith('[') and not is_field_line:
+                    del lines[idx + 1]
+            return '\n'.join(lines)
+        return None
+
+    def _update_cached_binding(self, binding: ModKeyBinding, cache_valid: bool):
+        """把单个绑定的新键值写入扫描缓存并刷新该文件指纹（文件内其它绑定不变）。
+
+        cache_valid 为改写前该文件的缓存条目是否仍有效；已失效（文件在扫描后被外部
+        改动）时不沿用旧绑定，由 refresh 按当前内容重新预筛。
+        """
+        entry = self.scan_cache.files.get(os.path.normcase(os.path.abspath(binding.ini_file)))
+        if cache_valid and entry is not None and entry.get("bindings") is not None:
+            for cached in entry["bindings"]:
+                if cached["section"] == binding.section_name:
+                    cached["key"] = binding.key
+        self.scan_cache.refresh(binding.ini_file, cache_valid)
+        self.scan_cache.save()
+
+    def _has_injection_marker(self, ini_file: str) -> bool:
+        """ini 是否可能含 IOOH 注入痕迹（优先取扫描缓存，失效时现场 mmap 预筛）。"""
+        entry = self.scan_cache.lookup(ini_file)
+        if entry is not None:
+            return entry["has_marker"]
+        return prefilter_ini(ini_file)[1]
 
     def _modify_key_section_with_context(self, section_content: str, character_id: int, local_var: str, enable_var: str, key_value: str = "") -> str:
         """Modify one key section, inject enable condition without changing the key.
@@ -903,13 +1527,30 @@ endif
 
         return '\n'.join(modified_lines)
 
+    @staticmethod
+    def _gate_present_section(section_text: str, enable_var: str) -> str:
+        """把 [Present] 段的正文包进 `if $<enable_var> == 1 ... endif`（起止标记行包围）。
+
+        正文原样保留、不加缩进，段尾空行留在 endif 之后，剥离时删去标记与 if/endif
+        即逐字节还原。空段不门控。
+        """
+        header, _, body = section_text.partition('\n')
+        statements = body.rstrip('\n')
+        if not statements.strip():
+            return section_text
+        trailing = body[len(statements):]
+        return (f"{header}\n{PRESENT_GATE_BEGIN}\nif ${enable_var} == 1\n"
+                f"{statements}\nendif\n{PRESENT_GATE_END}{trailing}")
+
     @staticmethod
     def _strip_condition_gates(match) -> str:
         """从单行 condition 中移除 IOOH 门控项；条件清空则删除整行。
 
         令牌集合与 _modify_key_section_with_context 追加时一致，确保注入可逆。
+        整行删除时连同行尾换行一起删，避免每轮注入/剥离都残留一个空行。
         """
         line = match.group(1)
+        newline = match.group(2) or ''
         head, cond_text = line.split('=', 1)
         cond = cond_text
         cond = re.sub(r'\s*&&\s*\$iooh_en\d*\s*==\s*\d+', '', cond)
@@ -925,10 +1566,10 @@ endif
         cond = re.sub(r'\$\w+_sel\s*==\s*\d+\s*&&\s*', '', cond)
         cond = re.sub(r'\$\w+_sel\s*==\s*\d+', '', cond)
         cond = cond.strip()
-        # 条件被清空：原本无 condition，删除整行（返回哨兵，随后压缩空行清理）
+        # 条件被清空：原本无 condition，删除整行（含换行）
         if not cond:
             return ''
-        return f'{head}= {cond}'
+        return f'{head}= {cond}{newline}'
 
     def _strip_local_selector(self, content: str) -> str:
         """移除各mod ini中的IOOH注入内容（本地选择器变量、上下键、旧CommandList）"""
@@ -949,11 +1590,17 @@ endif
         # 移除新版本地选择器：起止标记之间整块删除（标记、夹缝注释、全部 Key/CommandList
         # section 一次清掉）。起止标记由注入时同一字符串原子写入，不会只剩半边；
         # 按块删可避免夹在标记与首个 section 之间的说明注释逐次累积。
+        # 注入时在块前补的两个换行一并删除，使「剥离 + 重新注入」结果与磁盘逐字节一致。
         content = re.sub(
-            r';\s*=====\s*IOOH 本地选择器\s*=====[\s\S]*?;\s*=====\s*IOOH 本地选择器结束\s*=====\s*\n?',
+            r'(?:\n\n)?;\s*=====\s*IOOH 本地选择器\s*=====[\s\S]*?;\s*=====\s*IOOH 本地选择器结束\s*=====\s*\n?',
             '', content, flags=re.MULTILINE,
         )
 
+        # 还原被门控的 [Present]：删去起止标记与 if/endif 两行（正文注入时未改动）
+        content = re.sub(rf'^{re.escape(PRESENT_GATE_BEGIN)}\nif \$iooh_en\d+ == 1\n', '', content,
+                         flags=re.MULTILINE)
+        content = content.replace(f'\nendif\n{PRESENT_GATE_END}', '')
+
         # 移除旧的 IOOH CommandList sections（上次脚本生成的）
         content = re.sub(r'\[CommandList_IOOH_\w+\][\s\S]*?(?=\n\[|\Z)', '', content, flags=re.MULTILINE)
 
@@ -971,7 +1618,7 @@ endif
         # 早期版本会对鼠标键 section 也注入门控；如今这些 section 不再纳入注入、不走
         # _modify_key_section_with_context 的清理，故在此统一还原任意 condition 行：
         # 去掉门控项后若 condition 为空则整行删除（原本无 condition 的 section 复原）。
-        content = re.sub(r'(?im)^([ \t]*condition\s*=.*)$', self._strip_condition_gates, content)
+        content = re.sub(r'(?im)^([ \t]*condition\s*=.*?)(\r?\n|\Z)', self._strip_condition_gates, content)
 
         # 清理多余空行（3个以上连续空行压缩为2个）
         content = re.sub(r'\n{4,}', '\n\n\n', content)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""文件复制快速路径：内容比对跳过 + reflink / 硬链接 / 普通复制逐级回退。
+
+- same_content：大小相同再比 sha256，内容一致的目标无需重写
+- fast_copy：优先 reflink（写时复制，Linux FICLONE / macOS clonefile），
+  其次硬链接（仅限只读部署资源，调用方显式允许），最后 shutil.copy2
+
+硬链接让两个路径共享同一份数据，任一方原地改写都会波及另一方；
+因此 ini 备份/还原只用 reflink 或复制，硬链接仅用于着色器、muban 这类只读资源。
+"""
+
+import hashlib
+import os
+import shutil
+import sys
+
+# Linux FICLONE ioctl 编号（_IOW(0x94, 9, int)）
+_FICLONE = 0x40049409
+
+# 各复制方式的返回标记
+COPY_SKIPPED = "skip"
+COPY_REFLINK = "reflink"
+COPY_HARDLINK = "hardlink"
+COPY_FULL = "copy"
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """分块计算文件 sha256。"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def same_content(src: str, dst: str) -> bool:
+    """两文件内容是否一致：先比大小（廉价），相同再比 sha256。"""
+    try:
+        if os.path.samefile(src, dst):
+            return True
+        if os.path.getsize(src) != os.path.getsize(dst):
+            return False
+    except OSError:
+        return False
+    return file_digest(src) == file_digest(dst)
+
+
+def _try_reflink(src: str, dst: str) -> bool:
+    """尝试写时复制克隆；文件系统/平台不支持时返回 False 且不留残留文件。"""
+    if sys.platform.startswith("linux"):
+        try:
+            import fcntl
+        except ImportError:
+            return False
+        try:
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+            return True
+        except OSError:
+            _remove_quietly(dst)
+            return False
+    if sys.platform == "darwin":
+        try:
+            import ctypes
+            libc = ctypes.CDLL(None, use_errno=True)
+            clonefile = libc.clonefile
+        except (OSError, AttributeError):
+            return False
+        _remove_quietly(dst)
+        return clonefile(os.fsencode(src), os.fsencode(dst), 0) == 0
+    # Windows 的 ReFS 块克隆需 DeviceIoControl 逐段复制，收益有限，直接回退
+    return False
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def fast_copy(src: str, dst: str, allow_hardlink: bool = False) -> str:
+    """把 src 复制到 dst，按 reflink → 硬链接（可选）→ 普通复制逐级回退。
+
+    内容已一致时直接跳过。返回实际采用的方式（COPY_* 常量）。
+    """
+    if os.path.exists(dst):
+        if same_content(src, dst):
+            return COPY_SKIPPED
+        if not os.access(dst, os.W_OK):
+            os.chmod(dst, 0o666)
+
+    # 先写到同目录临时名再原子替换：克隆/链接失败不会破坏原目标，
+    # 也避免对已有硬链接目标原地改写而殃及其另一端
+    tmp_path = dst + ".iooh_tmp"
+    _remove_quietly(tmp_path)
+
+    if _try_reflink(src, tmp_path):
+        shutil.copystat(src, tmp_path)
+        os.replace(tmp_path, dst)
+        return COPY_REFLINK
+
+    if allow_hardlink:
+        try:
+            os.link(src, tmp_path)
+            os.replace(tmp_path, dst)
+            return COPY_HARDLINK
+        except OSError:
+            _remove_quietly(tmp_path)
+
+    shutil.copy2(src, tmp_path)
+    os.replace(tmp_path, dst)
+    return COPY_FULL
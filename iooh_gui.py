@@ -3,12 +3,20 @@
 """EFMI Key Context Configurator - 图形界面。"""
 
 import os
+import queue
+import threading
+import time
 from datetime import datetime
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 
 from iooh_configurator import EFMIKeyConfigurator
 from iooh_keys import ACTIONS, ACTION_LABELS, key_display, token_for_keycode, capture_with_modifiers
+from iooh_build import explain_lines
+from iooh_analyzer import COST_FIELDS, analyze_directory, format_bytes
+from iooh_bundle import export_bundle, import_bundle
+from iooh_pipeline import (build_config_pipeline, EVENT_ITEM, EVENT_STAGE_DONE,
+                           EVENT_STAGE_FAILED, EVENT_STAGE_SKIPPED)
 
 
 GUI_TRANSLATIONS = {
@@ -16,7 +24,13 @@ GUI_TRANSLATIONS = {
     "mod_dir": {"zh": "Mods目录:", "en": "Mods Directory:"},
     "browse": {"zh": "打开文件夹", "en": "open folder"},
     "config": {"zh": "自动配置并保存", "en": "Auto Config & Save"},
+    "config_selected": {"zh": "仅配置选中", "en": "Config Selected"},
     "restore": {"zh": "恢复备份", "en": "Restore Backup"},
+    "compact": {"zh": "整理角色ID", "en": "Compact IDs"},
+    "analyze": {"zh": "开销分析", "en": "Cost Report"},
+    "conflicts": {"zh": "按键冲突", "en": "Key Conflicts"},
+    "export": {"zh": "导出配置包", "en": "Export Bundle"},
+    "import": {"zh": "导入配置包", "en": "Import Bundle"},
     "lang_btn": {"zh": "🌐 English", "en": "🌐 中文"},
     "col_mod_name": {"zh": "Mod名称", "en": "Mod Name"},
     "col_char_id": {"zh": "角色ID", "en": "Char ID"},
@@ -70,6 +84,17 @@ class KeyConfiguratorGUI:
         # mod 列表内改键状态
         self._row_capture = None       # 正在捕获的 (tree_item, binding) 或 None
         self._tree_bindings = {}       # tree_item -> ModKeyBinding（用于改键写回）
+        self._tree_mods = {}           # tree_item -> ModInfo（用于选择性配置）
+
+        # 流式扫描状态（扫描中按 Esc 提前停止）
+        self._scanning = False
+        self._scan_cancelled = False
+        # 正在执行的配置流水线（执行中按 Esc 取消）
+        self._pipeline = None
+        # 启动时从扫描快照恢复列表后的后台校验（完成前暂不允许配置/改键）
+        self._validating = False
+        self._snapshot_token = 0       # 每次完整扫描递增，作废进行中的快照校验
+        self._snapshot_results = queue.Queue()
 
         self._create_widgets()
         # 全局监听键盘：仅在捕获态生效，空闲时直接放行不干扰其他输入
@@ -95,7 +120,13 @@ class KeyConfiguratorGUI:
         self.lbl_mod_dir.config(text=self._tr("mod_dir"))
         self.btn_browse.config(text=self._tr("browse"))
         self.btn_config.config(text=self._tr("config"))
+        self.btn_config_selected.config(text=self._tr("config_selected"))
         self.btn_restore.config(text=self._tr("restore"))
+        self.btn_compact.config(text=self._tr("compact"))
+        self.btn_analyze.config(text=self._tr("analyze"))
+        self.btn_conflicts.config(text=self._tr("conflicts"))
+        self.btn_export.config(text=self._tr("export"))
+        self.btn_import.config(text=self._tr("import"))
         self.btn_lang.config(text=self._tr("lang_btn"))
 
         self.tree.heading("mod_name", text=self._tr("col_mod_name"))
@@ -148,8 +179,20 @@ class KeyConfiguratorGUI:
         self.btn_browse.pack(side=tk.LEFT, padx=2)
         self.btn_config = ttk.Button(toolbar, command=self._auto_config)
         self.btn_config.pack(side=tk.LEFT, padx=2)
+        self.btn_config_selected = ttk.Button(toolbar, command=self._config_selected)
+        self.btn_config_selected.pack(side=tk.LEFT, padx=2)
         self.btn_restore = ttk.Button(toolbar, command=self._restore_backup)
         self.btn_restore.pack(side=tk.LEFT, padx=2)
+        self.btn_compact = ttk.Button(toolbar, command=self._compact_ids)
+        self.btn_compact.pack(side=tk.LEFT, padx=2)
+        self.btn_analyze = ttk.Button(toolbar, command=self._show_cost_report)
+        self.btn_analyze.pack(side=tk.LEFT, padx=2)
+        self.btn_conflicts = ttk.Button(toolbar, command=self._show_key_conflicts)
+        self.btn_conflicts.pack(side=tk.LEFT, padx=2)
+        self.btn_export = ttk.Button(toolbar, command=self._export_bundle)
+        self.btn_export.pack(side=tk.LEFT, padx=2)
+        self.btn_import = ttk.Button(toolbar, command=self._import_bundle)
+        self.btn_import.pack(side=tk.LEFT, padx=2)
 
         # 语言切换按钮靠右
         self.btn_lang = ttk.Button(toolbar, command=self._toggle_lang)
@@ -164,7 +207,9 @@ class KeyConfiguratorGUI:
 
         # 创建表格
         columns = ("mod_name", "char_id", "function", "key", "status")
-        self.tree = ttk.Treeview(main_frame, columns=columns, show='headings', height=20)
+        # 多选（Ctrl/Shift）：配合「仅配置选中」只处理选中行所属的 mod
+        self.tree = ttk.Treeview(main_frame, columns=columns, show='headings', height=20,
+                                 selectmode='extended')
 
         self.tree.column("mod_name", width=250, anchor=tk.W)
         self.tree.column("char_id", width=80, anchor=tk.CENTER)
@@ -221,6 +266,15 @@ class KeyConfiguratorGUI:
 
     def _on_key_capture(self, event):
         """全局键盘回调：菜单键捕获 / mod 列表改键捕获，二者互斥；空闲时放行。"""
+        if self._pipeline is not None:
+            if event.keysym == "Escape":
+                self._pipeline.cancel()
+            return
+        if self._scanning:
+            # 扫描进行中：Esc 提前停止（已发现的 mod 照常排序、分配 id）
+            if event.keysym == "Escape":
+                self._scan_cancelled = True
+            return
         if self._row_capture is not None:
             return self._handle_row_capture(event)
         if self._capturing_action is None:
@@ -238,15 +292,31 @@ class KeyConfiguratorGUI:
             # 不支持的键（修饰键、回车空格等）：忽略，保持捕获态继续等待
             return "break"
 
+        changed = self.configurator.iooh_keys.token(action) != token
         self.configurator.iooh_keys.set_key(action, token)
         self.configurator.iooh_keys.save()
         self._capturing_action = None
         self._refresh_key_button(action)
+        if changed:
+            self._apply_menu_keys_fast()
         return "break"
 
+    def _apply_menu_keys_fast(self):
+        """菜单键变更后就地改写已注入文件的 key 行与提示纹理，无需重跑完整流程。"""
+        main_ini = os.path.join(self.configurator._resolve_output_dir(), "IOOHmod.ini")
+        if not self.configurator.mods or not os.path.isfile(main_ini):
+            self.log("菜单按键已保存 — 需点「自动配置并保存」生效")
+            return
+        report = self.configurator.apply_menu_key_change(self.lang)
+        self.log(f"✓ 菜单按键已就地更新: {report['patched']} 个ini改写，{report['unchanged']} 个无需改动，"
+                 f"IOOHmod.ini {report['main_ini']}，提示纹理{'已' if report['hint'] else '未'}更新")
+        if report["missing"] or report["failed"] or report["main_ini"] == "failed":
+            self.log(f"  ✗ {len(report['missing'])} 个ini尚未注入、{len(report['failed'])} 个核对失败 — "
+                     "请点「自动配置并保存」完整更新")
+
     def _on_tree_double_click(self, event):
         """双击「按键」列：对该行绑定进入改键捕获态。"""
-        if self.tree.identify("region", event.x, event.y) != "cell":
+        if self._busy() or self.tree.identify("region", event.x, event.y) != "cell":
             return
         if self.tree.identify_column(event.x) != "#4":  # 第4列 = key
             return
@@ -257,6 +327,8 @@ class KeyConfiguratorGUI:
 
     def _start_row_capture(self, item):
         """进入 mod 改键捕获态：该行按键列显示提示，等待按下组合键。"""
+        if self._validating_busy():
+            return
         # 若正在捕获其它来源，先取消
         if self._capturing_action is not None:
             prev = self._capturing_action
@@ -281,12 +353,15 @@ class KeyConfiguratorGUI:
             # 纯修饰键或不支持的主键：继续等待
             return "break"
 
-        # 列表显示与 ini 原文一致（不转友好符号）。改键只更新内存 binding，
-        # 注入时写进 ini —— ini 即改键的唯一真实来源，无需另存快照。
-        binding.key = ini_form
+        # 列表显示与 ini 原文一致（不转友好符号）。改键立即只改写该绑定所属 ini 的
+        # key 行 —— ini 即改键的唯一真实来源，无需另存快照，也无需重跑自动配置。
         self._row_capture = None
         self._set_row_key_text(item, ini_form)
-        self.log(f"✎ {binding.section_name} 按键改为 {ini_form} — 需点「自动配置并保存」生效")
+        if self.configurator.rebind_key(binding, ini_form):
+            self.log(f"✎ {binding.section_name} 按键改为 {ini_form} — 已写入 {os.path.basename(binding.ini_file)}")
+        else:
+            # 落盘失败：rebind_key 已把新键记在内存（含冲突索引），下次自动配置注入时写进 ini
+            self.log(f"✎ {binding.section_name} 按键改为 {ini_form} — 写入失败，需点「自动配置并保存」生效")
         return "break"
 
     def _set_row_key_text(self, item, text):
@@ -298,6 +373,8 @@ class KeyConfiguratorGUI:
 
     def _browse_directory(self):
         """浏览目录：选定后自动扫描。"""
+        if self._busy():
+            return
         directory = filedialog.askdirectory(initialdir=self.dir_entry.get())
         if directory:
             self.dir_entry.delete(0, tk.END)
@@ -309,6 +386,8 @@ class KeyConfiguratorGUI:
 
         quiet=True 时静默刷新列表（不打扫描日志），供操作收尾的自动重扫使用。
         """
+        if self._busy():
+            return
         directory = self.dir_entry.get()
         if not os.path.exists(directory):
             if not quiet:
@@ -317,13 +396,46 @@ class KeyConfiguratorGUI:
 
         if not quiet:
             self.log(f"开始扫描目录: {directory}")
-            self.log("检测所有热键绑定...")
-        mods = self.configurator.scan_mods(directory)
+            self.log("检测所有热键绑定...（按 Esc 可提前停止）")
+
+        # 完整扫描取代进行中的快照校验
+        self._snapshot_token += 1
+        self._validating = False
+
+        # 流式扫描：每发现一个 mod 立即追加到列表；结束后按名称排序、带最终 id 重建一次
+        self._populate_tree([])
+        # 扫描期间 log / update 会处理界面事件：禁用其它操作，避免嵌套扫描或配置改写同一份 mods 列表
+        self._scanning = True
+        self._scan_cancelled = False
+        self._set_actions_enabled(False)
+        scan = self.configurator.iter_scan_mods(directory)
+        last_refresh = 0.0
+        try:
+            for mod, stats in scan:
+                self._append_mod_rows(mod)
+                if not quiet:
+                    ini_names = [os.path.basename(f) for f in mod.ini_files]
+                    self.log(f"  ✓ [{stats.folders_done}/{stats.folders_total}] {mod.name}: "
+                             f"{', '.join(ini_names)} ({len(mod.key_bindings)}个按键绑定)")
+                elif time.monotonic() - last_refresh > 0.1:
+                    last_refresh = time.monotonic()
+                    self.root.update()
+                if self._scan_cancelled:
+                    break
+        finally:
+            scan.close()
+            self._scanning = False
+            self._set_actions_enabled(True)
+
+        mods = self.configurator.mods
         if not quiet:
-            self.log(f"扫描完成，发现 {len(mods)} 个包含热键绑定的mod")
-            for mod in mods:
-                ini_names = [os.path.basename(f) for f in mod.ini_files]
-                self.log(f"  ✓ {mod.name}: {', '.join(ini_names)} ({len(mod.key_bindings)}个按键绑定)")
+            stats = self.configurator.last_scan_stats
+            self.log(f"遍历 {stats.dirs_visited} 个目录，剪枝 {stats.dirs_pruned} 个资源/排除目录")
+            if stats.complete:
+                self.log(f"扫描完成，发现 {len(mods)} 个包含热键绑定的mod")
+            else:
+                self.log(f"扫描已提前停止（{stats.folders_done}/{stats.folders_total}），"
+                         f"已发现 {len(mods)} 个包含热键绑定的mod")
 
         self._populate_tree(mods)
 
@@ -338,22 +450,116 @@ class KeyConfiguratorGUI:
             total_ini_files = sum(len(m.ini_files) for m in mods)
             self.log(f"列表已更新，共 {total_ini_files} 个ini文件，{total_bindings} 个按键绑定")
             self.log("提示：双击「按键」列可改键；改完点「自动配置并保存」生效。")
+            menu_conflicts = [c for c in self.configurator.key_conflicts() if c.menu_actions]
+            if menu_conflicts:
+                self.log(f"⚠ {len(menu_conflicts)} 处按键与 IOOH 菜单键冲突（"
+                         + "、".join(c.press for c in menu_conflicts) + "），点「按键冲突」查看")
+
+    def _restore_snapshot(self):
+        """启动时从扫描快照立即恢复列表，随后在后台校验并只重扫变化的 mod。"""
+        start = time.perf_counter()
+        if not self.configurator.load_snapshot():
+            return
+        mods = self.configurator.mods
+        self.dir_entry.delete(0, tk.END)
+        self.dir_entry.insert(0, self.configurator.mods_directory)
+        self._populate_tree(mods)
+        self.log(f"已从扫描快照恢复 {len(mods)} 个mod、{sum(len(m.key_bindings) for m in mods)} 个按键绑定"
+                 f"（{(time.perf_counter() - start) * 1000:.0f} ms），正在后台校验…")
+
+        self._validating = True
+        token = self._snapshot_token
+
+        def worker():
+            try:
+                result = self.configurator.snapshot_changes()
+            except OSError as e:
+                result = e
+            self._snapshot_results.put((token, result))
+
+        threading.Thread(target=worker, daemon=True).start()
+        self.root.after(100, self._poll_snapshot_validation)
+
+    def _poll_snapshot_validation(self):
+        """取回后台校验结果（tkinter 只能在主线程操作），修补列表。"""
+        try:
+            token, result = self._snapshot_results.get_nowait()
+        except queue.Empty:
+            self.root.after(100, self._poll_snapshot_validation)
+            return
+        if token != self._snapshot_token:
+            return  # 校验期间已完整重扫，结果作废
+        self._validating = False
+        if isinstance(result, OSError):
+            self.log(f"快照校验失败（{result}），重新扫描")
+            self._scan_mods(quiet=True)
+            return
+        changed, removed = result
+        if not changed and not removed:
+            self.log("✓ 快照校验完成，列表为最新")
+            return
+        dropped, added = self.configurator.apply_snapshot_changes(changed, removed)
+        self._patch_tree(dropped, added)
+        self.log(f"✓ 快照校验完成：重新解析 {len(changed)} 个有变化的mod文件夹，移除 {len(removed)} 个"
+                 f"（列表更新 {len(dropped)} → {len(added)} 个mod）")
+
+    def _patch_tree(self, dropped, added):
+        """只删除/插入变化的 mod 对应的行，其余行保持不动（列表顺序与 configurator.mods 一致）。"""
+        dropped_ids = {id(mod) for mod in dropped}
+        for item, mod in list(self._tree_mods.items()):
+            if id(mod) in dropped_ids:
+                self.tree.delete(item)
+                del self._tree_mods[item]
+                self._tree_bindings.pop(item, None)
+        added_ids = {id(mod) for mod in added}
+        index = 0
+        for mod in self.configurator.mods:
+            if id(mod) in added_ids:
+                self._append_mod_rows(mod, index)
+            index += len(mod.key_bindings)
+
+    def _validating_busy(self) -> bool:
+        """快照校验未完成时提示稍候（列表可能尚未反映磁盘上的改动）。"""
+        if self._validating:
+            messagebox.showinfo("提示", "正在校验扫描快照，请稍候")
+        return self._validating
+
+    def _busy(self) -> bool:
+        """流式扫描或配置流水线进行中（主线程让出事件循环处理界面事件，期间不接受其它操作）。"""
+        return self._scanning or self._pipeline is not None
+
+    def _set_actions_enabled(self, enabled: bool):
+        """禁用/恢复工具栏、路径输入框与菜单键按钮（扫描/执行中 Esc 仍可停止/取消）。"""
+        widgets = [self.dir_entry, self.btn_browse, self.btn_config, self.btn_config_selected,
+                   self.btn_restore, self.btn_compact, self.btn_analyze, self.btn_conflicts,
+                   self.btn_export, self.btn_import]
+        widgets.extend(self._key_buttons.values())
+        for widget in widgets:
+            widget.state(["!disabled"] if enabled else ["disabled"])
 
     def _populate_tree(self, mods):
         """清空并重建列表，记录每行对应的 binding 以支持改键。"""
         for item in self.tree.get_children():
             self.tree.delete(item)
         self._tree_bindings.clear()
+        self._tree_mods.clear()
         for mod in mods:
-            for binding in mod.key_bindings:
-                item = self.tree.insert("", tk.END, values=(
-                    mod.name,
-                    mod.character_id,
-                    binding.description,
-                    binding.key,
-                    self._tr("status_configured"),
-                ))
-                self._tree_bindings[item] = binding
+            self._append_mod_rows(mod)
+
+    def _append_mod_rows(self, mod, index=tk.END):
+        """把一个 mod 的全部按键绑定插入列表（默认追加到末尾；流式扫描时 id 未分配显示为「新」）。"""
+        char_id = mod.character_id if mod.character_id >= 0 else "新"
+        for offset, binding in enumerate(mod.key_bindings):
+            position = index if index == tk.END else index + offset
+            item = self.tree.insert("", position, values=(
+                mod.name,
+                char_id,
+                binding.description,
+                binding.key,
+                self._tr("status_configured"),
+            ))
+            self._tree_bindings[item] = binding
+            self._tree_mods[item] = mod
 
     def _auto_config(self):
         """自动配置：增量清理旧注入 → 注入选择器 → 生成主 ini/配置/纹理。"""
@@ -362,42 +568,85 @@ class KeyConfiguratorGUI:
             return
         self._run_pipeline()
 
-    def _run_pipeline(self):
-        """完整流程：注入选择器 → 生成主 ini → 保存配置 → 生成纹理 → 打印说明。
+    def _config_selected(self):
+        """仅配置列表中选中行所属的 mod（注入 + 纹理），名册未变时不重写 IOOHmod.ini。"""
+        selected = []
+        for item in self.tree.selection():
+            mod = self._tree_mods.get(item)
+            if mod is not None and mod not in selected:
+                selected.append(mod)
+        if not selected:
+            messagebox.showwarning("提示", "请先在列表中选中要配置的 mod（可 Ctrl/Shift 多选）")
+            return
+        self._run_pipeline(selected)
+
+    def _run_pipeline(self, selected=None):
+        """完整流程：注入选择器 / 生成主 ini / 保存配置 / 生成纹理（并发流水线）→ 打印说明。
 
         注入靠 _strip_local_selector 增量清理上次注入内容（不还原备份），改键由
         内存 binding.key 承载、注入时写进 ini，故 ini 自身即改键的真实来源、天然跨启动持久。
         恢复原始 ini 是独立操作（「恢复备份」按钮），不混入注入流程。
+        selected 给定时为选择性运行。实际范围由构建图（plan_run）决定：只重建输入有变化的节点。
         """
-        mods = self.configurator.mods
-
-        self.log("开始备份并注入选择器上下文...")
-        success_count = 0
-        for mod in mods:
-            if self.configurator.modify_mod_ini(mod):
-                success_count += 1
-                self.log(f"  ✓ {mod.name} 按键已配置 (ID={mod.character_id}, {len(mod.key_bindings)}个按键)")
+        if self._busy() or self._validating_busy():
+            return
+        # 上次运行被中断：先让用户决定继续还是回滚
+        if self.configurator.pending_run() is not None:
+            self._handle_pending_run()
+            return
+        # 提前停止的扫描只得到部分名册：据此重写 IOOHmod.ini 与选择器循环会让
+        # 未扫描到的 mod 失去同步，先完整扫描
+        if not self.configurator.mods_complete:
+            if not messagebox.askyesno("提示", "列表只包含部分 mod（扫描被提前停止），配置前需要完整扫描。\n\n现在重新扫描？"):
+                return
+            self._scan_mods()
+            if not self.configurator.mods_complete:
+                return
+            if selected is not None:
+                # 重新扫描后列表行已重建，原先选中的行不再对应
+                self.log("扫描完成，请重新选中要配置的 mod")
+                return
+
+        plan = self.configurator.plan_run(selected, hint_lines=self.configurator.iooh_keys.hint_lines(self.lang))
+        mods = plan.inject
+        if selected is not None:
+            if plan.full_inject_reason:
+                self.log(f"选择性配置扩大到其余 mod：{plan.full_inject_reason}")
             else:
-                self.log(f"  ✗ {mod.name} 配置失败")
-        self.log(f"注入完成: {success_count}/{len(mods)}")
-
-        # 生成主 IOOHmod.ini（动态角色列表）
-        if self.configurator.generate_main_mod_ini():
-            self.log(f"✓ 主UI配置已生成: IOOHmod.ini (角色数:{len(mods)})")
-
-        # 主 ini 引用 xxmi_key_config.json 派生的纹理；生成纹理前确保中间配置就位
-        if self.configurator.save_config():
-            self.log(f"✓ 配置已保存到 {self.configurator.config_file}")
-
-        # 生成UI纹理（按键提示文案随当前自定义按键动态生成）
-        self.log("正在生成UI纹理...")
+                self.log(f"仅配置选中的 {len(mods)} 个 mod")
+        for line in explain_lines(plan.reasons, verbose=False):
+            self.log(line)
+        if not self.configurator.begin_run(plan, selected):
+            return
+        self._execute_plan(plan)
+
+    def _execute_plan(self, plan):
+        """执行运行计划（预写日志已开启）：并发流水线 → 对账 → 打印说明。执行中按 Esc 取消。"""
+        # 注入、主 ini、配置保存、纹理渲染按依赖图并发执行；事件回到主线程写日志
+        self.log("开始备份并注入选择器上下文，同时生成主配置与UI纹理...（按 Esc 可取消）")
+        if not plan.main_ini:
+            self.log("IOOHmod.ini 已是最新，保持不变")
+        executor = build_config_pipeline(self.configurator, plan, plan.hint_lines)
+        # 流水线期间 poll 会处理界面事件：禁用其它操作，避免回滚/整理ID/导入等与写文件的线程并发
+        self._pipeline = executor
+        self._set_actions_enabled(False)
         try:
-            from generate_ui_textures import UITextureGenerator
-            generator = UITextureGenerator(base_output_dir=self.configurator._resolve_output_dir())
-            generator.generate_all(hint_lines=self.configurator.iooh_keys.hint_lines(self.lang))
-            self.log("✓ UI纹理已自动生成")
-        except Exception as e:
-            self.log(f"✗ UI纹理生成异常: {e}")
+            stages = executor.run(on_event=lambda event: self._on_pipeline_event(event, plan),
+                                  poll=self.root.update)
+        finally:
+            self._pipeline = None
+            self._set_actions_enabled(True)
+        results = stages["inject"].result or []
+        self.configurator.reconcile_injection(results)
+        self.configurator.finish_run(completed=not executor.cancelled)
+        self._populate_tree(self.configurator.mods)
+        if executor.cancelled:
+            self.log("✗ 配置已取消：下次点击配置时可选择继续完成或回滚到运行前")
+            return
+        if stages["textures"].error:
+            self.log(f"✗ UI纹理生成异常: {stages['textures'].error}")
+        timings = ", ".join(f"{name} {stage.elapsed:.2f}s" for name, stage in stages.items())
+        self.log(f"阶段耗时: {timings}")
 
         # 完成信息（按键说明随当前自定义按键动态显示）
         ioohk = self.configurator.iooh_keys
@@ -413,12 +662,80 @@ class KeyConfiguratorGUI:
         self.log("3. 无需修改 d3dx.ini")
         self.log("=" * 60)
 
-        # 流程完成后重新扫描刷新列表（静默：不刷扫描日志；扫描只读、剥离注入、套用改键）
-        if self.configurator.mods_directory:
-            self._scan_mods(quiet=True)
+
+    def _handle_pending_run(self):
+        """上次配置运行未完成（崩溃/取消）：询问继续、回滚或暂不处理。"""
+        summary = self.configurator.pending_run()
+        if summary is None:
+            return
+        begin = summary["begin"]
+        answer = messagebox.askyesnocancel(
+            "上次配置未完成",
+            f"上次配置运行（{begin.get('time', '?')}）未完成：\n"
+            f"Mods 目录: {begin.get('mods_directory', '?')}\n"
+            f"已完成 {len(summary['nodes'])} 个节点，改写过 {summary['files']} 个文件。\n\n"
+            "是：继续完成（已完成的部分不重做）\n否：回滚到运行前\n取消：暂不处理",
+        )
+        if answer is None:
+            return
+        if answer:
+            plan = self.configurator.resume_run(hint_lines=self.configurator.iooh_keys.hint_lines(self.lang))
+            if plan is None:
+                messagebox.showerror("错误", "未完成运行的 Mods 目录已不存在，只能回滚")
+                return
+            self.dir_entry.delete(0, tk.END)
+            self.dir_entry.insert(0, self.configurator.mods_directory)
+            self.log("继续上次未完成的配置运行...")
+            self._execute_plan(plan)
+        else:
+            report = self.configurator.rollback_run()
+            self.log(f"✓ 已回滚上次未完成的运行（恢复 {report['restored']} 次文件改写）")
+            for path in report["failed"]:
+                self.log(f"  ✗ 恢复失败: {path}")
+
+    def _on_pipeline_event(self, event, plan):
+        """流水线事件回调（主线程）：记录完成的构建节点，逐项注入结果与阶段完成情况写入日志。"""
+        self.configurator.record_event(plan, event)
+        kind, stage, payload = event
+        if kind == EVENT_ITEM and stage == "inject":
+            mod = payload.mod
+            if payload.success:
+                self.log(f"  ✓ {mod.name} 按键已配置 (ID={mod.character_id}, {len(mod.key_bindings)}个按键)")
+            else:
+                self.log(f"  ✗ {mod.name} 配置失败")
+        elif kind == EVENT_STAGE_DONE and stage == "inject":
+            success_count = sum(1 for r in payload if r.success)
+            written = sum(len(r.written) for r in payload)
+            unchanged = sum(len(r.unchanged) for r in payload)
+            self.log(f"注入完成: {success_count}/{len(payload)}（改写 {written} 个ini，{unchanged} 个无变化）")
+            self._log_backup_report()
+        elif kind == EVENT_STAGE_DONE and stage == "main_ini":
+            self.log(f"✓ 主UI配置已生成: IOOHmod.ini (角色数:{len(self.configurator.mods)})")
+        elif kind == EVENT_STAGE_DONE and stage == "save_config":
+            self.log(f"✓ 配置已保存到 {self.configurator.config_file}")
+        elif kind == EVENT_STAGE_DONE and stage == "textures":
+            if plan.texture_ids is None:
+                self.log(f"✓ UI纹理已自动生成（{len(payload)} 个角色）")
+            else:
+                self.log(f"✓ 已生成 {len(payload)} 个角色的UI纹理")
+        elif kind in (EVENT_STAGE_FAILED, EVENT_STAGE_SKIPPED) and stage != "textures":
+            self.log(f"✗ 阶段 {stage} 未完成: {payload}")
+
+    def _log_backup_report(self):
+        """打印备份仓库空间统计（去重 + 压缩后的节省量）。"""
+        report = self.configurator.backup_report()
+        if not report["files"]:
+            return
+        self.log(
+            f"备份仓库: {report['files']} 个文件 / {report['blobs']} 个唯一块，"
+            f"原始 {report['logical_bytes'] / 1024:.1f} KB → 实占 {report['stored_bytes'] / 1024:.1f} KB"
+            f"（节省 {report['saved_ratio'] * 100:.1f}%）"
+        )
 
     def _restore_backup(self):
-        """恢复所有 mod 的 .backup，完全还原到原始状态。"""
+        """恢复所有 mod 的备份（仓库 + 旧版 .backup），完全还原到原始状态。"""
+        if self._busy():
+            return
         directory = self.dir_entry.get()
         if not os.path.exists(directory):
             messagebox.showerror("错误", "目录不存在！")
@@ -430,6 +747,167 @@ class KeyConfiguratorGUI:
             self._scan_mods(quiet=True)
         self.log("✓ 恢复备份完成（已还原原始按键）")
 
+    def _compact_ids(self):
+        """整理角色ID：移除已删除 mod 的保留 id，按名称重新编号为 0..n-1。"""
+        if self._busy():
+            return
+        if not self.configurator.mods:
+            messagebox.showwarning("提示", "请先扫描 Mods 目录")
+            return
+        remap = self.configurator.compact_ids()
+        if not remap:
+            self.log("角色ID已连续，无需整理")
+            return
+        for old_id, new_id in sorted(remap.items()):
+            self.log(f"  角色ID {old_id} → {new_id}")
+        self._populate_tree(self.configurator.mods)
+        self.log(f"✓ 已重新编号 {len(remap)} 个角色 — 需点「自动配置并保存」生效")
+
+    def _export_bundle(self):
+        """导出配置包：当前配置结果（注入的 ini、IOOHmod.ini、纹理、按键与角色ID）打成 zip。"""
+        if self._busy():
+            return
+        if not self.configurator.mods:
+            messagebox.showwarning("提示", "请先扫描 Mods 目录")
+            return
+        if self._validating_busy():
+            return
+        bundle_path = filedialog.asksaveasfilename(defaultextension=".zip", initialfile="iooh_bundle.zip",
+                                                   filetypes=[("IOOH 配置包", "*.zip")])
+        if not bundle_path:
+            return
+        stats = export_bundle(self.configurator, bundle_path)
+        if stats is None:
+            messagebox.showwarning("提示", "配置不是最新或尚未配置，请先点「自动配置并保存」")
+            return
+        self.log(f"✓ 配置包已导出: {bundle_path}（{stats['inis']} 个注入的ini，{stats['outputs']} 个 IOOH 产物，"
+                 f"{format_bytes(stats['bytes'])}）")
+
+    def _import_bundle(self):
+        """导入配置包：mod 文件与包一致时直接部署，不扫描、不渲染。"""
+        if self._busy():
+            return
+        directory = self.dir_entry.get()
+        if not os.path.isdir(directory):
+            messagebox.showerror("错误", "目录不存在！")
+            return
+        if self._validating_busy():
+            return
+        # 上次运行被中断：导入同样要写 mod 文件，先让用户决定继续还是回滚
+        if self.configurator.pending_run() is not None:
+            self._handle_pending_run()
+            return
+        bundle_path = filedialog.askopenfilename(filetypes=[("IOOH 配置包", "*.zip")])
+        if not bundle_path:
+            return
+        report = import_bundle(self.configurator, bundle_path, directory)
+        for path in report["missing"]:
+            self.log(f"  ✗ 缺少: {path}")
+        for path in report["mismatched"]:
+            self.log(f"  ✗ 内容不同: {path}")
+        for path in report["unsafe"]:
+            self.log(f"  ✗ 非法路径: {path}")
+        for path in report["unlisted"]:
+            self.log(f"  ✗ 包外已注入: {path}")
+        if not report["ok"]:
+            messagebox.showwarning("提示", report["error"] or
+                                   "本机 mod 文件与配置包不一致，未写入任何文件。\n请直接使用「自动配置并保存」。")
+            return
+        self.log(f"✓ 配置包已导入：写入 {report['written']} 个ini（{report['unchanged']} 个已一致），"
+                 f"{report['outputs']} 个 IOOH 产物与配置")
+        for action in ACTIONS:
+            self._refresh_key_button(action)
+        self._scan_mods(quiet=True)
+
+    def _show_cost_report(self):
+        """静态开销分析：每个 mod 一行（可展开看各 ini），点击表头按该列排序。"""
+        directory = self.dir_entry.get()
+        if not os.path.isdir(directory):
+            messagebox.showerror("错误", "目录不存在！")
+            return
+        costs = analyze_directory(self.configurator, directory)
+        self.log(f"开销分析: {len(costs)} 个 mod，每帧命令合计 "
+                 f"{sum(c.total('present_commands') for c in costs)}")
+
+        window = tk.Toplevel(self.root)
+        window.title(f"{self._tr('analyze')} - {directory}")
+        window.geometry("1000x500")
+        fields = [name for name, _ in COST_FIELDS]
+        tree = ttk.Treeview(window, columns=fields, show='tree headings')
+        tree.heading("#0", text=self._tr("col_mod_name"))
+        tree.column("#0", width=260, anchor=tk.W)
+        for name, label in COST_FIELDS:
+            tree.column(name, width=100, anchor=tk.E)
+        scrollbar = ttk.Scrollbar(window, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        def cells(get):
+            return [format_bytes(get(name)) if name == "resource_bytes" else get(name) for name in fields]
+
+        # 行 -> 原始数值（排序用；显示值可能已格式化）
+        raw = {}
+        for cost in costs:
+            parent = tree.insert("", tk.END, text=cost.name, values=cells(cost.total))
+            raw[parent] = {name: cost.total(name) for name in fields}
+            for ini in cost.inis:
+                child = tree.insert(parent, tk.END, text=os.path.relpath(ini.path, cost.path),
+                                    values=cells(lambda name, ini=ini: getattr(ini, name)))
+                raw[child] = {name: getattr(ini, name) for name in fields}
+
+        order = {}
+
+        def sort_by(field):
+            descending = not order.get(field, False)
+            order[field] = descending
+            for parent in ("",) + tree.get_children(""):
+                rows = sorted(tree.get_children(parent), key=lambda row: raw[row][field], reverse=descending)
+                for index, row in enumerate(rows):
+                    tree.move(row, parent, index)
+
+        for name, label in COST_FIELDS:
+            tree.heading(name, text=label, command=lambda f=name: sort_by(f))
+
+    def _show_key_conflicts(self):
+        """按键冲突报告：每处冲突一行（可展开看各绑定），与菜单键冲突的标红置顶。"""
+        if not self.configurator.mods:
+            messagebox.showwarning("提示", "请先扫描 Mods 目录")
+            return
+        conflicts = self.configurator.key_conflicts()
+        menu = sum(1 for c in conflicts if c.menu_actions)
+        self.log(f"按键冲突: {len(conflicts)} 处（其中 {menu} 处涉及 IOOH 菜单键）")
+        if not conflicts:
+            messagebox.showinfo("按键冲突", "未发现按键冲突")
+            return
+
+        window = tk.Toplevel(self.root)
+        window.title(self._tr("conflicts"))
+        window.geometry("900x450")
+        tree = ttk.Treeview(window, columns=("detail",), show='tree headings')
+        tree.heading("#0", text=self._tr("col_key"))
+        tree.heading("detail", text=self._tr("col_function"))
+        tree.column("#0", width=300, anchor=tk.W)
+        tree.column("detail", width=560, anchor=tk.W)
+        tree.tag_configure("menu", foreground="red")
+        scrollbar = ttk.Scrollbar(window, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        directory = self.configurator.mods_directory
+        for conflict in conflicts:
+            if conflict.menu_actions:
+                labels = "、".join(ACTION_LABELS[a][self.lang] for a in conflict.menu_actions)
+                detail = f"与 IOOH 菜单键「{labels}」冲突，菜单会失灵"
+            else:
+                detail = f"{len(conflict.mod_paths)} 个 mod 同时触发"
+            parent = tree.insert("", tk.END, text=conflict.press, values=(detail,), open=bool(conflict.menu_actions),
+                                 tags=("menu",) if conflict.menu_actions else ())
+            for binding in conflict.bindings:
+                tree.insert(parent, tk.END, text=f"[{binding.section_name}] key = {binding.key}",
+                            values=(os.path.relpath(binding.ini_file, directory),))
+
     def log(self, message: str):
         """添加日志"""
         timestamp = datetime.now().strftime("%H:%M:%S")
@@ -438,5 +916,9 @@ class KeyConfiguratorGUI:
         self.root.update()
 
     def run(self):
-        """运行GUI"""
+        """运行GUI（启动后检查是否有未完成的配置运行；没有则从扫描快照恢复列表）"""
+        if self.configurator.pending_run() is not None:
+            self.root.after(200, self._handle_pending_run)
+        else:
+            self.root.after(0, self._restore_snapshot)
         self.root.mainloop()
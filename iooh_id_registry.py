@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""角色 ID 登记表：让 character_id 在多次扫描间保持稳定。
+
+原先扫描按 mod 名排序后以下标作为 character_id，新增一个名字靠前的 mod
+会让其后所有 id 整体后移，进而迫使每个 mod ini、每张头像/文字纹理与 IOOHmod.ini
+全部重新生成，游戏内的选择状态也随之错位。
+
+本模块按「mods 目录 + mod 文件夹名」登记 id，持久化到 exe/脚本同级的
+iooh_id_registry.json：
+- 已登记的 mod 始终沿用原 id
+- 新 mod 取最小的未占用 id（按名称顺序依次分配，结果可复现）
+- 已移除 mod 的 id 继续保留（重新放回时原样恢复），直到执行整理（compact）
+- compact：丢弃已不存在的登记项，按名称重新编号为 0..n-1，并清除预留槽位容量
+- 预留槽位模式下的选择器容量也按 mods 目录记在这里，容量不足时才增长
+"""
+
+import json
+import os
+from typing import Dict, List, Optional
+
+from iooh_models import ModInfo
+
+# 登记表文件名（位于 exe/脚本同级，不随包分发）
+ID_REGISTRY_FILENAME = "iooh_id_registry.json"
+
+
+def _dir_key(directory: str) -> str:
+    return os.path.normcase(os.path.abspath(directory))
+
+
+def mod_identity(mod: ModInfo) -> str:
+    """mod 的登记身份：文件夹名（平台大小写规整）。"""
+    return os.path.normcase(os.path.basename(os.path.normpath(mod.path)))
+
+
+class IDRegistry:
+    """按 mod 文件夹身份登记的稳定角色 ID。"""
+
+    def __init__(self, output_dir: str):
+        self.registry_path = os.path.join(output_dir, ID_REGISTRY_FILENAME)
+        # mods 目录键 -> {mod 身份: {"id": int, "name": 显示用文件夹名}}
+        self.directories: Dict[str, Dict[str, dict]] = {}
+        # mods 目录键 -> 预留的选择器槽位容量
+        self.capacities: Dict[str, int] = {}
+        self.load()
+
+    def load(self):
+        """读取登记表；缺失或损坏时从空表开始（此时等同按名称顺序编号）。"""
+        if not os.path.exists(self.registry_path):
+            return
+        try:
+            with open(self.registry_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"读取角色ID登记表失败，将重新分配: {e}")
+            return
+        self.directories = data.get("directories", {})
+        self.capacities = data.get("capacities", {})
+
+    def save(self) -> bool:
+        """保存登记表到磁盘。"""
+        try:
+            with open(self.registry_path, 'w', encoding='utf-8') as f:
+                json.dump({"directories": self.directories, "capacities": self.capacities},
+                          f, ensure_ascii=False, indent=2)
+            return True
+        except Exception as e:
+            print(f"保存角色ID登记表失败: {e}")
+            return False
+
+    def entries(self, mods_directory: str) -> Dict[str, dict]:
+        """返回某 mods 目录下的全部登记项（身份 -> {"id", "name"}）。"""
+        return self.directories.setdefault(_dir_key(mods_directory), {})
+
+    def lookup(self, mods_directory: str, mod: ModInfo) -> Optional[int]:
+        """返回 mod 已登记的 id；未登记返回 None（不分配）。"""
+        entry = self.entries(mods_directory).get(mod_identity(mod))
+        return entry["id"] if entry is not None else None
+
+    def assign(self, mods_directory: str, mods: List[ModInfo]) -> List[ModInfo]:
+        """为 mods 设置 character_id：已登记沿用，新 mod 依名称顺序取最小空闲 id。
+
+        返回本次新登记的 mod 列表。
+        """
+        entries = self.entries(mods_directory)
+        used = {entry["id"] for entry in entries.values()}
+        added = []
+        next_free = 0
+        for mod in sorted(mods, key=lambda m: m.name):
+            entry = entries.get(mod_identity(mod))
+            if entry is not None:
+                mod.character_id = entry["id"]
+                entry["name"] = mod.name
+                continue
+            while next_free in used:
+                next_free += 1
+            mod.character_id = next_free
+            used.add(next_free)
+            entries[mod_identity(mod)] = {"id": next_free, "name": mod.name}
+            added.append(mod)
+        return added
+
+    def compact(self, mods_directory: str, mods: List[ModInfo]) -> Dict[int, int]:
+        """整理：只保留当前 mods，按名称重新编号为 0..n-1。返回 {旧 id: 新 id}（仅含变化项）。"""
+        remap = {}
+        entries = {}
+        for new_id, mod in enumerate(sorted(mods, key=lambda m: m.name)):
+            if mod.character_id != new_id:
+                remap[mod.character_id] = new_id
+            mod.character_id = new_id
+            entries[mod_identity(mod)] = {"id": new_id, "name": mod.name}
+        self.directories[_dir_key(mods_directory)] = entries
+        self.capacities.pop(_dir_key(mods_directory), None)
+        return remap
+
+    def capacity(self, mods_directory: str) -> int:
+        """返回某 mods 目录已预留的选择器槽位容量（未预留为 0）。"""
+        return self.capacities.get(_dir_key(mods_directory), 0)
+
+    def set_capacity(self, mods_directory: str, capacity: int):
+        """记录某 mods 目录的选择器槽位容量。"""
+        self.capacities[_dir_key(mods_directory)] = capacity
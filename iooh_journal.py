@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""配置运行的预写日志：中断（崩溃/取消）后可继续或回滚。
+
+几百个 mod 的注入进行到一半被打断时，部分 mod 已注入、部分未注入，纹理与
+IOOHmod.ini 也可能对不上。本模块在 exe/脚本同级维护 iooh_journal.jsonl，
+每条记录一行、写入后立即 fsync：
+
+- begin：运行开始，记录 mods 目录、选择范围与是否强制重建
+- write：某文件即将被改写，记录其写前内容（存入备份仓库的块，已落盘）的 sha256；
+  文件原本不存在时为 null
+- written：该文件已完整写入
+- node：某构建节点已完成，附带其输入指纹（继续时回放到构建状态）
+- 运行正常结束后日志被删除，写前内容块随之删除；日志存在即表示上次运行未完成
+
+继续（resume）：有 write 无 written 的文件可能只写了一半，先用写前内容还原；
+回放已完成节点的指纹，再按原选择范围重新规划——已完成的节点不会重做。
+回滚（rollback）：按相反顺序把日志中改写过的所有文件恢复为写前内容（原本不存在的删除）。
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from iooh_backup import BackupStore, BackupIntegrityError
+
+# 日志文件名（位于 exe/脚本同级；存在即表示有未完成的运行）
+JOURNAL_FILENAME = "iooh_journal.jsonl"
+
+
+class RunJournal:
+    """一次配置运行的预写日志（线程安全：流水线各阶段线程共用一份）。"""
+
+    def __init__(self, output_dir: str, backup_store: BackupStore):
+        self.journal_path = os.path.join(output_dir, JOURNAL_FILENAME)
+        self.backup_store = backup_store
+        self._lock = threading.Lock()
+        self._file = None
+
+    # ===== 状态查询 =====
+
+    def pending(self) -> bool:
+        """是否存在未完成的运行。"""
+        return os.path.exists(self.journal_path)
+
+    def read(self) -> List[dict]:
+        """读出全部记录；末尾写了一半的行（崩溃时）忽略。"""
+        records = []
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        break
+        except OSError:
+            pass
+        return records
+
+    def summary(self) -> dict:
+        """未完成运行的概况：开始信息、已完成节点、已写/写了一半的文件数。"""
+        records = self.read()
+        begin = next((r for r in records if r.get("op") == "begin"), {})
+        touched = {r["file"] for r in records if r.get("op") == "write"}
+        return {
+            "begin": begin,
+            "nodes": [r["node"] for r in records if r.get("op") == "node"],
+            "files": len(touched),
+            "torn": sorted(self._torn_writes(records)),
+        }
+
+    @staticmethod
+    def _torn_writes(records: List[dict]) -> Dict[str, Optional[str]]:
+        """有 write 而无对应 written 的文件 → 被打断那次写入之前的内容（sha256 或 None）。"""
+        open_writes: Dict[str, Optional[str]] = {}
+        for record in records:
+            if record.get("op") == "write":
+                open_writes[record["file"]] = record["pre"]
+            elif record.get("op") == "written":
+                open_writes.pop(record["file"], None)
+        return open_writes
+
+    # ===== 记录 =====
+
+    def begin(self, mods_directory: str, selected: Optional[List[str]], force: bool) -> bool:
+        """开始一次运行（已有未完成运行时拒绝，需先继续或回滚）。"""
+        if self.pending():
+            print("存在未完成的配置运行，请先继续或回滚")
+            return False
+        self._file = open(self.journal_path, 'a', encoding='utf-8')
+        self._append({
+            "op": "begin",
+            "time": time.strftime('%Y-%m-%d %H:%M:%S'),
+            "mods_directory": mods_directory,
+            "selected": selected,
+            "force": force,
+        })
+        return True
+
+    def reopen(self):
+        """继续未完成的运行：在原日志后追加记录。"""
+        self._file = open(self.journal_path, 'a', encoding='utf-8')
+
+    def before_write(self, path: str):
+        """文件改写前：写前内容落盘到备份仓库，再记录 write。"""
+        if self._file is None:
+            return
+        pre = None
+        if os.path.isfile(path):
+            with open(path, 'rb') as f:
+                pre = self.backup_store.put_bytes(f.read(), durable=True)
+        self._append({"op": "write", "file": os.path.abspath(path), "pre": pre})
+
+    def after_write(self, path: str):
+        """文件完整写入后记录 written。"""
+        if self._file is None:
+            return
+        self._append({"op": "written", "file": os.path.abspath(path)})
+
+    def node_done(self, node: str, inputs: Dict[str, object]):
+        """构建节点完成，记录其输入指纹。"""
+        if self._file is None:
+            return
+        self._append({"op": "node", "node": node, "inputs": inputs})
+
+    def finish(self):
+        """运行正常结束（或回滚完成）：关闭并删除日志，再删除本次运行的写前内容块。
+
+        写前内容只为继续/回滚服务，日志删除后不再需要；manifest 引用的块（即某文件的
+        备份代，内容恰好相同）保留。
+        """
+        self.close()
+        pre_images = [r["pre"] for r in self.read() if r.get("op") == "write" and r.get("pre")]
+        try:
+            os.remove(self.journal_path)
+        except OSError:
+            return
+        self.backup_store.discard_blobs(pre_images)
+
+    def close(self):
+        """关闭日志但保留文件（运行被取消/中断，留待继续或回滚）。"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _append(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    # ===== 恢复 =====
+
+    def _restore(self, path: str, pre: Optional[str]) -> bool:
+        """把文件恢复为写前内容；pre 为 None 表示文件原本不存在，删除之。"""
+        try:
+            if pre is None:
+                if os.path.exists(path):
+                    os.remove(path)
+                return True
+            data = self.backup_store.get_bytes(pre)
+            tmp_path = path + ".iooh_tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            return True
+        except (OSError, BackupIntegrityError) as e:
+            print(f"恢复 {path} 失败: {e}")
+            return False
+
+    def repair_torn(self) -> int:
+        """还原写了一半的文件（有 write 无 written），返回还原数。继续运行前调用。"""
+        restored = 0
+        for path, pre in self._torn_writes(self.read()).items():
+            if self._restore(path, pre):
+                restored += 1
+        return restored
+
+    def rollback(self) -> dict:
+        """回滚整次运行：按相反顺序恢复所有改写过的文件，成功后删除日志。"""
+        records = self.read()
+        restored, failed = 0, []
+        for record in reversed(records):
+            if record.get("op") != "write":
+                continue
+            if self._restore(record["file"], record["pre"]):
+                restored += 1
+            else:
+                failed.append(record["file"])
+        if not failed:
+            self.finish()
+        return {"restored": restored, "failed": failed}
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""跨 mod 按键冲突索引：找出同一次按键会同时触发的绑定。
+
+IOOH 的用途就是化解热键冲突，但扫描从不告诉用户哪些绑定撞键，尤其是撞上
+IOOH 自己的四个菜单键（会让菜单失灵）。本模块在扫描时建立倒排索引：
+
+- 键：规范化的按键组合（iooh_keys.normalize_key_combo，与改键捕获同一规范）
+- 值：使用该组合的全部按键绑定
+
+3DMigoto 中未写出的修饰键不作要求（`VK_UP` 在按住 ctrl 时也触发），因此冲突不能
+只比较组合字符串。报告时按主键分桶：每个主键只有 2^3 种实际按法（ctrl/alt/shift
+是否按住），对每种按法收集会被触发的组合——同一主键下不同组合至多 27 种，
+整体耗时与绑定数成正比，数万个绑定也能即时给出结果。
+"""
+
+from typing import Dict, Iterable, List, Tuple
+
+from iooh_keys import ACTIONS, MODIFIER_ORDER, parse_key_combo, normalize_key_combo
+from iooh_models import ModKeyBinding
+
+# 实际按法：ctrl/alt/shift 是否按住的全部组合（少的在前，报告取最简按法）
+_PRESSES = sorted(
+    (frozenset(m for bit, m in enumerate(MODIFIER_ORDER) if mask >> bit & 1) for mask in range(8)),
+    key=len,
+)
+
+
+class KeyConflict:
+    """一次按键（press）会同时触发的绑定与菜单动作。"""
+
+    def __init__(self, press: str, bindings: List[ModKeyBinding], menu_actions: List[str]):
+        self.press = press
+        self.bindings = bindings
+        self.menu_actions = menu_actions
+
+    @property
+    def mod_paths(self) -> List[str]:
+        return sorted({b.mod_path for b in self.bindings})
+
+    def to_dict(self) -> dict:
+        return {
+            "press": self.press,
+            "menu_actions": self.menu_actions,
+            "bindings": [{"mod": b.mod_path, "ini": b.ini_file, "section": b.section_name, "key": b.key}
+                         for b in self.bindings],
+        }
+
+
+class KeyConflictIndex:
+    """规范化按键组合 → 绑定 的倒排索引（扫描时增量建立）。"""
+
+    def __init__(self):
+        self.combos: Dict[str, List[ModKeyBinding]] = {}
+
+    def clear(self):
+        self.combos.clear()
+
+    def add(self, bindings: Iterable[ModKeyBinding]):
+        for binding in bindings:
+            self.combos.setdefault(normalize_key_combo(binding.key), []).append(binding)
+
+    def move(self, binding: ModKeyBinding, old_key: str):
+        """绑定改键后把它从旧组合挪到新组合。"""
+        old_combo = normalize_key_combo(old_key)
+        bucket = self.combos.get(old_combo, [])
+        if binding in bucket:
+            bucket.remove(binding)
+            if not bucket:
+                del self.combos[old_combo]
+        self.add([binding])
+
+    def conflicts(self, menu_keys: Dict[str, str] = None) -> List[KeyConflict]:
+        """列出冲突：同一按法触发多个 mod 的绑定，或与菜单键同时触发。
+
+        menu_keys 为 动作 -> 菜单 key 行。同一 mod 内的重复绑定（常见于同键多段联动）
+        不算冲突。多种按法触发同一组绑定时只报告最简的一种。结果中菜单键冲突排在前面。
+        """
+        # 主键 -> [(必须按住, 必须未按, 绑定列表, 菜单动作列表)]
+        by_token: Dict[str, List[Tuple[frozenset, frozenset, List[ModKeyBinding], List[str]]]] = {}
+        for combo, bindings in self.combos.items():
+            required, forbidden, token = parse_key_combo(combo)
+            by_token.setdefault(token, []).append((required, forbidden, bindings, []))
+        for action in ACTIONS:
+            if menu_keys and action in menu_keys:
+                required, forbidden, token = parse_key_combo(menu_keys[action])
+                by_token.setdefault(token, []).append((required, forbidden, [], [action]))
+
+        results: List[KeyConflict] = []
+        for token, entries in by_token.items():
+            if len(entries) == 1 and not _multi_mod(entries[0][2]):
+                continue
+            reported = set()
+            for held in _PRESSES:
+                triggered = [e for e in entries if e[0] <= held and not (e[1] & held)]
+                bindings = [b for e in triggered for b in e[2]]
+                actions = [a for e in triggered for a in e[3]]
+                if not (_multi_mod(bindings) or (actions and bindings) or len(actions) > 1):
+                    continue
+                signature = frozenset(id(e) for e in triggered)
+                if signature in reported:
+                    continue
+                reported.add(signature)
+                press = " ".join([m for m in MODIFIER_ORDER if m in held] + [token])
+                results.append(KeyConflict(press, bindings, actions))
+        results.sort(key=lambda c: (not c.menu_actions, -len(c.mod_paths), c.press))
+        return results
+
+
+def _multi_mod(bindings: List[ModKeyBinding]) -> bool:
+    """绑定是否来自不止一个 mod。"""
+    if not bindings:
+        return False
+    first = bindings[0].mod_path
+    return any(b.mod_path != first for b in bindings)
@@ -142,6 +142,72 @@ def capture_with_modifiers(keycode: int, state: int):
     return " ".join(mods + [token])
 
 
+# ini key 行中的修饰键写法 → 规范名（左右修饰键视同一个）
+_MODIFIER_ALIASES = {
+    "ctrl": "ctrl", "lctrl": "ctrl", "rctrl": "ctrl", "control": "ctrl",
+    "alt": "alt", "lalt": "alt", "ralt": "alt", "menu": "alt",
+    "shift": "shift", "lshift": "shift", "rshift": "shift",
+}
+MODIFIER_ORDER = ("ctrl", "alt", "shift")
+
+
+def _normalize_token(token: str) -> str:
+    """主键名规范化：与 capture_with_modifiers 产出的 token 同形（VK_ 名大写、字母数字为裸字符小写）。"""
+    lower = token.lower()
+    if lower.startswith("0x"):
+        try:
+            return VK_TO_TOKEN.get(int(lower, 16), lower)
+        except ValueError:
+            return lower
+    if lower.startswith("vk_"):
+        rest = lower[3:]
+        if len(rest) == 1 and rest.isalnum():
+            return rest
+        return lower.upper()
+    return lower
+
+
+def menu_token(value: str):
+    """把用户输入的菜单键名规范为可捕获的单个 token（如 "vk_f9" → "VK_F9"、"VK_A" → "a"）。
+
+    菜单键的 key 行固定带 no_ctrl no_alt 前缀，只接受捕获表中的单个主键；
+    含修饰键、多个键或无法识别时返回 None。
+    """
+    parts = value.split()
+    if len(parts) != 1 or parts[0].lower() in _MODIFIER_ALIASES:
+        return None
+    token = _normalize_token(parts[0])
+    return token if token in _TOKEN_TO_ZH else None
+
+
+def parse_key_combo(value: str) -> Tuple[frozenset, frozenset, str]:
+    """解析 ini key 行：返回 (必须按住的修饰键, 必须未按的修饰键, 规范化主键名)。
+
+    3DMigoto 中未写出的修饰键不作要求：`VK_UP` 在按住 ctrl 时同样触发，
+    只有 `no_ctrl` 之类的写法才排除。
+    """
+    required, forbidden, token = set(), set(), ""
+    for part in value.split():
+        lower = part.lower()
+        if lower in _MODIFIER_ALIASES:
+            required.add(_MODIFIER_ALIASES[lower])
+        elif lower.startswith("no_") and lower[3:] in _MODIFIER_ALIASES:
+            forbidden.add(_MODIFIER_ALIASES[lower[3:]])
+        elif lower == "no_modifiers":
+            forbidden.update(MODIFIER_ORDER)
+        else:
+            token = _normalize_token(part)
+    return frozenset(required), frozenset(forbidden), token
+
+
+def normalize_key_combo(value: str) -> str:
+    """key 行的规范形式：修饰键按 ctrl/alt/shift 顺序（与 capture_with_modifiers 一致），
+    随后是 no_ 限制与主键，如 "alt vk_left" → "alt VK_LEFT"、"no_alt ctrl VK_F1" → "ctrl no_alt VK_F1"。"""
+    required, forbidden, token = parse_key_combo(value)
+    parts = [m for m in MODIFIER_ORDER if m in required]
+    parts += [f"no_{m}" for m in MODIFIER_ORDER if m in forbidden]
+    return " ".join(parts + [token])
+
 
 class IOOHKeyConfig:
     """IOOH 菜单四个控制键的单一数据源（含持久化、ini key 行、提示文案）。"""
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""主 UI ini（IOOHmod.ini）的文本生成。
+
+原先在 generate_main_mod_ini 中对一个不断变长的字符串反复 `content +=`，并在多个逐角色
+循环里逐行格式化 f-string。本模块改为分段生成：
+
+- 固定文本是模块级模板，每个文件只 format 一次
+- 逐角色片段在列表推导中由 f-string 生成，id 只转一次字符串；if/elif 链统一生成
+  elif 分支，再把首个改为 if，循环内没有分支判断
+- 各段片段追加到列表，最后一次 "".join 得到全文，没有中间字符串
+- 生成只依赖传入的参数（不读盘、不取当前时间），可单独计时（bench main_ini）
+
+输出与原先的逐段拼接逐字节一致。选择器自增/自减命令行（selector_step_lines）同样
+在此生成，主 ini 与各 mod 选择器块共用。
+"""
+
+from bisect import bisect_left, bisect_right
+from typing import Dict, List
+
+# ===== 固定段模板（注意：模板内不得出现字面花括号） =====
+_HEADER = """; EFMI 主UI管理器 - 自动生成
+; 生成时间: {generated_at}
+; 总角色数: {total}
+
+; 角色ID映射:
+"""
+
+_CONSTANTS = """
+
+[Constants]
+global $show_character_ui = 0
+global $total_characters = {total}
+global $iooh_sel = {first_id}
+"""
+
+_DRAG_AND_KEYS = """
+; 拖拽控制变量
+global persist $ui_x = {left_x:.4f}
+global persist $ui_y = {start_y:.4f}
+global $mouse_clicked = 0
+global $is_dragging = 0
+global $drag_start_x = 0
+global $drag_start_y = 0
+
+; 鼠标拖拽检测 (仅当UI显示时)
+[KeyMouseDrag]
+condition = $show_character_ui == 1
+key = VK_LBUTTON
+type = hold
+$mouse_clicked = 1
+
+[CommandList_UpdateDrag]
+if $mouse_clicked
+    if cursor_x > $ui_x && cursor_x < $ui_x + {panel_w:.4f} && cursor_y > $ui_y && cursor_y < $ui_y + {panel_h:.4f}
+        if $is_dragging == 0
+            $drag_start_x = cursor_x - $ui_x
+            $drag_start_y = cursor_y - $ui_y
+            $is_dragging = 1
+        endif
+    endif
+else
+    $is_dragging = 0
+endif
+
+if $is_dragging
+    $ui_x = cursor_x - $drag_start_x
+    $ui_y = cursor_y - $drag_start_y
+endif
+
+; UI复位快捷键
+[KeyEFMI_ResetUIPosition]
+condition = $show_character_ui == 1
+key = ctrl no_alt /
+type = cycle
+$ui_x = {left_x:.4f}
+$ui_y = {start_y:.4f}
+
+; 显示/隐藏菜单
+[KeyEFMI_ToggleMenu]
+key = {key_toggle}
+run = CommandList_ToggleMenu
+
+[CommandList_ToggleMenu]
+if $show_character_ui == 1
+    $show_character_ui = 0
+else
+    $show_character_ui = 1
+endif
+
+; 上一个角色（仅菜单显示时响应，隐藏时保留当前选择）
+[KeyEFMI_PrevChar]
+condition = $show_character_ui == 1
+key = {key_prev}
+run = CommandList_PrevChar
+
+[CommandList_PrevChar]
+"""
+
+_NEXT_CHAR = """
+; 下一个角色（仅菜单显示时响应，隐藏时保留当前选择）
+[KeyEFMI_NextChar]
+condition = $show_character_ui == 1
+key = {key_next}
+run = CommandList_NextChar
+
+[CommandList_NextChar]
+"""
+
+_ENABLE_TOGGLE = """
+; 启用/禁用当前聚焦的角色（翻转该 id 对应的 $iooh_en<id>，仅菜单显示时响应）
+[KeyEFMI_EnableToggle]
+condition = $show_character_ui == 1
+key = {key_enable}
+run = CommandList_EnableToggle
+
+[CommandList_EnableToggle]
+"""
+
+_PRESENT = """
+[Present]
+if $show_character_ui == 1
+    run = CommandList_UpdateDrag
+    run = CustomShaderDrawUI
+endif
+
+[CustomShaderDrawUI]
+vs = shaders\\draw_2d_ui.hlsl
+ps = shaders\\{pixel_shader}
+run = BuiltInCommandListUnbindAllRenderTargets
+blend = ADD SRC_ALPHA INV_SRC_ALPHA
+cull = none
+topology = triangle_strip
+o0 = set_viewport bb
+
+; ===== 面板四边形（三层共用） =====
+x87 = {panel_w:.4f}
+y87 = {panel_h:.4f}
+z87 = $ui_x
+w87 = $ui_y
+
+; ===== 第1层：muban 背景模板（已内置按键提示与箭头） =====
+{slot0} = ResourceMuban
+{layer_draw}
+; ===== 第2层：当前角色头像（白框位置；无头像则为问号） =====
+"""
+
+_LAYER_TEXT = """
+; ===== 第3层：当前角色文字（白框右侧） =====
+"""
+
+_LAYER_STATUS = """
+; ===== 第4层：当前角色启用/禁用状态图案（头像与名称下方空白区） =====
+"""
+
+_LAYER_HINT = """
+; ===== 第5层：按键提示（全局静态，状态图案下方） =====
+{slot4} = ResourceHintKeys
+"""
+
+_COMPOSITE_DRAW = "\n; ===== 五层在合成着色器中一次绘制 =====\n"
+
+_RESOURCES = """
+; ===== 资源定义 =====
+[ResourceMuban]
+filename = resources\\textures\\muban.png
+
+[ResourceHintKeys]
+filename = resources\\textures\\hint_keys.png
+
+[ResourceStatusEnabled]
+filename = resources\\textures\\status_enabled.png
+
+[ResourceStatusDisabled]
+filename = resources\\textures\\status_disabled.png
+
+"""
+
+_EMPTY_SLOT = "else\n    {slot} = null\n"
+
+
+def selector_step_lines(var: str, ids: List[int], step: int) -> List[str]:
+    """选择器变量自增/自减一格并回绕的命令行（O(1)，不随角色数膨胀）。
+
+    ids 有空位（已移除 mod 的保留 id）时，落在空位上的值直接跳到该方向的下一个
+    有效 id；主 ini 与各 mod 选择器块用同一份 ids 生成，跳转完全一致、保持同步。
+    """
+    lo, hi = ids[0], ids[-1]
+    if step > 0:
+        lines = [f"${var} = ${var} + 1", f"if ${var} > {hi}", f"    ${var} = {lo}", "endif"]
+    else:
+        lines = [f"${var} = ${var} - 1", f"if ${var} < {lo}", f"    ${var} = {hi}", "endif"]
+    occupied = set(ids)
+    holes = [i for i in range(lo, hi + 1) if i not in occupied]
+    for n, hole in enumerate(holes):
+        # ids 升序：二分查找该方向上的下一个有效 id（空位较多时不再逐个线性扫描）
+        if step > 0:
+            target = ids[bisect_right(ids, hole)]
+        else:
+            target = ids[bisect_left(ids, hole) - 1]
+        lines.append(f"{'if' if n == 0 else 'elif'} ${var} == {hole}")
+        lines.append(f"    ${var} = {target}")
+    if holes:
+        lines.append("endif")
+    return lines
+
+
+def _close_chain(chain: List[str], slot: str, has_empty_slots: bool) -> List[str]:
+    """逐角色 elif 链：首个分支改为 if，末尾补空槽位解绑与 endif。"""
+    if chain:
+        chain[0] = chain[0][2:]  # "elif ..." -> "if ..."
+        if has_empty_slots:
+            chain.append(_EMPTY_SLOT.format(slot=slot))
+        chain.append("endif\n")
+    return chain
+
+
+def render_main_ini(mods: list, ring: List[int], key_lines: Dict[str, str], panel: Dict[str, float],
+                    composite: bool, generated_at: str) -> str:
+    """生成 IOOHmod.ini 全文。
+
+    mods 为 ModInfo 列表（按名册顺序）；ring 为选择器回绕用的 id 序列（含预留空槽位）；
+    key_lines 为四个菜单动作的 key 行值；panel 为面板几何
+    {"left_x", "start_y", "panel_w", "panel_h"}。
+    """
+    total = len(mods)
+    # 逐角色片段在列表推导中用 f-string 生成（比逐个调用 str.format 快一倍）；
+    # id 只转换一次字符串，各段复用
+    sids = [str(mod.character_id) for mod in mods]
+    sorted_sids = [str(i) for i in sorted(mod.character_id for mod in mods)]
+    has_empty_slots = len(ring) > total
+    # layered 每层重绑 ps-t100 各 Draw 一次；composite 各层绑到 t100~t104 一次 Draw
+    slots = [f"ps-t{100 + layer}" if composite else "ps-t100" for layer in range(5)]
+    layer_draw = "" if composite else "Draw = 4,0\n"
+
+    parts = [_HEADER.format(generated_at=generated_at, total=total)]
+    parts.extend([f"; {sid} = {mod.name}\n" for sid, mod in zip(sids, mods)])
+    parts.append(_CONSTANTS.format(total=total, first_id=ring[0] if ring else 0))
+    # 每个角色一个启用标志（与各 mod ini 的 $iooh_en<id> 平行），
+    # 让菜单侧也能存储并反映每个角色的启用状态
+    parts.extend([f"global $iooh_en{sid} = 0\n" for sid in sids])
+    parts.append(_DRAG_AND_KEYS.format(key_toggle=key_lines["toggle_menu"], key_prev=key_lines["prev_char"],
+                                       **panel))
+    # 上一个 / 下一个角色：自减/自增并回绕（O(1)，不随角色数膨胀）
+    if total > 0:
+        parts.append("\n".join(selector_step_lines("iooh_sel", ring, -1)) + "\n")
+    parts.append(_NEXT_CHAR.format(key_next=key_lines["next_char"]))
+    if total > 0:
+        parts.append("\n".join(selector_step_lines("iooh_sel", ring, 1)) + "\n")
+
+    parts.append(_ENABLE_TOGGLE.format(key_enable=key_lines["enable_toggle"]))
+    parts.extend(_close_chain([
+        f"elif $iooh_sel == {sid}\n    if $iooh_en{sid} == 1\n        $iooh_en{sid} = 0\n"
+        f"    else\n        $iooh_en{sid} = 1\n    endif\n"
+        for sid in sorted_sids], "", False))
+
+    # 五层共用同一面板四边形：muban 背景 → 头像 → 文字 → 启用状态 → 按键提示
+    parts.append(_PRESENT.format(
+        pixel_shader="draw_2d_ui_composite.hlsl" if composite else "draw_2d_ui.hlsl",
+        panel_w=panel["panel_w"], panel_h=panel["panel_h"], slot0=slots[0], layer_draw=layer_draw))
+    slot = slots[1]
+    parts.extend(_close_chain([f"elif $iooh_sel == {sid}\n    {slot} = ResourceAvatar{sid}\n" for sid in sids],
+                              slot, has_empty_slots))
+    parts.append(layer_draw)
+    parts.append(_LAYER_TEXT)
+    slot = slots[2]
+    parts.extend(_close_chain([f"elif $iooh_sel == {sid}\n    {slot} = ResourceText{sid}\n" for sid in sids],
+                              slot, has_empty_slots))
+    parts.append(layer_draw)
+    parts.append(_LAYER_STATUS)
+    slot = slots[3]
+    parts.extend(_close_chain([
+        f"elif $iooh_sel == {sid}\n    if $iooh_en{sid} == 1\n        {slot} = ResourceStatusEnabled\n"
+        f"    else\n        {slot} = ResourceStatusDisabled\n    endif\n"
+        for sid in sids], slot, has_empty_slots))
+    parts.append(layer_draw)
+    parts.append(_LAYER_HINT.format(slot4=slots[4]))
+    if composite:
+        parts.append(_COMPOSITE_DRAW)
+    parts.append("Draw = 4,0\n")
+
+    # 资源定义：公共纹理 + 每个角色的头像层与文字层（一页一个）
+    parts.append(_RESOURCES)
+    parts.extend([
+        f"[ResourceAvatar{sid}]\nfilename = resources\\textures\\character_{sid}_avatar.png\n\n"
+        f"[ResourceText{sid}]\nfilename = resources\\textures\\character_{sid}_text.png\n\n\n"
+        for sid in sids])
+    return "".join(parts)
@@ -1,28 +1,133 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-"""EFMI 数据模型：mod 信息与按键绑定。"""
+"""EFMI 数据模型：mod 信息、按键绑定、注入结果与运行计划。"""
 
+import sys
 from typing import Dict, List
 
 
+class PathTable:
+    """路径驻留表：每个路径字符串只存一份，使用方只保存下标。
+
+    同一 mod 的成百上千个按键绑定共用少数几个 mod 目录与 ini 路径；各自保存完整
+    路径字符串（缓存读出、os.path.join 拼出的都是独立对象）会让内存随绑定数线性膨胀。
+    """
+    __slots__ = ("_paths", "_index")
+
+    def __init__(self):
+        self._paths: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    def index(self, path: str) -> int:
+        """路径的下标（首次出现时登记）。"""
+        idx = self._index.get(path)
+        if idx is None:
+            idx = len(self._paths)
+            path = sys.intern(path)
+            self._paths.append(path)
+            self._index[path] = idx
+        return idx
+
+    def path(self, idx: int) -> str:
+        return self._paths[idx]
+
+
+# 全部绑定共用的 mod 目录 / ini 文件路径表（只增不减：路径数与 ini 数同量级）
+PATHS = PathTable()
+
+
 class ModKeyBinding:
-    """mod按键绑定信息"""
+    """mod按键绑定信息
+
+    mod_path / ini_file 以 PATHS 下标保存，属性访问时还原为路径字符串；
+    section 名、key、变量名与描述在各 mod 间高度重复，统一驻留。
+    """
+    __slots__ = ("section_name", "key", "variable", "_description", "_mod_idx", "_ini_idx")
+
     def __init__(self, section_name: str, key: str, variable: str, mod_path: str, ini_file: str = ""):
-        self.section_name = section_name
-        self.key = key
-        self.variable = variable
-        self.mod_path = mod_path
-        self.ini_file = ini_file  # 该绑定所属的 ini 文件（解析时记录，分组时直接使用）
-        self.description = ""
+        self.section_name = sys.intern(section_name)
+        self.key = sys.intern(key)
+        self.variable = sys.intern(variable)
+        self._mod_idx = PATHS.index(mod_path)
+        self._ini_idx = PATHS.index(ini_file)  # 该绑定所属的 ini 文件（解析时记录，分组时直接使用）
+        self._description = ""
+
+    @classmethod
+    def restore(cls, section_name: str, key: str, variable: str, description: str,
+                mod_idx: int, ini_idx: int) -> "ModKeyBinding":
+        """由已驻留的字段与 PATHS 下标直接构造（快照恢复的快速路径，跳过逐字段驻留与查表）。"""
+        binding = cls.__new__(cls)
+        binding.section_name = section_name
+        binding.key = key
+        binding.variable = variable
+        binding._description = description
+        binding._mod_idx = mod_idx
+        binding._ini_idx = ini_idx
+        return binding
+
+    @property
+    def description(self) -> str:
+        return self._description
+
+    @description.setter
+    def description(self, value: str):
+        self._description = sys.intern(value)
+
+    @property
+    def mod_path(self) -> str:
+        return PATHS.path(self._mod_idx)
+
+    @mod_path.setter
+    def mod_path(self, value: str):
+        self._mod_idx = PATHS.index(value)
+
+    @property
+    def ini_file(self) -> str:
+        return PATHS.path(self._ini_idx)
+
+    @ini_file.setter
+    def ini_file(self, value: str):
+        self._ini_idx = PATHS.index(value)
 
 
 class ModInfo:
     """mod信息"""
+    __slots__ = ("name", "path", "ini_files", "character_id", "key_bindings", "has_backup", "ini_file_backups")
+
     def __init__(self, name: str, path: str, ini_files: List[str] = None):
         self.name = name
-        self.path = path
-        self.ini_files = ini_files or []
+        self.path = PATHS.path(PATHS.index(path))
+        # 与绑定共用同一份路径字符串
+        self.ini_files = [PATHS.path(PATHS.index(f)) for f in ini_files or []]
         self.character_id = 0  # 角色ID（用于选择器变量）
         self.key_bindings: List[ModKeyBinding] = []
         self.has_backup = False
         self.ini_file_backups: Dict[str, bool] = {}
+
+
+class InjectResult:
+    """单个mod的注入结果：写入了哪些文件、以及注入后每个ini的文件状态"""
+    def __init__(self, mod: ModInfo):
+        self.mod = mod
+        self.success = False
+        self.written: List[str] = []    # 内容有变化、已写回的 ini
+        self.unchanged: List[str] = []  # 内容与磁盘一致、未重写的 ini
+        # ini -> {"has_key", "has_marker", "bindings"}（与扫描缓存条目同构，不含指纹）
+        self.file_states: Dict[str, dict] = {}
+
+
+class RunPlan:
+    """一次（可能是选择性的）配置运行要做的事：构建图中过期/选中的节点"""
+    def __init__(self, inject: List[ModInfo]):
+        self.inject = inject                 # 需要注入的 mod
+        self.main_ini = True                 # 是否重新生成 IOOHmod.ini
+        self.texture_ids = None              # 需要生成纹理的角色 id（None 表示全部）
+        self.shared_textures = True          # 是否重新生成状态/按键提示层
+        self.save_config = True              # 是否重写 xxmi_key_config.json
+        self.full_inject_reason = ""         # 选择性运行被扩大为全量注入的原因
+        self.hint_lines: List[str] = []      # 本次运行的按键提示文案
+        self.reasons: Dict[str, List[str]] = {}  # 节点名 -> 重建原因（空列表为最新）
+        self.inputs = None                   # 规划时的构建输入（BuildInputs），记录节点完成时复用
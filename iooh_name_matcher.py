@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""角色名称映射的多关键词匹配（Aho-Corasick 自动机）。
+
+character_name_mapping.json 的规则语义：按规则顺序，第一个「任一关键词（不区分
+大小写）是 mod 名子串」的规则生效。原先逐 mod × 逐规则 × 逐关键词做 `in` 子串
+判断，社区映射文件已有数千条规则，耗时随三者乘积增长。
+
+本模块把全部关键词编译为一个自动机，每个关键词带所属规则的序号；扫描 mod 名
+一遍即得到命中的最小规则序号（先出现的规则优先），结果与逐条判断完全一致：
+- 关键词与 mod 名都用 str.lower() 规整后再匹配（与原 `kw.lower() in name.lower()` 相同）
+- 空关键词是任何字符串的子串，直接记为该规则必中
+编译结果按映射文件内容的 sha256 缓存，文件不变时不重新编译。
+"""
+
+import hashlib
+import json
+from typing import Dict, List, Optional, Tuple
+
+
+class KeywordMatcher:
+    """多关键词子串匹配：返回命中关键词的最小优先级（序号越小越优先）。"""
+
+    def __init__(self, keywords: List[Tuple[str, int]]):
+        # 节点 i：转移表、失败指针、以该节点结尾（含后缀链）的最小优先级
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._best: List[Optional[int]] = [None]
+        self._always: Optional[int] = None   # 空关键词：对任何文本都命中
+        for keyword, priority in keywords:
+            if not keyword:
+                self._always = _min(self._always, priority)
+                continue
+            node = 0
+            for char in keyword:
+                nxt = self._goto[node].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][char] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._best.append(None)
+                node = nxt
+            self._best[node] = _min(self._best[node], priority)
+        self._build_failure_links()
+
+    def _build_failure_links(self):
+        """广度优先建立失败指针，并把后缀链上的最小优先级合并到各节点。"""
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for char, child in self._goto[node].items():
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                self._best[child] = _min(self._best[child], self._best[self._fail[child]])
+                queue.append(child)
+
+    def first_match(self, text: str) -> Optional[int]:
+        """text 中出现的关键词的最小优先级；都不出现时返回 None。"""
+        best = self._always
+        node = 0
+        goto, fail, best_at = self._goto, self._fail, self._best
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            found = best_at[node]
+            if found is not None and (best is None or found < best):
+                best = found
+                if best == 0:
+                    break
+        return best
+
+
+def _min(a: Optional[int], b: Optional[int]) -> Optional[int]:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a, b)
+
+
+class NameRules:
+    """编译后的映射规则：match(mod_name) 返回第一个命中的规则（无则 None）。"""
+
+    def __init__(self, match_rules: List[dict]):
+        self.rules = match_rules
+        self.matcher = KeywordMatcher([
+            (keyword.lower(), index)
+            for index, rule in enumerate(match_rules)
+            for keyword in rule.get('keywords', [])
+        ])
+
+    def match(self, mod_name: str) -> Optional[dict]:
+        index = self.matcher.first_match(mod_name.lower())
+        return self.rules[index] if index is not None else None
+
+
+# 映射文件内容 sha256 -> 编译结果
+_compiled: Dict[str, NameRules] = {}
+
+
+def load_name_rules(mapping_path: str) -> NameRules:
+    """读取映射文件并编译规则；内容未变时复用上次的编译结果。"""
+    with open(mapping_path, 'rb') as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    rules = _compiled.get(digest)
+    if rules is None:
+        mapping_data = json.loads(data.decode('utf-8'))
+        rules = NameRules(mapping_data.get('match_rules', []))
+        _compiled.clear()
+        _compiled[digest] = rules
+    return rules
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""IOOH 注入选项：影响选择器块与主 ini 生成方式的开关。
+
+持久化到 exe/脚本同级的 iooh_options.json（用户可编辑，缺失时用默认值）。
+
+- slot_capacity_mode：选择器回绕方式
+  * "exact"（默认）：在最小/最大有效 id 之间回绕并跳过空位，名册一变所有选择器块都要重写
+  * "pow2"：预留到不小于 id 上限的 2 的幂个槽位，在槽位容量处回绕
+  * "headroom"：预留 id 上限 + slot_headroom 个槽位
+  预留模式下选择器块只依赖容量，名册增减只需改动新 mod 与 IOOHmod.ini，直到容量用尽。
+- selector_emission：注入到 mod ini 的选择器块写法
+  * "classic"（默认）：四个 Key 段各 run 一个 CommandList，门控在 CommandList 内
+  * "compact"：门控挪到 Key 段 condition，显隐/启用翻转改为 cycle，每个文件少两个
+    CommandList，菜单隐藏时按键不再进入任何 CommandList
+- gate_present：把 mod ini 的 [Present] 整段包进 `if $iooh_en<id> == 1`，角色在菜单中
+  未启用时其每帧逻辑（及其 run 的 CommandList）不再执行。默认关闭：部分 mod 依赖
+  [Present] 每帧复位状态变量，门控后可能残留显示
+  * gate_present_include：只门控名称匹配这些通配符的 mod（白名单，空表示全部）
+  * gate_present_exclude：名称匹配这些通配符的 mod 不门控（黑名单，优先于白名单）
+- ui_draw_mode：IOOHmod.ini 绘制菜单面板的方式
+  * "layered"（默认）：五层（muban、头像、文字、状态、按键提示）逐层重绑 ps-t100 各 Draw 一次
+  * "composite"：五层分别绑到 t100~t104，由 draw_2d_ui_composite.hlsl 在一次 Draw 中
+    逐层 alpha 叠加，面板像素只着色一遍（每帧 5 次绘制 → 1 次）
+"""
+
+import fnmatch
+import json
+import os
+from typing import Dict
+
+# 配置文件名（位于 exe/脚本同级，不随包分发）
+OPTIONS_FILENAME = "iooh_options.json"
+
+SLOT_CAPACITY_MODES = ("exact", "pow2", "headroom")
+SELECTOR_EMISSIONS = ("classic", "compact")
+UI_DRAW_MODES = ("layered", "composite")
+# 只影响 IOOHmod.ini、不影响 mod 选择器块的选项（构建图中不使 mod 节点过期）
+MAIN_INI_OPTIONS = ("ui_draw_mode",)
+
+DEFAULT_OPTIONS: Dict[str, object] = {
+    "slot_capacity_mode": "exact",
+    "slot_headroom": 8,
+    "selector_emission": "classic",
+    "gate_present": False,
+    "gate_present_include": [],
+    "gate_present_exclude": [],
+    "ui_draw_mode": "layered",
+}
+
+
+class InjectionOptions:
+    """注入选项（含持久化）。"""
+
+    def __init__(self, output_dir: str):
+        self.config_path = os.path.join(output_dir, OPTIONS_FILENAME)
+        self.values: Dict[str, object] = dict(DEFAULT_OPTIONS)
+        self.load()
+
+    def load(self):
+        """从磁盘读取选项；缺失或损坏则用默认值，类型不符的字段忽略。"""
+        if not os.path.exists(self.config_path):
+            return
+        try:
+            with open(self.config_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"读取注入选项失败，使用默认值: {e}")
+            return
+        for name, default in DEFAULT_OPTIONS.items():
+            value = data.get(name)
+            if value is not None and type(value) is type(default):
+                self.values[name] = value
+        if self.values["slot_capacity_mode"] not in SLOT_CAPACITY_MODES:
+            self.values["slot_capacity_mode"] = DEFAULT_OPTIONS["slot_capacity_mode"]
+        if self.values["selector_emission"] not in SELECTOR_EMISSIONS:
+            self.values["selector_emission"] = DEFAULT_OPTIONS["selector_emission"]
+        if self.values["ui_draw_mode"] not in UI_DRAW_MODES:
+            self.values["ui_draw_mode"] = DEFAULT_OPTIONS["ui_draw_mode"]
+
+    def save(self) -> bool:
+        """保存当前选项到磁盘。"""
+        try:
+            with open(self.config_path, 'w', encoding='utf-8') as f:
+                json.dump(self.values, f, ensure_ascii=False, indent=2)
+            return True
+        except Exception as e:
+            print(f"保存注入选项失败: {e}")
+            return False
+
+    @property
+    def slot_capacity_mode(self) -> str:
+        return self.values["slot_capacity_mode"]
+
+    @property
+    def slot_headroom(self) -> int:
+        return max(1, self.values["slot_headroom"])
+
+    @property
+    def selector_emission(self) -> str:
+        return self.values["selector_emission"]
+
+    @property
+    def ui_draw_mode(self) -> str:
+        return self.values["ui_draw_mode"]
+
+    def gates_present(self, mod_name: str) -> bool:
+        """该 mod 的 [Present] 是否门控在启用标志之后（名称通配符不区分大小写）。"""
+        if not self.values["gate_present"]:
+            return False
+        name = mod_name.lower()
+        include = [p.lower() for p in self.values["gate_present_include"]]
+        exclude = [p.lower() for p in self.values["gate_present_exclude"]]
+        if include and not any(fnmatch.fnmatchcase(name, p) for p in include):
+            return False
+        return not any(fnmatch.fnmatchcase(name, p) for p in exclude)
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""配置流水线：按阶段依赖图并发执行注入 / 主 ini / 配置保存 / 纹理生成。
+
+原先各阶段严格串行：注入全部 mod → 生成主 ini → 保存配置 → 渲染全部纹理。
+而角色纹理只取决于角色名与头像，与注入互不相干。本模块把流程拆成阶段依赖图：
+
+- 每个阶段在其依赖全部完成后立即在独立线程启动，互不依赖的阶段重叠执行，
+  总耗时趋近最长的那条依赖链
+- 逐项阶段（注入每个 mod、渲染每个角色）为生产者/消费者结构：生产者把条目放进
+  有界队列（queue.Queue(maxsize)），消费者线程逐个处理，内存占用不随 mod 数增长
+- 阶段失败时其下游阶段跳过，其余阶段照常完成
+- 所有进度以事件形式汇总到一个队列，由调用方线程（GUI 主线程）逐个回调处理，
+  界面控件只在调用方线程被访问
+
+默认每个逐项阶段一个消费者：注入写备份仓库清单、纹理共享 FreeType 字体对象，
+二者都不是线程安全的；并发来自阶段之间的重叠。
+"""
+
+import queue
+import threading
+import time
+import traceback
+from typing import Callable, Dict, Iterable, List, Optional
+
+# 事件类型：(类型, 阶段名, 负载)
+EVENT_STAGE_START = "start"
+EVENT_ITEM = "item"            # 逐项阶段完成一项，负载为该项处理结果
+EVENT_STAGE_DONE = "done"      # 负载为单次阶段的返回值（逐项阶段为结果列表）
+EVENT_STAGE_FAILED = "failed"  # 负载为异常描述
+EVENT_STAGE_SKIPPED = "skipped"  # 依赖失败而跳过，负载为失败的依赖名
+
+# 逐项阶段的有界队列容量
+DEFAULT_QUEUE_SIZE = 8
+
+_SENTINEL = object()
+
+
+class Stage:
+    """流水线阶段：单次任务（run）或逐项任务（items + worker）。"""
+
+    def __init__(self, name: str, deps: List[str] = None, run: Callable[[], object] = None,
+                 items: Callable[[], Iterable] = None, worker: Callable[[object], object] = None,
+                 workers: int = 1, queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.name = name
+        self.deps = list(deps or [])
+        self.run = run
+        self.items = items
+        self.worker = worker
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.result = None
+        self.error: Optional[str] = None
+        self.elapsed = 0.0
+
+
+class PipelineExecutor:
+    """按依赖图并发执行阶段，事件回到调用方线程处理。"""
+
+    def __init__(self):
+        self.stages: Dict[str, Stage] = {}
+        self._events: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._finished: Dict[str, bool] = {}   # 阶段名 -> 是否成功
+        self._started: set = set()
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        """请求取消：逐项阶段不再取新条目，尚未启动的阶段跳过；进行中的单项照常完成。"""
+        self._cancel.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def add(self, stage: Stage) -> Stage:
+        """登记阶段；依赖必须先于本阶段登记（保证无环）。"""
+        for dep in stage.deps:
+            if dep not in self.stages:
+                raise ValueError(f"阶段 {stage.name} 依赖未登记的阶段 {dep}")
+        self.stages[stage.name] = stage
+        return stage
+
+    def run(self, on_event: Callable[[tuple], None] = None, poll: Callable[[], None] = None,
+            poll_interval: float = 0.05) -> Dict[str, Stage]:
+        """执行全部阶段直到结束；on_event 与 poll 都在调用方线程执行。
+
+        poll 在等待事件的间隙定期调用（GUI 用来保持界面响应）。返回阶段表（含结果/错误/耗时）。
+        """
+        self._launch_ready()
+        while len(self._finished) < len(self.stages):
+            try:
+                event = self._events.get(timeout=poll_interval)
+            except queue.Empty:
+                if poll is not None:
+                    poll()
+                continue
+            if on_event is not None:
+                on_event(event)
+        # 收尾：处理剩余事件
+        while not self._events.empty():
+            event = self._events.get_nowait()
+            if on_event is not None:
+                on_event(event)
+        return self.stages
+
+    def _launch_ready(self):
+        """启动依赖已全部完成的阶段；依赖失败的阶段直接标记跳过。"""
+        with self._lock:
+            progressed = True
+            while progressed:
+                progressed = False
+                for stage in self.stages.values():
+                    if stage.name in self._started:
+                        continue
+                    if not all(dep in self._finished for dep in stage.deps):
+                        continue
+                    self._started.add(stage.name)
+                    failed = [dep for dep in stage.deps if not self._finished[dep]]
+                    if self._cancel.is_set():
+                        failed = failed or ["已取消"]
+                    if failed:
+                        stage.error = f"依赖阶段失败: {', '.join(failed)}"
+                        # 先投递事件再标记完成：调用方看到全部完成时事件已全部入队
+                        self._events.put((EVENT_STAGE_SKIPPED, stage.name, failed))
+                        self._finished[stage.name] = False
+                        progressed = True
+                        continue
+                    threading.Thread(target=self._run_stage, args=(stage,),
+                                     name=f"iooh-{stage.name}", daemon=True).start()
+
+    def _run_stage(self, stage: Stage):
+        self._events.put((EVENT_STAGE_START, stage.name, None))
+        started = time.perf_counter()
+        try:
+            if stage.run is not None:
+                stage.result = stage.run()
+            else:
+                stage.result = self._run_items(stage)
+            ok = True
+        except Exception as e:
+            stage.error = f"{e}"
+            traceback.print_exc()
+            ok = False
+        stage.elapsed = time.perf_counter() - started
+        if ok:
+            self._events.put((EVENT_STAGE_DONE, stage.name, stage.result))
+        else:
+            self._events.put((EVENT_STAGE_FAILED, stage.name, stage.error))
+        with self._lock:
+            self._finished[stage.name] = ok
+        self._launch_ready()
+
+    def _run_items(self, stage: Stage) -> list:
+        """生产者（当前线程）→ 有界队列 → 消费者线程；按完成顺序收集结果。"""
+        work: "queue.Queue" = queue.Queue(maxsize=stage.queue_size)
+        results: list = []
+        errors: List[str] = []
+
+        def consume():
+            while True:
+                item = work.get()
+                if item is _SENTINEL:
+                    return
+                try:
+                    result = stage.worker(item)
+                except Exception as e:
+                    traceback.print_exc()
+                    errors.append(f"{e}")
+                    continue
+                with self._lock:
+                    results.append(result)
+                self._events.put((EVENT_ITEM, stage.name, result))
+
+        consumers = [threading.Thread(target=consume, name=f"iooh-{stage.name}-{i}", daemon=True)
+                     for i in range(stage.workers)]
+        for consumer in consumers:
+            consumer.start()
+        try:
+            for item in stage.items():
+                if self._cancel.is_set():
+                    errors.append("已取消")
+                    break
+                work.put(item)   # 队列满时阻塞，生产者不会跑在消费者前面太远
+        finally:
+            for _ in consumers:
+                work.put(_SENTINEL)
+            for consumer in consumers:
+                consumer.join()
+        if errors:
+            raise RuntimeError(f"{len(errors)} 项失败: {errors[0]}")
+        return results
+
+
+def build_config_pipeline(configurator, plan, hint_lines: List[str]) -> PipelineExecutor:
+    """按运行计划构建配置流水线（只含计划中过期的节点；空阶段瞬间完成）。
+
+    依赖图：
+        textures_setup ─┬─> main_ini（面板比例取自输出目录的 muban）
+                        └─> textures（逐角色渲染，与注入重叠）─> textures_shared
+        inject（逐 mod 注入）
+        save_config
+    main_ini / save_config 只读内存名册，与注入并行；对账扫描缓存需在调用方线程
+    （inject 阶段结束后）进行。
+    """
+    from generate_ui_textures import UITextureGenerator
+
+    generator = UITextureGenerator(base_output_dir=configurator._resolve_output_dir())
+    generator.journal = configurator.journal
+    roster = [{"name": mod.name, "character_id": mod.character_id} for mod in configurator.mods]
+    executor = PipelineExecutor()
+
+    executor.add(Stage("inject", items=lambda: list(plan.inject), worker=configurator.inject_mod))
+    executor.add(Stage("textures_setup", run=generator.setup_directories))
+    if plan.main_ini:
+        executor.add(Stage("main_ini", deps=["textures_setup"],
+                           run=lambda: _check(configurator.generate_main_mod_ini(), "生成主配置失败")))
+    if plan.save_config:
+        executor.add(Stage("save_config", run=lambda: _check(configurator.save_config(), "保存配置失败")))
+
+    def texture_items():
+        characters = generator.match_characters(roster)
+        size = generator._muban_size()
+        for idx, char in enumerate(characters):
+            if plan.texture_ids is None or char.get("id", idx) in plan.texture_ids:
+                yield idx, char, size
+
+    def render(item) -> dict:
+        idx, char, size = item
+        generator.create_character_layer(char, idx, size)
+        return char
+
+    def shared_layers():
+        generator.create_shared_layers(hint_lines, generator._muban_size(), shared=plan.shared_textures)
+
+    executor.add(Stage("textures", deps=["textures_setup"], items=texture_items, worker=render))
+    # 共用层与角色层共享字体对象，排在角色层之后串行渲染
+    executor.add(Stage("textures_shared", deps=["textures"], run=shared_layers))
+    return executor
+
+
+def _check(ok: bool, message: str) -> bool:
+    """把 bool 返回的旧接口转成异常，阶段失败时下游随之跳过。"""
+    if not ok:
+        raise RuntimeError(message)
+    return ok
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""ini 预筛与扫描缓存。
+
+mod 里大多数 ini（资源定义、着色器覆盖）根本没有 `key =` 行，却要完整 UTF-8 解码、
+剥离注入、逐 section 正则解析。本模块先在字节层面预筛：
+
+- prefilter_ini：mmap 映射文件，查找不区分大小写的 `key` 赋值与 IOOH 注入标记，
+  不解码、不跑正则；两者皆无的文件无需解析，注入时也无需读写
+- ScanCache：按 (大小, mtime_ns) 指纹缓存每个 ini 的预筛结论与解析出的按键绑定，
+  持久化到 exe/脚本同级的 iooh_scan_cache.json；指纹不变的文件再次扫描时直接复用
+"""
+
+import json
+import mmap
+import os
+import sys
+from typing import Dict, List, Optional, Tuple
+
+# 缓存文件名（位于 exe/脚本同级，可随时删除，下次扫描自动重建）
+SCAN_CACHE_FILENAME = "iooh_scan_cache.json"
+SCAN_CACHE_VERSION = 1
+
+# `key` 的全部大小写组合（mmap.find 只支持字节精确匹配）
+_KEY_VARIANTS = [
+    bytes([k, e, y])
+    for k in (ord('k'), ord('K'))
+    for e in (ord('e'), ord('E'))
+    for y in (ord('y'), ord('Y'))
+]
+# IOOH 注入痕迹（含历史版本，与 _strip_local_selector 的清理对象一一对应）：出现任一即需剥离
+_MARKERS = [
+    b"iooh", b"IOOH", b"selected_character", b"_sel",
+    b"SelectUp", b"SelectDown", b"ToggleUI", b"ToggleVisible",
+    "角色选择器".encode("utf-8"), "测试用".encode("utf-8"),
+]
+
+# 缓存条目中按键绑定的字符串字段
+_BINDING_FIELDS = ("section", "key", "variable", "description")
+
+_WORD_BYTES = frozenset(b"abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_$")
+_BLANK_BYTES = frozenset(b" \t")
+
+
+def _has_key_assignment(buf) -> bool:
+    """buf 中是否存在 `key[ \\t]*=` 且 key 前不是标识符字符（宽松判定，宁多勿漏）。"""
+    size = len(buf)
+    for variant in _KEY_VARIANTS:
+        pos = buf.find(variant)
+        while pos != -1:
+            if pos == 0 or buf[pos - 1] not in _WORD_BYTES:
+                idx = pos + 3
+                while idx < size and buf[idx] in _BLANK_BYTES:
+                    idx += 1
+                if idx < size and buf[idx] == ord('='):
+                    # 排除比较运算 `key == ...`（条件表达式，而非赋值）
+                    if idx + 1 >= size or buf[idx + 1] != ord('='):
+                        return True
+            pos = buf.find(variant, pos + 1)
+    return False
+
+
+def prefilter_bytes(data: bytes) -> Tuple[bool, bool]:
+    """对内存中的内容做同样的预筛：返回 (含 key 赋值, 含 IOOH 注入标记)。"""
+    return _has_key_assignment(data), any(data.find(marker) != -1 for marker in _MARKERS)
+
+
+def prefilter_ini(path: str) -> Tuple[bool, bool]:
+    """字节级预筛：返回 (含 key 赋值, 含 IOOH 注入标记)。读取失败时保守返回 (True, True)。"""
+    try:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return False, False
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                has_key = _has_key_assignment(mm)
+                has_marker = any(mm.find(marker) != -1 for marker in _MARKERS)
+                return has_key, has_marker
+    except (OSError, ValueError):
+        return True, True
+
+
+def file_fingerprint(path: str) -> Optional[Tuple[int, int]]:
+    """返回文件指纹 (大小, mtime_ns)；文件不存在时返回 None。"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def _cache_key(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path))
+
+
+class ScanCache:
+    """按文件指纹缓存 ini 预筛结论与按键绑定。"""
+
+    def __init__(self, output_dir: str):
+        self.cache_path = os.path.join(output_dir, SCAN_CACHE_FILENAME)
+        # 路径键 -> {"size", "mtime_ns", "has_key", "has_marker", "bindings": [...]}
+        self.files: Dict[str, dict] = {}
+        self.load()
+
+    def load(self):
+        """读取缓存；版本不符或损坏时丢弃（只影响速度，不影响结果）。"""
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"读取扫描缓存失败，将重新解析: {e}")
+            return
+        if data.get("version") != SCAN_CACHE_VERSION:
+            return
+        self.files = data.get("files", {})
+        # 绑定字段在各 ini 间大量重复（同名 section / key / 变量），驻留后只存一份
+        for entry in self.files.values():
+            for cached in entry.get("bindings") or ():
+                for field in _BINDING_FIELDS:
+                    if field in cached:
+                        cached[field] = sys.intern(cached[field])
+
+    def save(self) -> bool:
+        """写回缓存（紧凑格式，先写临时文件再替换）。"""
+        tmp_path = self.cache_path + ".tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"version": SCAN_CACHE_VERSION, "files": self.files},
+                          f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, self.cache_path)
+            return True
+        except Exception as e:
+            print(f"保存扫描缓存失败: {e}")
+            return False
+
+    def lookup(self, path: str) -> Optional[dict]:
+        """返回指纹仍然有效的缓存条目；文件已变化或未缓存时返回 None。"""
+        entry = self.files.get(_cache_key(path))
+        if entry is None:
+            return None
+        fingerprint = file_fingerprint(path)
+        if fingerprint is None or (entry["size"], entry["mtime_ns"]) != fingerprint:
+            return None
+        return entry
+
+    def fingerprint(self, path: str) -> Optional[Tuple[int, int]]:
+        """缓存中记录的文件指纹（不访问磁盘）；未缓存时返回 None。"""
+        entry = self.files.get(_cache_key(path))
+        if entry is None:
+            return None
+        return entry["size"], entry["mtime_ns"]
+
+    def classify(self, path: str) -> dict:
+        """返回文件的缓存条目，失效时重新预筛（bindings 置 None，待调用方解析后填入）。"""
+        entry = self.lookup(path)
+        if entry is not None:
+            return entry
+        has_key, has_marker = prefilter_ini(path)
+        fingerprint = file_fingerprint(path) or (0, 0)
+        entry = {
+            "size": fingerprint[0],
+            "mtime_ns": fingerprint[1],
+            "has_key": has_key,
+            "has_marker": has_marker,
+            "bindings": [] if not has_key else None,
+        }
+        self.files[_cache_key(path)] = entry
+        return entry
+
+    def store(self, path: str, has_key: bool, has_marker: bool, bindings: List[dict]):
+        """按文件当前指纹写入一条缓存（解析完成或本工具刚写过该文件时调用）。"""
+        fingerprint = file_fingerprint(path)
+        if fingerprint is None:
+            self.files.pop(_cache_key(path), None)
+            return
+        self.files[_cache_key(path)] = {
+            "size": fingerprint[0],
+            "mtime_ns": fingerprint[1],
+            "has_key": has_key,
+            "has_marker": has_marker,
+            "bindings": bindings,
+        }
+
+    def refresh(self, path: str, was_valid: bool):
+        """文件被本工具改写后更新其条目。
+
+        was_valid 为改写前条目是否仍有效（调用方在写入前 lookup 所得）：有效时按键绑定
+        结论不变，只换成新指纹；否则文件在扫描后被外部改动过，旧结论不可信，按当前内容
+        重新预筛，绑定置 None 待下次扫描解析——不能把新指纹盖到过期的结论上。
+        """
+        entry = self.files.get(_cache_key(path))
+        if entry is None:
+            return
+        if not was_valid:
+            has_key, has_marker = prefilter_ini(path)
+            self.store(path, has_key, has_marker, None)
+            return
+        fingerprint = file_fingerprint(path)
+        if fingerprint is None:
+            self.files.pop(_cache_key(path), None)
+            return
+        entry["size"], entry["mtime_ns"] = fingerprint
+
+    def retain(self, paths: List[str]):
+        """只保留给定文件的条目（扫描结束后丢弃已删除/已排除文件）。"""
+        keep = {_cache_key(p) for p in paths}
+        self.files = {k: v for k, v in self.files.items() if k in keep}
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""mod 扫描规则：哪些 mod 文件夹参与扫描、遍历时哪些子目录可以剪枝。
+
+原先跳过列表（ui / 大世界 / 功能 / rabbitfx / disabled）硬编码在 scan_mods 中，
+且 os.walk 会钻进每个贴图/缓冲区目录，而这些目录从不含 ini。
+
+本模块把规则集中到 ScanRules 一处：
+- 持久化到 exe/脚本同级的 iooh_scan_rules.json（缺失时用默认规则，用户可编辑）
+- 排除/包含规则编译为单个正则，一次匹配得出结论
+- 基于 os.scandir 遍历（目录项自带类型信息，省去逐个 stat），并按规则剪枝：
+  * 名称命中 exclude_dirs / asset_dirs 的子目录不进入
+  * 启发式：某目录下的文件全是二进制资源（.dds/.buf/.ib/.vb），且没有任何其它文件，
+    视为资源目录，其子目录同样不再进入（mod 根目录不适用，避免只放预览图的根被误剪）
+"""
+
+import fnmatch
+import json
+import os
+import re
+from typing import Dict, List
+
+# 配置文件名（位于 exe/脚本同级，用户可编辑，不随包分发）
+SCAN_RULES_FILENAME = "iooh_scan_rules.json"
+
+DEFAULT_RULES: Dict[str, object] = {
+    # 顶层 mod 文件夹名含这些关键词（不区分大小写）则跳过
+    "exclude_mod_keywords": ["ui", "大世界", "功能", "rabbitfx", "disabled"],
+    # 顶层 mod 文件夹名以这些前缀开头（区分大小写）则跳过
+    "exclude_mod_prefixes": [".", "EFMI"],
+    # 顶层 mod 文件夹名匹配这些通配符（不区分大小写）则强制扫描，优先于排除规则
+    "include_mods": [],
+    # 任意层级子目录名匹配这些通配符（不区分大小写）则不进入
+    "exclude_dirs": ["*disabled*"],
+    # 已知只放资源的子目录名（通配符，不区分大小写），直接剪枝
+    "asset_dirs": [],
+    # 二进制资源扩展名（剪枝启发式用）
+    "asset_extensions": [".dds", ".buf", ".ib", ".vb"],
+    # 启用「目录只含二进制资源 → 剪掉其子目录」启发式
+    "prune_binary_only_dirs": True,
+}
+
+
+def _is_junction(entry: os.DirEntry) -> bool:
+    """Windows 目录联接（Python 3.12 起 DirEntry 才有 is_junction）。"""
+    is_junction = getattr(entry, "is_junction", None)
+    return bool(is_junction and is_junction())
+
+
+def _glob_union(patterns: List[str]) -> str:
+    """把多个通配符合并为一个正则分支；无模式时返回永不匹配的表达式。"""
+    parts = [fnmatch.translate(p) for p in patterns if p]
+    return "|".join(f"(?:{p})" for p in parts) if parts else r"(?!)"
+
+
+class ScanStats:
+    """单次扫描的遍历统计（流式扫描时为随进度更新的累计值）。"""
+
+    def __init__(self):
+        self.dirs_visited = 0
+        self.dirs_pruned = 0
+        self.mods_skipped = 0
+        self.ini_files = 0
+        self.folders_total = 0   # 顶层 mod 文件夹总数
+        self.folders_done = 0    # 已处理的顶层 mod 文件夹数（含跳过的）
+        self.mods_found = 0      # 已发现的含按键绑定 mod 数
+        self.bindings = 0        # 已解析的按键绑定数
+        self.complete = False    # 是否已扫描完整个目录（提前停止时为 False）
+
+
+class ScanRules:
+    """mod 扫描的包含/排除与剪枝规则（含持久化与编译后的匹配器）。"""
+
+    def __init__(self, output_dir: str):
+        self.config_path = os.path.join(output_dir, SCAN_RULES_FILENAME)
+        self.rules: Dict[str, object] = {k: (list(v) if isinstance(v, list) else v)
+                                         for k, v in DEFAULT_RULES.items()}
+        self.load()
+        self.compile()
+
+    def load(self):
+        """从磁盘读取自定义规则；缺失或损坏则用默认值，未知字段忽略。"""
+        if not os.path.exists(self.config_path):
+            return
+        try:
+            with open(self.config_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"读取扫描规则失败，使用默认值: {e}")
+            return
+        for name, default in DEFAULT_RULES.items():
+            value = data.get(name)
+            if value is None or type(value) is not type(default):
+                continue
+            self.rules[name] = value
+
+    def save(self) -> bool:
+        """保存当前规则到磁盘。"""
+        try:
+            with open(self.config_path, 'w', encoding='utf-8') as f:
+                json.dump(self.rules, f, ensure_ascii=False, indent=2)
+            return True
+        except Exception as e:
+            print(f"保存扫描规则失败: {e}")
+            return False
+
+    def compile(self):
+        """把规则编译为匹配器：顶层排除、顶层强制包含、子目录剪枝各一个正则。"""
+        prefixes = "|".join(re.escape(p) for p in self.rules["exclude_mod_prefixes"] if p)
+        keywords = "|".join(re.escape(k) for k in self.rules["exclude_mod_keywords"] if k)
+        branches = []
+        if prefixes:
+            branches.append(f"^(?:{prefixes})")
+        if keywords:
+            branches.append(f"(?i:{keywords})")
+        self._mod_exclude = re.compile("|".join(branches) if branches else r"(?!)")
+        self._mod_include = re.compile(_glob_union(self.rules["include_mods"]), re.IGNORECASE)
+        self._dir_prune = re.compile(
+            _glob_union(self.rules["exclude_dirs"] + self.rules["asset_dirs"]), re.IGNORECASE,
+        )
+        self._asset_exts = tuple(e.lower() for e in self.rules["asset_extensions"])
+        self._prune_binary_only = bool(self.rules["prune_binary_only_dirs"])
+
+    def skip_mod_folder(self, name: str) -> bool:
+        """顶层 mod 文件夹是否跳过（强制包含优先）。"""
+        if self._mod_include.match(name):
+            return False
+        return self._mod_exclude.search(name) is not None
+
+    def prune_dir(self, name: str) -> bool:
+        """子目录是否按名称剪枝。"""
+        return self._dir_prune.match(name) is not None
+
+    def find_ini_files(self, mod_dir: str, stats: ScanStats = None) -> List[str]:
+        """在 mod 目录下递归查找 .ini（先序、与 os.walk 自顶向下顺序一致），按规则剪枝。"""
+        stats = stats if stats is not None else ScanStats()
+        ini_files: List[str] = []
+        self._walk(mod_dir, ini_files, stats, is_root=True)
+        stats.ini_files += len(ini_files)
+        return ini_files
+
+    def _walk(self, directory: str, ini_files: List[str], stats: ScanStats, is_root: bool):
+        try:
+            with os.scandir(directory) as it:
+                entries = list(it)
+        except OSError:
+            if is_root:
+                raise
+            return
+        stats.dirs_visited += 1
+
+        subdirs = []
+        has_asset = False
+        has_other = False
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+            if is_dir:
+                # 与 os.walk(followlinks=False) 一致：指向目录的符号链接/目录联接不进入，
+                # 避免环路（如 sub/loop -> ..）把同一 ini 重复收集
+                if entry.is_symlink() or _is_junction(entry):
+                    continue
+                if self.prune_dir(entry.name):
+                    stats.dirs_pruned += 1
+                else:
+                    subdirs.append(entry.path)
+                continue
+            lower = entry.name.lower()
+            if lower.endswith('.ini'):
+                ini_files.append(os.path.join(directory, entry.name))
+                has_other = True
+            elif lower.endswith(self._asset_exts):
+                has_asset = True
+            else:
+                has_other = True
+
+        # 只含二进制资源的目录：其子目录视为同类资源分桶，整体剪掉
+        if self._prune_binary_only and not is_root and has_asset and not has_other:
+            stats.dirs_pruned += len(subdirs)
+            return
+
+        for subdir in subdirs:
+            self._walk(subdir, ini_files, stats, is_root=False)
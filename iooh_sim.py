@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""3DMigoto 命令列表的本地模拟器：不启动游戏验证生成的 ini 并统计执行开销。
+
+IOOH 的菜单靠「巧合同步」工作：IOOHmod.ini 与每个注入过的 mod ini 各持一份变量
+（$iooh_sel ↔ $iooh_s<id>、$show_character_ui ↔ $iooh_ui<id>、$iooh_en<id>），
+监听同一组物理键、做相同计数。任何一处生成逻辑不一致，游戏里就会错位。
+本模块解释 IOOH 用到的子集，在本地回放按键序列并逐键核对同步：
+
+- [Constants] 中的 global [persist] 声明与初值
+- Key 段：key（含 ctrl/alt/shift 与 no_* 修饰）、condition、type（activate / cycle /
+  toggle / hold，hold 只模拟按下）、$var = 值列表、run =
+- CommandList / CustomShader / [Present]：if / elif / else if / else / endif、
+  $var = 表达式、run =、pre/post 前缀；其余命令（资源绑定、draw 等）只计数
+- 表达式：数字、$变量、cursor_x 等内建标识符（默认 0）、+ - * / %、比较、&& || !、括号
+
+每个 ini 是独立的变量命名空间（与 3DMigoto 一致）。执行计数：每条被执行的语句
+计 1（if/elif 每求值一次条件计 1，run 计 1 再加被调用段的计数）。
+"""
+
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+# 内建标识符（cursor_x、time 等）的默认值
+DEFAULT_BUILTIN_VALUE = 0.0
+
+_SECTION_RE = re.compile(r'^\[([^\]\r\n]+)\]')
+_TOKEN_RE = re.compile(
+    r'\s*(?:(\d+\.?\d*|\.\d+)|(\$[\w\\.]+)|([A-Za-z_]\w*)|(==|!=|<=|>=|&&|\|\||[-+*/%<>()!]))'
+)
+_DRAW_COMMANDS = frozenset([
+    "draw", "drawauto", "drawindexed", "drawinstanced", "drawindexedinstanced",
+    "drawinstancedindirect", "drawindexedinstancedindirect", "dispatch", "dispatchindirect",
+])
+_MODIFIERS = {"ctrl": "ctrl", "lctrl": "ctrl", "rctrl": "ctrl",
+              "alt": "alt", "lalt": "alt", "ralt": "alt",
+              "shift": "shift", "lshift": "shift", "rshift": "shift"}
+
+
+class SimError(Exception):
+    """模拟器无法解释的语法。"""
+
+
+def parse_key(value: str) -> Tuple[str, set, set]:
+    """解析 key 行：返回 (主键名小写, 必须按住的修饰键, 必须未按的修饰键)。"""
+    required, forbidden, main = set(), set(), ""
+    for token in value.lower().split():
+        if token in _MODIFIERS:
+            required.add(_MODIFIERS[token])
+        elif token.startswith("no_") and token[3:] in _MODIFIERS:
+            forbidden.add(_MODIFIERS[token[3:]])
+        elif token == "no_modifiers":
+            forbidden.update(("ctrl", "alt", "shift"))
+        else:
+            main = token
+    return main, required, forbidden
+
+
+class _Expr:
+    """编译后的表达式（词法白名单校验后转为 Python 表达式求值）。"""
+
+    _cache: Dict[str, "_Expr"] = {}
+
+    def __init__(self, text: str):
+        parts = []
+        pos = 0
+        text = text.strip()
+        while pos < len(text):
+            match = _TOKEN_RE.match(text, pos)
+            if not match or match.end() == pos:
+                raise SimError(f"无法解析的表达式: {text}")
+            number, var, ident, op = match.groups()
+            if number is not None:
+                parts.append(number)
+            elif var is not None:
+                parts.append(f"_v({var[1:].lower()!r})")
+            elif ident is not None:
+                parts.append(f"_i({ident.lower()!r})")
+            else:
+                parts.append({"&&": " and ", "||": " or ", "!": " not "}.get(op, op))
+            pos = match.end()
+        if not parts:
+            raise SimError("空表达式")
+        self.text = text
+        self.code = compile("".join(parts), "<ini>", "eval")
+
+    @classmethod
+    def get(cls, text: str) -> "_Expr":
+        expr = cls._cache.get(text)
+        if expr is None:
+            expr = cls._cache[text] = cls(text)
+        return expr
+
+    def eval(self, env: "IniProgram") -> float:
+        value = eval(self.code, {"__builtins__": {}}, {"_v": env.get, "_i": env.builtin})
+        return float(value)
+
+
+class _If:
+    def __init__(self):
+        self.branches: List[Tuple[str, list]] = []   # (条件文本, 语句块)
+        self.otherwise: Optional[list] = None
+
+
+class _KeySection:
+    def __init__(self, name: str):
+        self.name = name
+        self.key = ("", set(), set())
+        self.condition = ""
+        self.type = "activate"
+        self.cycles: List[Tuple[str, List[str]]] = []   # ($变量名, 值列表)
+        self.runs: List[str] = []
+
+
+def _parse_block(lines: List[str]) -> list:
+    """把命令列表行解析为语句树：('set', 变量, 表达式) / ('run', 目标) / ('cmd', 名, 是否绘制) / _If。"""
+    root: list = []
+    stack: List[Tuple[list, Optional[_If]]] = [(root, None)]
+    for line in lines:
+        lower = line.lower()
+        for prefix in ("pre ", "post "):
+            if lower.startswith(prefix):
+                line, lower = line[len(prefix):].strip(), lower[len(prefix):].strip()
+        block, current_if = stack[-1]
+        if lower.startswith("if ") or lower == "if":
+            node = _If()
+            node.branches.append((line[2:].strip(), []))
+            block.append(node)
+            stack.append((node.branches[-1][1], node))
+        elif lower.startswith(("elif ", "else if ")) and current_if is not None:
+            condition = line.split(None, 2)[2] if lower.startswith("else if ") else line[4:].strip()
+            current_if.branches.append((condition, []))
+            stack[-1] = (current_if.branches[-1][1], current_if)
+        elif lower == "else" and current_if is not None:
+            current_if.otherwise = []
+            stack[-1] = (current_if.otherwise, current_if)
+        elif lower == "endif" and current_if is not None:
+            stack.pop()
+        else:
+            key, sep, value = line.partition("=")
+            key = key.strip()
+            if sep and key.startswith("$"):
+                block.append(("set", key[1:].lower(), value.strip()))
+            elif sep and key.lower() == "run":
+                block.append(("run", value.strip().lower()))
+            else:
+                block.append(("cmd", key.lower(), key.lower() in _DRAW_COMMANDS))
+    return root
+
+
+class IniProgram:
+    """一个 ini 文件：独立变量命名空间 + 按键段 + 可调用段 + [Present]。"""
+
+    def __init__(self, path: str, label: str = ""):
+        self.path = path
+        self.label = label or os.path.basename(path)
+        self.vars: Dict[str, float] = {}
+        self.builtins: Dict[str, float] = {}
+        self.keys: List[_KeySection] = []
+        self.callables: Dict[str, list] = {}
+        self.present: list = []
+        self.errors: List[str] = []
+        self._parse()
+
+    def _parse(self):
+        with open(self.path, 'r', encoding='utf-8', errors='replace') as f:
+            raw_lines = f.read().splitlines()
+        sections: List[Tuple[str, List[str]]] = []
+        for raw in raw_lines:
+            line = raw.strip()
+            if not line or line.startswith(';'):
+                continue
+            header = _SECTION_RE.match(line)
+            if header:
+                sections.append((header.group(1).strip(), []))
+            elif sections:
+                sections[-1][1].append(line)
+
+        for name, lines in sections:
+            lower = name.lower()
+            if lower == "constants":
+                self._declare(lines)
+            elif lower == "present":
+                self.present.extend(_parse_block(lines))
+            elif lower.startswith("key"):
+                self.keys.append(self._parse_key_section(name, lines))
+            elif lower.startswith(("commandlist", "customshader")):
+                self.callables[lower] = _parse_block(lines)
+
+    def _declare(self, lines: List[str]):
+        """[Constants]：global [persist] $x [= 初值]；其余语句按命令列表执行一次。"""
+        rest = []
+        for line in lines:
+            match = re.match(r'(?i)^global\s+(?:persist\s+)?\$([\w.]+)\s*(?:=\s*(.+))?$', line)
+            if match:
+                self.vars[match.group(1).lower()] = self._eval(match.group(2)) if match.group(2) else 0.0
+            else:
+                rest.append(line)
+        if rest:
+            self.execute(_parse_block(rest))
+
+    def _parse_key_section(self, name: str, lines: List[str]) -> _KeySection:
+        section = _KeySection(name)
+        for line in lines:
+            key, _, value = line.partition("=")
+            key, value = key.strip().lower(), value.strip()
+            if key == "key":
+                section.key = parse_key(value)
+            elif key == "condition":
+                section.condition = value
+            elif key == "type":
+                section.type = value.lower()
+            elif key == "run":
+                section.runs.append(value.lower())
+            elif key.startswith("$"):
+                section.cycles.append((key[1:], [v.strip() for v in value.split(",")]))
+        return section
+
+    # ===== 求值 =====
+
+    def get(self, name: str) -> float:
+        return self.vars.get(name, 0.0)
+
+    def builtin(self, name: str) -> float:
+        return self.builtins.get(name, DEFAULT_BUILTIN_VALUE)
+
+    def _eval(self, text: str) -> float:
+        try:
+            return _Expr.get(text).eval(self)
+        except (SimError, ArithmeticError, SyntaxError, TypeError) as e:
+            self.errors.append(f"{self.label}: {text}: {e}")
+            return 0.0
+
+    def execute(self, block: list, stack: Tuple[str, ...] = ()) -> Tuple[int, int]:
+        """执行语句块，返回 (执行的操作数, 绘制数)。"""
+        ops = draws = 0
+        for node in block:
+            if isinstance(node, _If):
+                for condition, body in node.branches:
+                    ops += 1
+                    if self._eval(condition):
+                        sub_ops, sub_draws = self.execute(body, stack)
+                        break
+                else:
+                    sub_ops, sub_draws = self.execute(node.otherwise or [], stack)
+                ops += sub_ops
+                draws += sub_draws
+            elif node[0] == "set":
+                self.vars[node[1]] = self._eval(node[2])
+                ops += 1
+            elif node[0] == "run":
+                ops += 1
+                body = self.callables.get(node[1])
+                if body is not None and node[1] not in stack:
+                    sub_ops, sub_draws = self.execute(body, stack + (node[1],))
+                    ops += sub_ops
+                    draws += sub_draws
+            else:
+                ops += 1
+                draws += node[2]
+        return ops, draws
+
+    # ===== 事件 =====
+
+    def press(self, key: str, held: set) -> int:
+        """按下一个键：依文件顺序触发匹配且条件成立的 Key 段，返回执行的操作数。"""
+        ops = 0
+        for section in self.keys:
+            main, required, forbidden = section.key
+            if main != key or not required <= held or forbidden & held:
+                continue
+            if section.condition:
+                ops += 1
+                if not self._eval(section.condition):
+                    continue
+            for var, values in section.cycles:
+                ops += 1
+                if section.type == "cycle":
+                    current = self.get(var)
+                    index = next((i for i, v in enumerate(values) if self._eval(v) == current), -1)
+                    self.vars[var] = self._eval(values[(index + 1) % len(values)])
+                elif section.type == "toggle" and self.get(var) == self._eval(values[0]):
+                    self.vars[var] = 0.0
+                else:
+                    self.vars[var] = self._eval(values[0])
+            for target in section.runs:
+                ops += 1 + self.execute(self.callables.get(target, []), (target,))[0]
+        return ops
+
+    def frame(self) -> Tuple[int, int]:
+        """执行一帧 [Present]，返回 (操作数, 绘制数)。"""
+        return self.execute(self.present)
+
+
+class Simulator:
+    """多个 ini 同时加载，回放按键并核对 IOOH 变量同步。"""
+
+    def __init__(self):
+        self.programs: List[IniProgram] = []
+        self.main: Optional[IniProgram] = None
+        # 注入过选择器的 mod ini -> 其角色 id
+        self.selector_ids: Dict[IniProgram, int] = {}
+
+    def load(self, path: str, label: str = "") -> IniProgram:
+        program = IniProgram(path, label)
+        self.programs.append(program)
+        if "iooh_sel" in program.vars:
+            self.main = program
+        for name in program.vars:
+            match = re.fullmatch(r'iooh_s(\d+)', name)
+            if match:
+                self.selector_ids[program] = int(match.group(1))
+        return program
+
+    @classmethod
+    def from_configurator(cls, configurator) -> "Simulator":
+        """加载输出目录的 IOOHmod.ini 与当前扫描结果中各 mod 的全部 ini。"""
+        sim = cls()
+        main_ini = os.path.join(configurator._resolve_output_dir(), "IOOHmod.ini")
+        if os.path.isfile(main_ini):
+            sim.load(main_ini)
+        for mod in configurator.mods:
+            for ini_file in mod.ini_files:
+                sim.load(ini_file, f"{mod.name}/{os.path.relpath(ini_file, mod.path)}")
+        return sim
+
+    def press(self, combo: str) -> int:
+        """按下一个键（key 行格式，如 "VK_PRIOR"、"alt /"），返回全部文件执行的操作数。"""
+        key, held, _ = parse_key(combo)
+        return sum(program.press(key, held) for program in self.programs)
+
+    def frame(self) -> Dict[str, Tuple[int, int]]:
+        """执行一帧，返回 文件标签 -> (操作数, 绘制数)。"""
+        return {program.label: program.frame() for program in self.programs}
+
+    def check_sync(self) -> List[str]:
+        """核对每个注入 ini 的 $iooh_s/$iooh_ui/$iooh_en 与 IOOHmod.ini 一致，返回不一致项。"""
+        if self.main is None:
+            return ["未加载 IOOHmod.ini"]
+        problems = []
+        main = self.main
+        for program, char_id in self.selector_ids.items():
+            pairs = [
+                (f"iooh_s{char_id}", "iooh_sel"),
+                (f"iooh_ui{char_id}", "show_character_ui"),
+                (f"iooh_en{char_id}", f"iooh_en{char_id}"),
+            ]
+            for local, shared in pairs:
+                if program.get(local) != main.get(shared):
+                    problems.append(f"{program.label}: ${local}={program.get(local):g}，"
+                                    f"IOOHmod.ini ${shared}={main.get(shared):g}")
+        return problems
+
+    def handler_counts(self) -> Tuple[int, int]:
+        """注入 ini 中 IOOH 选择器的 (Key 段数, CommandList 数)。"""
+        keys = lists = 0
+        for program, char_id in self.selector_ids.items():
+            prefix = f"iooh_s{char_id}_"
+            keys += sum(1 for section in program.keys if prefix in section.name.lower())
+            lists += sum(1 for name in program.callables if prefix in name)
+        return keys, lists
+
+    @property
+    def errors(self) -> List[str]:
+        return [error for program in self.programs for error in program.errors]
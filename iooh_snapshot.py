@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""扫描结果的二进制快照：启动时立即恢复上次的 mod 列表。
+
+图形界面启动时列表是空的，必须重新扫描才能看到内容；xxmi_key_config.json 是给人看的
+缩进 JSON，体积大、解析慢，也不含恢复状态所需的文件指纹。本模块把扫描结果
+（mod、按键绑定、每个已扫描 ini 的 (大小, mtime_ns) 指纹）写成紧凑的二进制快照，
+持久化到 exe/脚本同级的 iooh_scan_snapshot.bin：
+
+- 全部字符串去重后以 \\0 连接成一个字符串表，其余内容是一个 int64 数组（字符串以下标
+  引用），整体 zlib 压缩；读取只需一次解压、一次 split、一次 array.frombytes
+- 快照记录生成时的扫描规则摘要，规则变化后快照作废
+- 校验（changed_folders）只做目录遍历与 stat，不读文件内容，可放在后台线程执行；
+  结果是需要重新解析的 mod 文件夹与已消失的 mod 文件夹，由调用方只重扫这些文件夹
+"""
+
+import hashlib
+import json
+import os
+import sys
+import zlib
+from array import array
+from typing import Dict, List, Set, Tuple
+
+from iooh_models import PATHS, ModInfo, ModKeyBinding
+from iooh_scan_cache import file_fingerprint
+
+# 快照文件名（位于 exe/脚本同级，可随时删除，下次扫描自动重建）
+SNAPSHOT_FILENAME = "iooh_scan_snapshot.bin"
+_MAGIC = b"IOOHSNP\x01"
+
+
+def rules_digest(rules: dict) -> str:
+    """扫描规则的摘要（规则变化时快照作废）。"""
+    return hashlib.sha256(json.dumps(rules, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def _top_folder(directory: str, path: str) -> str:
+    """path 所属的顶层 mod 文件夹名。"""
+    return os.path.relpath(path, directory).split(os.sep, 1)[0]
+
+
+class _StringTable:
+    """写快照用：字符串 → 下标（去重）。"""
+
+    def __init__(self):
+        self.strings: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    def __call__(self, text: str) -> int:
+        idx = self._index.get(text)
+        if idx is None:
+            idx = self._index[text] = len(self.strings)
+            self.strings.append(text)
+        return idx
+
+
+class ScanSnapshot:
+    """上次完整扫描的结果与 ini 指纹（二进制持久化）。"""
+
+    def __init__(self, output_dir: str):
+        self.snapshot_path = os.path.join(output_dir, SNAPSHOT_FILENAME)
+        self.directory = ""
+        self.rules = ""
+        self.mods: List[ModInfo] = []
+        # ini 路径 -> (大小, mtime_ns)：快照时已扫描的全部 ini（含没有按键绑定的 mod 的 ini）
+        self.fingerprints: Dict[str, Tuple[int, int]] = {}
+
+    def save(self, directory: str, rules: str, mods: List[ModInfo],
+             fingerprints: Dict[str, Tuple[int, int]]) -> bool:
+        """写出快照（先写临时文件再替换）。"""
+        self.directory, self.rules, self.fingerprints = directory, rules, fingerprints
+        self.mods = list(mods)
+        intern = _StringTable()
+        ints = array("q", [intern(directory), intern(rules), len(mods)])
+        for mod in mods:
+            ini_index = {path: n for n, path in enumerate(mod.ini_files)}
+            ints.extend((intern(mod.name), intern(mod.path), mod.character_id, len(mod.ini_files)))
+            ints.extend(intern(path) for path in mod.ini_files)
+            ints.append(len(mod.key_bindings))
+            for b in mod.key_bindings:
+                ints.extend((intern(b.section_name), intern(b.key), intern(b.variable),
+                             intern(b.description), ini_index.get(b.ini_file, -1)))
+        ints.append(len(fingerprints))
+        for path, (size, mtime_ns) in fingerprints.items():
+            ints.extend((intern(path), size, mtime_ns))
+        if sys.byteorder != "little":
+            ints.byteswap()
+
+        blob = "\0".join(intern.strings).encode("utf-8")
+        payload = len(blob).to_bytes(8, "little") + blob + ints.tobytes()
+        tmp_path = self.snapshot_path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(_MAGIC)
+                f.write(zlib.compress(payload, 1))
+            os.replace(tmp_path, self.snapshot_path)
+            return True
+        except Exception as e:
+            print(f"保存扫描快照失败: {e}")
+            return False
+
+    def load(self) -> bool:
+        """读取快照；缺失、损坏或格式不符时返回 False（只影响启动速度，不影响结果）。"""
+        if not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                data = f.read()
+            if not data.startswith(_MAGIC):
+                return False
+            payload = zlib.decompress(data[len(_MAGIC):])
+            blob_len = int.from_bytes(payload[:8], "little")
+            strings = payload[8:8 + blob_len].decode("utf-8").split("\0")
+            ints = array("q")
+            ints.frombytes(payload[8 + blob_len:])
+            if sys.byteorder != "little":
+                ints.byteswap()
+            self._decode(strings, ints)
+            return True
+        except Exception as e:
+            print(f"读取扫描快照失败，将重新扫描: {e}")
+            self.mods, self.fingerprints = [], {}
+            return False
+
+    def _decode(self, strings: List[str], ints: array):
+        # 字符串表已去重：每个字符串只驻留一次，绑定直接引用
+        strings = [sys.intern(text) for text in strings]
+        values = ints.tolist()
+        no_ini = PATHS.index("")
+        self.directory, self.rules = strings[values[0]], strings[values[1]]
+        pos = 3
+        mods: List[ModInfo] = []
+        for _ in range(values[2]):
+            name, path, character_id, ini_count = values[pos:pos + 4]
+            pos += 4
+            mod = ModInfo(strings[name], strings[path], [strings[i] for i in values[pos:pos + ini_count]])
+            pos += ini_count
+            mod.character_id = character_id
+            mod_idx = PATHS.index(mod.path)
+            ini_idx = [PATHS.index(f) for f in mod.ini_files]
+            binding_count = values[pos]
+            pos += 1
+            restore = ModKeyBinding.restore
+            bindings = mod.key_bindings
+            for _ in range(binding_count):
+                section, key, variable, description, ini = values[pos:pos + 5]
+                pos += 5
+                bindings.append(restore(strings[section], strings[key], strings[variable], strings[description],
+                                        mod_idx, ini_idx[ini] if ini >= 0 else no_ini))
+            mods.append(mod)
+        fingerprints: Dict[str, Tuple[int, int]] = {}
+        for _ in range(values[pos]):
+            path, size, mtime_ns = values[pos + 1:pos + 4]
+            fingerprints[strings[path]] = (size, mtime_ns)
+            pos += 3
+        self.mods, self.fingerprints = mods, fingerprints
+
+    def changed_folders(self, scan_rules, script_dir: str) -> Tuple[Set[str], Set[str]]:
+        """与磁盘比对：返回 (需重新解析的 mod 文件夹, 已消失的 mod 文件夹)。
+
+        文件夹的 ini 集合或任一 ini 的指纹变化即需重新解析；新出现的文件夹同样。
+        只读（遍历 + stat），可在后台线程执行。
+        """
+        directory = self.directory
+        by_folder: Dict[str, Dict[str, Tuple[int, int]]] = {}
+        for path, fingerprint in self.fingerprints.items():
+            by_folder.setdefault(_top_folder(directory, path), {})[path] = fingerprint
+        known = set(by_folder) | {os.path.basename(os.path.normpath(m.path)) for m in self.mods}
+
+        changed: Set[str] = set()
+        present: Set[str] = set()
+        for item in os.listdir(directory):
+            item_path = os.path.join(directory, item)
+            if scan_rules.skip_mod_folder(item) or os.path.abspath(item_path) == script_dir:
+                continue
+            if not os.path.isdir(item_path):
+                continue
+            try:
+                ini_files = scan_rules.find_ini_files(item_path)
+            except OSError:
+                continue
+            if not ini_files or any(os.path.basename(f).lower() == 'ioohmod.ini' for f in ini_files):
+                continue
+            present.add(item)
+            old = by_folder.get(item)
+            if (old is None or len(old) != len(ini_files)
+                    or any(old.get(f) != file_fingerprint(f) for f in ini_files)):
+                changed.add(item)
+        return changed, known - present
@@ -3,17 +3,42 @@
 """EFMI Key Context Configurator - 入口
 
 功能已按职责拆分到独立模块：
-- iooh_models.py      数据模型（ModKeyBinding / ModInfo）
+- iooh_models.py      数据模型（ModKeyBinding / ModInfo / InjectResult / RunPlan）
 - iooh_keys.py        IOOH 菜单四个控制键的单一数据源（含持久化、ini key 行、提示文案）
 - iooh_configurator.py 核心配置器（扫描/解析/备份/生成/注入）
+- iooh_main_ini.py    主 UI ini（IOOHmod.ini）文本生成（预编译模板 + 分段拼接）
+- iooh_backup.py      内容寻址的压缩备份仓库
+- iooh_fileops.py     文件复制快速路径（内容比对跳过 / reflink / 硬链接）
+- iooh_scan_rules.py  扫描包含/排除与目录剪枝规则
+- iooh_scan_cache.py  ini 字节级预筛与扫描缓存
+- iooh_id_registry.py 稳定的角色 ID 登记表
+- iooh_options.py     注入选项（选择器槽位容量等）
+- iooh_pipeline.py    配置流水线（阶段依赖图 + 有界队列并发执行）
+- iooh_build.py       构建图状态（输入指纹，只重建过期产物）
+- iooh_journal.py     配置运行预写日志（中断后继续/回滚）
+- iooh_analyzer.py    mod ini 静态每帧开销分析
+- iooh_sim.py         3DMigoto 命令列表本地模拟（按键回放、同步核对、执行计数）
+- iooh_key_conflicts.py 跨 mod 按键冲突索引（含与菜单键的冲突）
+- iooh_name_matcher.py 角色名称映射的多关键词自动机匹配
+- iooh_snapshot.py    扫描结果二进制快照（启动即恢复列表，后台校验只重扫变化的 mod）
+- iooh_bundle.py      配置包导出/导入（同一套 mod 的多台机器直接部署，不扫描、不渲染）
+- iooh_bench.py       合成数据性能基准（模型内存、快照、主 ini 生成等）
 - iooh_gui.py         图形界面（含 IOOH 按键自定义面板）
+- iooh_cli.py         命令行界面（带子命令运行时使用）
 - generate_ui_textures.py UI 纹理生成（按键提示文案由 IOOHKeyConfig 提供）
 """
 
-from iooh_gui import KeyConfiguratorGUI
+import sys
 
 
 def main():
+    # 首个参数是子命令或选项：命令行模式；否则（含拖放路径）打开图形界面
+    from iooh_cli import is_cli_invocation
+    if is_cli_invocation(sys.argv[1:]):
+        from iooh_cli import main as cli_main
+        sys.exit(cli_main(sys.argv[1:]))
+
+    from iooh_gui import KeyConfiguratorGUI
     app = KeyConfiguratorGUI()
     app.run()
 
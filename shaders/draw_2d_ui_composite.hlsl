@@ -0,0 +1,66 @@
+// 2D UI单次合成像素着色器
+// 与 draw_2d_ui.hlsl 的顶点着色器配合使用（同一个面板四边形）：
+// 各层纹理分别绑定到 t100~t104，在一次绘制中按顺序做 alpha 叠加，
+// 代替每层重新绑定 ps-t100 再 Draw 一次（5 次绘制 → 1 次，面板像素只着色一遍）
+//
+// t100 = muban 背景模板
+// t101 = 当前角色头像
+// t102 = 当前角色文字
+// t103 = 当前角色启用/禁用状态图案
+// t104 = 按键提示
+// 未绑定（null）的层尺寸为 0，直接跳过
+
+struct vs2ps {
+    float4 pos : SV_Position0;
+    float2 uv : TEXCOORD1;
+};
+
+#ifdef PIXEL_SHADER
+Texture2D<float4> layer0 : register(t100);
+Texture2D<float4> layer1 : register(t101);
+Texture2D<float4> layer2 : register(t102);
+Texture2D<float4> layer3 : register(t103);
+Texture2D<float4> layer4 : register(t104);
+
+// 双线性过滤采样器：放大纹理时做插值，消除点采样的阶梯锯齿
+SamplerState bilinear : register(s0)
+{
+    Filter = MIN_MAG_MIP_LINEAR;
+    AddressU = CLAMP;
+    AddressV = CLAMP;
+};
+
+// 把一层叠加到已合成结果上（预乘 alpha 的 over 运算）
+// alpha 接近 0 的像素不参与，与逐层绘制时的 discard 一致
+void blend_layer(Texture2D<float4> tex, float2 uv, inout float4 acc)
+{
+    uint width, height;
+    tex.GetDimensions(width, height);
+    if (!width || !height) return;
+
+    float4 color = tex.Sample(bilinear, uv);
+    if (color.a < 0.01) return;
+    acc.rgb = color.rgb * color.a + acc.rgb * (1 - color.a);
+    acc.a = color.a + acc.a * (1 - color.a);
+}
+
+void main(vs2ps input, out float4 result : SV_Target0)
+{
+    // 翻转Y坐标（3dmigoto纹理加载后Y轴需要翻转）
+    float2 uv = float2(input.uv.x, 1 - input.uv.y);
+
+    float4 acc = 0;
+    blend_layer(layer0, uv, acc);
+    blend_layer(layer1, uv, acc);
+    blend_layer(layer2, uv, acc);
+    blend_layer(layer3, uv, acc);
+    blend_layer(layer4, uv, acc);
+
+    // 全部层都透明，丢弃像素
+    if (acc.a < 0.01) discard;
+
+    // 输出非预乘颜色，沿用 blend = ADD SRC_ALPHA INV_SRC_ALPHA：
+    // (rgb / a) * a + dst * (1 - a) 与逐层叠加到背景上的结果相同
+    result = float4(acc.rgb / acc.a, acc.a);
+}
+#endif
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""配置包 ini 指纹：原版 → 注入 → 指纹一致（含原本没有 [Constants] 的 ini）。"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from iooh_bundle import ini_identity
+from iooh_configurator import EFMIKeyConfigurator
+
+WITHOUT_CONSTANTS = """; GammaMod
+[TextureOverrideGamma]
+hash = 1234abcd
+match_first_index = 0
+
+[KeyOutfit]
+key = VK_F5
+type = cycle
+$outfit = 0,1
+"""
+
+WITH_CONSTANTS = """[Constants]
+global persist $outfit = 0
+
+[KeyOutfit]
+key = ctrl 1
+type = cycle
+$outfit = 0,1
+
+[Present]
+run = CommandListOutfit
+"""
+
+
+class IniIdentityRoundTrip(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.mods_dir = os.path.join(self.tmp, "Mods")
+        output_dir = os.path.join(self.tmp, "tool")
+        os.makedirs(output_dir)
+        self._saved_output_dir = EFMIKeyConfigurator.__dict__["_get_output_dir"]
+        EFMIKeyConfigurator._get_output_dir = staticmethod(lambda: output_dir)
+        self.configurator = EFMIKeyConfigurator()
+
+    def tearDown(self):
+        EFMIKeyConfigurator._get_output_dir = self._saved_output_dir
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def _write_mod(self, name: str, text: str, newline: str = "\n") -> str:
+        path = os.path.join(self.mods_dir, name, "mod.ini")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8", newline=newline) as f:
+            f.write(text)
+        return path
+
+    def _inject_all(self):
+        self.configurator.scan_mods(self.mods_dir)
+        for mod in self.configurator.mods:
+            self.assertTrue(self.configurator.inject_mod(mod).success)
+
+    def _identity(self, path: str) -> str:
+        with open(path, "rb") as f:
+            return ini_identity(self.configurator, f.read())
+
+    def test_pristine_and_injected_share_identity(self):
+        cases = {
+            "GammaMod": (WITHOUT_CONSTANTS, "\n"),
+            "DeltaMod": (WITH_CONSTANTS, "\n"),
+            "CrlfMod": (WITHOUT_CONSTANTS, "\r\n"),
+        }
+        paths = {name: self._write_mod(name, text, newline) for name, (text, newline) in cases.items()}
+        pristine = {name: self._identity(path) for name, path in paths.items()}
+
+        self._inject_all()
+        for name, path in paths.items():
+            with open(path, "rb") as f:
+                self.assertIn(b"IOOH", f.read(), name)
+            self.assertEqual(self._identity(path), pristine[name], name)
+
+        # 再注入一次（目标机上是旧注入）指纹仍不变
+        self._inject_all()
+        for name, path in paths.items():
+            self.assertEqual(self._identity(path), pristine[name], name)
+
+    def test_different_mods_differ(self):
+        a = self._write_mod("GammaMod", WITHOUT_CONSTANTS)
+        b = self._write_mod("DeltaMod", WITH_CONSTANTS)
+        self.assertNotEqual(self._identity(a), self._identity(b))
+
+
+if __name__ == "__main__":
+    unittest.main()